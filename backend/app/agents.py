@@ -1,7 +1,4 @@
-import os
 import json
-from dotenv import load_dotenv
-from groq import Groq
 from sqlalchemy.orm import Session
 
 from .services import (
@@ -11,10 +8,7 @@ from .services import (
     check_recent_purchase,
     predict_refill
 )
-load_dotenv()
-
-# ✅ THIS MUST EXIST
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+from .llm_gateway import llm_gateway
 
 SYSTEM_PROMPT = """
 You are an AI Pharmacist.
@@ -38,19 +32,19 @@ If the user wants to order medicine, respond with:
 
 Respond ONLY in JSON.
 """
-def run_agent(db: Session, user_id: str, message: str):
-
-    completion = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": message}
-        ],
-        temperature=0
-    )
+async def run_agent(db: Session, user_id: str, message: str):
 
     try:
-        data = json.loads(completion.choices[0].message.content)
+        raw = await llm_gateway.complete(
+            model="llama-3.1-8b-instant",
+            agent="run_agent",
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": message}
+            ],
+            temperature=0
+        )
+        data = json.loads(raw)
     except:
         return {"error": "Could not understand request"}
 
@@ -61,7 +55,7 @@ def run_agent(db: Session, user_id: str, message: str):
         from .services import recommend_from_symptom
         symptom = data.get("symptom")
 
-        recommendations = recommend_from_symptom(db, symptom)
+        recommendations = await recommend_from_symptom(db, symptom)
 
         return {
             "message": f"Based on your symptom '{symptom}', I recommend:",
@@ -0,0 +1,97 @@
+import os
+import copy
+from ..ttl_cache import LRUTTLCache
+
+
+# =========================
+# MASTER AGENT DECISION CACHE
+# =========================
+MASTER_CACHE_SIZE = int(os.getenv("MASTER_CACHE_SIZE", "1024"))
+MASTER_CACHE_TTL = float(os.getenv("MASTER_CACHE_TTL", "900"))
+
+# Safe max quantity in MASTER_AGENT_PROMPT is 5: every quantity up to it is its own band,
+# above it the model can only cap or reject, so those share wider bands
+SAFE_MAX_QUANTITY = 5
+QUANTITY_BANDS = [1, 2, 3, 4, 5, 6, 11, 21, 51]
+STOCK_BANDS = [0, 1, 5, 10, 50, 200]
+
+
+def _band(value, edges):
+    band = 0
+    for i, edge in enumerate(edges):
+        if value >= edge:
+            band = i
+    return band if value >= edges[0] else -1
+
+
+def _replace_text(value, old, new):
+    if not old or old == new:
+        return value
+    if isinstance(value, str):
+        return value.replace(old, new)
+    if isinstance(value, list):
+        return [_replace_text(v, old, new) for v in value]
+    if isinstance(value, dict):
+        return {k: _replace_text(v, old, new) for k, v in value.items()}
+    return value
+
+
+def decision_key(med, quantity, prescriptions, alternatives, symptoms, language):
+    """
+    Every fact the verdict depends on, read fresh for each request. A change to stock
+    band, the Rx flag, the patient's prescription rows or the in-stock alternatives
+    produces a different key, so an outdated verdict can't be served. Up to the safe
+    max the exact stock is keyed too: a capped verdict approves min(5, stock) units.
+    """
+    stock = med.stock or 0
+    return (
+        med.name,
+        _band(quantity, QUANTITY_BANDS),
+        _band(stock, STOCK_BANDS),
+        min(stock, SAFE_MAX_QUANTITY + 1),
+        stock >= quantity,
+        bool(med.prescription_required),
+        tuple((rx.id, bool(rx.approved)) for rx in prescriptions),
+        tuple(m.id for m in alternatives),
+        " ".join((symptoms or "").lower().split()),
+        (language or "english").lower(),
+    )
+
+
+class DecisionCache:
+    """
+    LRU + TTL cache of evaluate_master_agent verdicts keyed on normalized order facts.
+    """
+
+    def __init__(self, maxsize: int = MASTER_CACHE_SIZE, ttl: float = MASTER_CACHE_TTL):
+        self._cache = LRUTTLCache(maxsize, ttl)
+
+    def get(self, key, quantity, user_id):
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+
+        cached_quantity, cached_user, verdict = entry
+        # The prompt names the customer, so the model may have quoted their id; never
+        # hand one patient's id to another
+        verdict = _replace_text(copy.deepcopy(verdict), cached_user, user_id)
+        # A full approval echoes the request; re-apply it for a different quantity in the same band
+        if verdict.get("approved_quantity") == cached_quantity:
+            verdict["approved_quantity"] = quantity
+        return verdict
+
+    def put(self, key, quantity, user_id, verdict):
+        self._cache.put(key, (quantity, user_id, copy.deepcopy(verdict)))
+
+    def invalidate_medicine(self, medicine_name):
+        # Eager drop on Rx uploads / flag changes; the key alone already prevents stale hits
+        return self._cache.discard_where(lambda key: key[0] == medicine_name)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        return self._cache.stats()
+
+
+decision_cache = DecisionCache()
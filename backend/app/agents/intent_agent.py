@@ -1,11 +1,5 @@
-import os
-from dotenv import load_dotenv
-from groq import Groq
 import json
-
-load_dotenv()
-
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+from ..llm_gateway import llm_gateway
 
 SYSTEM_PROMPT = """
 You are an intent classifier for a pharmacy AI system.
@@ -63,36 +57,43 @@ For order:
 """
 
 import json
+from .intent_parser import parse_intent
+from .intent_cache import intent_cache
+from ..tracing import annotate
+
+async def detect_intent(message: str):
+    # Deterministic fast path (emergency / checkout / order grammar / symptoms);
+    # the LLM is only consulted when the parser is not confident
+    parsed = parse_intent(message)
+    if parsed is not None:
+        annotate(detail="parser", cache_hit=False)
+        return parsed
+
+    cached = intent_cache.get(message)
+    if cached is not None:
+        annotate(detail="cache", cache_hit=True)
+        return cached
 
-def detect_intent(message: str):
-    completion = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": message}
-        ],
-        temperature=0
-    )
-    message_lower = message.lower()
-    if any(word in message_lower for word in ["chest pain", "breathing", "bleeding"]):
-        return {"intent": "emergency"}
-    
-    if any(word in message_lower for word in ["feel", "pain", "tired", "headache", "allergy", "skin"]):
-        return {"intent": "recommend", "symptom": message}
-        
-    if message_lower in ["no", "nothing", "that's all", "checkout", "buy now", "no thanks", "nope", "nahi", "bas", "bas aur nahi", "kuch nahi", "ho gaya", "done"]:
-        return {"intent": "checkout"}
-
-    raw = completion.choices[0].message.content.strip()
+    annotate(detail="llm", cache_hit=False)
 
     try:
-        data = json.loads(raw)
+        raw = await llm_gateway.complete(
+            model="llama-3.1-8b-instant",
+            agent="detect_intent",
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": message}
+            ],
+            temperature=0
+        )
+        data = json.loads(raw.strip())
 
         # Whitelist allowed keys
         allowed_keys = {"intent", "symptom", "medicine", "quantity", "dosage_frequency", "language"}
 
         clean_data = {k: v for k, v in data.items() if k in allowed_keys}
 
+        intent_cache.put(message, clean_data)
         return clean_data
 
     except Exception:
@@ -0,0 +1,105 @@
+import os
+import re
+from ..ttl_cache import LRUTTLCache
+
+
+# =========================
+# INTENT CLASSIFICATION CACHE
+# =========================
+INTENT_CACHE_SIZE = int(os.getenv("INTENT_CACHE_SIZE", "2048"))
+INTENT_CACHE_TTL = float(os.getenv("INTENT_CACHE_TTL", "600"))
+
+DIGITS_RE = re.compile(r"\d+")
+
+# Marker stored in place of a value that was the user's message verbatim (e.g. "symptom")
+_MESSAGE = "\x00message"
+
+
+def normalize_key(message: str):
+    # "Order 2 packs of Dolo" and "order  5 packs of dolo" share one entry; the numbers
+    # are kept aside and substituted back into the cached result
+    text = re.sub(r"\s+", " ", (message or "").lower().strip())
+    digits = DIGITS_RE.findall(text)
+    return DIGITS_RE.sub("#", text), digits
+
+
+def _to_template(result, message, digits):
+    template = {}
+    for key, value in result.items():
+        if isinstance(value, str):
+            if value == message:
+                template[key] = _MESSAGE
+                continue
+            # Digits in extracted text must come from the message, or the result can't be reused
+            pieces = DIGITS_RE.split(value)
+            found = DIGITS_RE.findall(value)
+            if any(d not in digits for d in found):
+                return None
+            template[key] = (pieces, [digits.index(d) for d in found])
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            # Same rule for numbers (2.0 counts as "2"): a literal would be replayed for
+            # every message sharing the template, e.g. quantity 20 for "7 strips of ..."
+            text = str(int(value)) if isinstance(value, float) and value.is_integer() else str(value)
+            if text not in digits:
+                return None
+            template[key] = ("#", digits.index(text), type(value))
+        else:
+            template[key] = value
+    return template
+
+
+def _from_template(template, message, digits):
+    result = {}
+    for key, value in template.items():
+        if value == _MESSAGE:
+            result[key] = message
+        elif isinstance(value, tuple) and len(value) == 3 and value[0] == "#":
+            result[key] = value[2](digits[value[1]])
+        elif isinstance(value, tuple):
+            pieces, positions = value
+            out = pieces[0]
+            for piece, pos in zip(pieces[1:], positions):
+                out += digits[pos] + piece
+            result[key] = out
+        else:
+            result[key] = value
+    return result
+
+
+class IntentCache:
+    """
+    LRU + TTL cache for LLM intent classifications.
+
+    Keys are the normalized message with digit runs replaced by placeholders;
+    values are templates that get the current message's numbers substituted back in.
+    Safe to share across the FastAPI threadpool.
+    """
+
+    def __init__(self, maxsize: int = INTENT_CACHE_SIZE, ttl: float = INTENT_CACHE_TTL):
+        self._cache = LRUTTLCache(maxsize, ttl)
+
+    def get(self, message: str):
+        key, digits = normalize_key(message)
+        template = self._cache.get(key)
+        if template is None:
+            return None
+
+        try:
+            return _from_template(template, message, digits)
+        except (IndexError, ValueError):
+            return None
+
+    def put(self, message: str, result: dict):
+        key, digits = normalize_key(message)
+        template = _to_template(result, message, digits)
+        if template is not None:
+            self._cache.put(key, template)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        return self._cache.stats()
+
+
+intent_cache = IntentCache()
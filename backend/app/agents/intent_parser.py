@@ -0,0 +1,180 @@
+import re
+import threading
+
+
+# =========================
+# DETERMINISTIC FAST-PATH INTENT PARSER
+# =========================
+# Runs before the Groq classifier. Returns a result only when the message fits one of
+# the grammars below unambiguously; anything else returns None and goes to the LLM.
+
+EMERGENCY_WORDS = ["chest pain", "breathing", "bleeding"]
+
+SYMPTOM_WORDS = ["feel", "pain", "tired", "headache", "allergy", "skin"]
+
+# Extra symptom phrasing on top of the keywords above (English + Hinglish)
+SYMPTOM_PATTERNS = [
+    r"\bi (?:have|got|am having|'ve got) (?:a |an )?(?:bad |mild |severe |slight )?(?:cold|cough|fever|flu|rash|itch\w*|acne|sore throat|runny nose|stomach ache|diarrh\w+|constipation|insomnia|nausea)\b",
+    r"\bsuffering from\b",
+    r"\b(?:medicine|something|anything|dawai|dawa) (?:for|to treat|ke liye)\b",
+    r"\b(?:dard|bukhar|khansi|zukam|sardi|ulti|kamzori|thakan|khujli)\b",
+    r"\b(?:ho raha hai|ho rahi hai|ho raha|ho rahi)\b",
+    r"\bsymptoms?\b",
+    r"\b(?:can't|cannot|cant) sleep\b",
+]
+
+CHECKOUT_PHRASES = {
+    "no", "nothing", "that's all", "checkout", "buy now", "no thanks", "nope", "nahi",
+    "bas", "bas aur nahi", "kuch nahi", "ho gaya", "done",
+    # common variants of the same replies
+    "that's it", "thats all", "thats it", "nothing else", "no thank you", "check out",
+    "proceed to checkout", "go to checkout", "place order", "pay now", "bas itna hi",
+    "aur kuch nahi", "kuch nahi chahiye", "ho gaya bas",
+}
+
+HINGLISH_WORDS = {
+    "kya", "bhai", "nahi", "nahin", "hai", "hain", "chahiye", "chaiye", "dawai", "dawa",
+    "mujhe", "muje", "mera", "meri", "mere", "karo", "karna", "dedo", "dena", "bas",
+    "gaya", "kuch", "aur", "wala", "wali", "dard", "saans", "bukhar", "khansi", "thoda",
+    "jaldi", "accha", "acha", "theek", "haan", "yaar", "bhejo", "mangwa", "raha", "rahi",
+    "ke", "liye", "kitna", "kaunsi", "hoga", "zukam", "sardi",
+}
+
+UNIT_WORDS = r"(?:packs?|packets?|boxes?|box|strips?|bottles?|units?|pcs|pieces|tubes?|tablets?|tabs?|capsules?|caps|patta|dabba)"
+
+# "500 mg", "1000 iu", "2.5%" are strengths, part of the product name, never a count
+STRENGTH_UNITS = r"(?:(?:mg|ml|mcg|µg|ug|g|iu)\b|%)"
+STRENGTH = r"(?![\d.,]|\s*" + STRENGTH_UNITS + r")"
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "ek": 1, "do": 2, "teen": 3, "char": 4, "paanch": 5,
+}
+# digits may touch their unit ("2packs"); number words must stand alone ("do" vs "dolo")
+QTY = r"(\d+" + STRENGTH + r"|(?:" + "|".join(NUMBER_WORDS) + r")\b)"
+
+# "order 2 packs of X", "buy X", "i want to order 3 X", "please add 1 box of X"
+ORDER_EN = re.compile(
+    r"^(?:please |pls |can you |could you |i'd like to |i would like to |i want to |i need to |i wanna )?"
+    r"(?:order|buy|purchase|add|get me|send me|give me)\s+"
+    r"(?:" + QTY + r"\s*(?:" + UNIT_WORDS + r"\s+)?(?:of\s+)?)?"
+    r"(?P<medicine>.+?)"
+    r"(?:\s+x\s*" + QTY + r"|\s+" + QTY + r"\s*" + UNIT_WORDS + r")?"
+    r"(?: please| pls)?$"
+)
+
+# "paracetamol chahiye", "2 packet crocin de do", "dolo 650 bhejo"
+ORDER_HI = re.compile(
+    r"^(?:mujhe |muje |bhai |please )?"
+    r"(?:" + QTY + r"\s*(?:" + UNIT_WORDS + r"\s+)?)?"
+    r"(?P<medicine>.+?)\s+"
+    # a trailing count needs its unit: "omega 3 bhejo" is Omega-3, not three packs
+    r"(?:" + QTY + r"\s*" + UNIT_WORDS + r"\s+)?"
+    r"(?:chahiye|chaiye|de do|dedo|dena|bhejo|bhej do|mangwa do|order karo|order kar do)(?: bhai| please| yaar)?$"
+)
+
+BARE_QUANTITY = re.compile(r"^" + QTY + r"(?:\s*" + UNIT_WORDS + r")?$")
+
+STOCK_CHECK = [
+    re.compile(r"^(?:is|are) (?P<medicine>.+?) (?:available|in stock)$"),
+    re.compile(r"^do you (?:have|sell|stock|carry) (?P<medicine>.+?)(?: in stock)?$"),
+    re.compile(r"^(?P<medicine>.+?) (?:available hai|milega|mil jayega|hai kya)$"),
+]
+
+# Order captures that are really requests for advice ("buy something for headache")
+VAGUE_MEDICINE = re.compile(r"^(?:some|any)(?:thing|one)?\b|\b(?:for|ke liye)\b|^(?:medicine|medicines|dawai|dawa)$")
+
+# Captures left over when the grammar misread a count or unit as the product ("buy 3", "order tablets of X")
+NOT_A_MEDICINE = re.compile(
+    r"^(?:[\d.,\s]+(?:" + STRENGTH_UNITS + r")?|(?:" + "|".join(NUMBER_WORDS) + r"))$|^" + UNIT_WORDS + r"\b"
+)
+
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "by_intent": {}}
+
+
+def normalize(message: str):
+    text = (message or "").lower().strip()
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(" .!?,")
+
+
+def detect_language(text: str):
+    words = set(re.findall(r"[a-z']+", text))
+    return "hinglish" if words & HINGLISH_WORDS else "english"
+
+
+def _quantity(*groups):
+    for g in groups:
+        if g:
+            return int(g) if g.isdigit() else NUMBER_WORDS[g]
+    return None
+
+
+def _order(match, language):
+    medicine = match.group("medicine").strip(" ,.")
+    if not medicine or VAGUE_MEDICINE.search(medicine) or NOT_A_MEDICINE.search(medicine):
+        return None
+    numbers = [g for i, g in enumerate(match.groups()) if g and i != match.re.groupindex["medicine"] - 1]
+    return {"intent": "order", "medicine": medicine, "quantity": _quantity(*numbers), "language": language}
+
+
+def _parse(message: str):
+    text = normalize(message)
+    if not text:
+        return None
+
+    language = detect_language(text)
+
+    if any(word in text for word in EMERGENCY_WORDS):
+        return {"intent": "emergency", "language": language}
+
+    if text in CHECKOUT_PHRASES:
+        return {"intent": "checkout", "language": language}
+
+    bare = BARE_QUANTITY.match(text)
+    if bare:
+        # Quantity without a product; the orchestrator asks which medicine
+        return {"intent": "order", "medicine": None, "quantity": _quantity(bare.group(1)), "language": language}
+
+    for grammar in (ORDER_EN, ORDER_HI):
+        match = grammar.match(text)
+        if match:
+            order = _order(match, language)
+            if order:
+                return order
+
+    if any(word in text for word in SYMPTOM_WORDS) or any(re.search(p, text) for p in SYMPTOM_PATTERNS):
+        return {"intent": "recommend", "symptom": message, "language": language}
+
+    for grammar in STOCK_CHECK:
+        match = grammar.match(text)
+        if match and not VAGUE_MEDICINE.search(match.group("medicine")):
+            return {"intent": "stock_check", "medicine": match.group("medicine"), "language": language}
+
+    return None
+
+
+def parse_intent(message: str):
+    result = _parse(message)
+
+    with _stats_lock:
+        if result is None:
+            _stats["misses"] += 1
+        else:
+            _stats["hits"] += 1
+            _stats["by_intent"][result["intent"]] = _stats["by_intent"].get(result["intent"], 0) + 1
+
+    return result
+
+
+def parser_stats():
+    with _stats_lock:
+        total = _stats["hits"] + _stats["misses"]
+        return {
+            "hits": _stats["hits"],
+            "misses": _stats["misses"],
+            "hit_rate": round(_stats["hits"] / total, 4) if total else 0.0,
+            "by_intent": dict(_stats["by_intent"]),
+        }
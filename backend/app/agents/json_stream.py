@@ -0,0 +1,64 @@
+import re
+
+
+# =========================
+# INCREMENTAL JSON STRING FIELD READER
+# =========================
+ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class JsonFieldStreamer:
+    """
+    Pulls the value of one top-level string field out of a JSON object while it is
+    still being generated, so e.g. the master agent's "reason" can be shown token by
+    token. Feed it raw deltas; each call returns the newly decoded characters.
+    """
+
+    def __init__(self, field: str):
+        self._opening = re.compile(r'"' + re.escape(field) + r'"\s*:\s*"')
+        self._buffer = ""
+        self._pos = None
+        self.done = False
+
+    def feed(self, chunk: str):
+        if self.done or not chunk:
+            return ""
+
+        self._buffer += chunk
+        if self._pos is None:
+            match = self._opening.search(self._buffer)
+            if not match:
+                return ""
+            self._pos = match.end()
+
+        buf = self._buffer
+        out = []
+        i = self._pos
+        while i < len(buf):
+            c = buf[i]
+            if c == '"':
+                self.done = True
+                i += 1
+                break
+            if c == "\\":
+                # Wait for the rest of an escape sequence split across deltas
+                if i + 1 >= len(buf):
+                    break
+                esc = buf[i + 1]
+                if esc == "u":
+                    if i + 6 > len(buf):
+                        break
+                    try:
+                        out.append(chr(int(buf[i + 2:i + 6], 16)))
+                    except ValueError:
+                        pass
+                    i += 6
+                    continue
+                out.append(ESCAPES.get(esc, esc))
+                i += 2
+                continue
+            out.append(c)
+            i += 1
+
+        self._pos = i
+        return "".join(out)
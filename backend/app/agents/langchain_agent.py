@@ -1,11 +1,13 @@
 from langchain_openai import ChatOpenAI
 from langchain.agents import initialize_agent, AgentType
 from app.agents.tools import TOOLS
-import os
+from app.llm_providers import openai_client_config
 
+# LLM_PROVIDER=stub points the OpenAI client at the local stub server (app.llm_stub)
 llm = ChatOpenAI(
     model="gpt-4o-mini",
-    temperature=0
+    temperature=0,
+    **openai_client_config()
 )
 
 agent = initialize_agent(
@@ -1,11 +1,12 @@
-import os
-from dotenv import load_dotenv
-from groq import Groq
 import json
+from sqlalchemy import select
 from ..models import Medicine, Prescription
-
-load_dotenv()
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+from ..neighbours import neighbour_table, MASTER_ALTERNATIVES
+from ..llm_gateway import llm_gateway
+from ..database import release_async_connection, run_sync_session
+from .decision_cache import decision_cache, decision_key
+from .json_stream import JsonFieldStreamer
+from ..tracing import annotate
 
 MASTER_AGENT_PROMPT = """
 🧠 ULTRA-STRONG MASTER PROMPT
@@ -98,23 +99,61 @@ CRITICAL: You must return ONLY raw JSON matching this schema exactly. Do not inc
 }}
 """
 
-def evaluate_master_agent(db, user_id, medicine_name, quantity, symptoms="None Provided", language="english"):
+def _parse_verdict(raw):
+    # Without JSON mode (streaming) the model occasionally wraps the object in fences
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return json.loads(raw[raw.index("{"):raw.rindex("}") + 1])
+
+
+async def _stream_verdict(messages, on_token):
+    reason = JsonFieldStreamer("reason")
+    parts = []
+    async for delta in llm_gateway.stream(
+        model="llama-3.3-70b-versatile",
+        agent="evaluate_master_agent",
+        messages=messages,
+        temperature=0
+    ):
+        parts.append(delta)
+        text = reason.feed(delta)
+        if text:
+            await on_token(text)
+    return "".join(parts)
+
+
+async def evaluate_master_agent(db, user_id, medicine_name, quantity, symptoms="None Provided", language="english", on_token=None):
+    """
+    7-step compliance verdict for one order line (db is an AsyncSession). When
+    on_token is given, the "reason" text is passed to it piece by piece as the
+    model generates it.
+    """
     # Retrieve DB context
-    med = db.query(Medicine).filter(Medicine.name == medicine_name).first()
+    med = await db.scalar(select(Medicine).filter(Medicine.name == medicine_name).limit(1))
     if not med:
         return {"status": "rejected", "reason": "Medicine not found in database.", "approved_quantity": 0, "trace": ["Medicine check failed"]}
 
-    # Build Alternative Inventory Context
-    all_meds = db.query(Medicine).all()
-    inventory_lines = [f"- {m.name} | Stock: {m.stock} | Rx: {'Yes' if m.prescription_required else 'No'} | {m.description}" for m in all_meds]
-    inventory_context = "\n".join(inventory_lines)
+    # Build Alternative Inventory Context (bounded: precomputed in-stock neighbours only)
+    alternatives = await run_sync_session(neighbour_table.alternatives, med.id, limit=MASTER_ALTERNATIVES)
+    inventory_lines = [f"- {m.name} | Stock: {m.stock} | Rx: {'Yes' if m.prescription_required else 'No'} | {m.description}" for m in alternatives]
+    inventory_context = "\n".join(inventory_lines) or "No similar in-stock medicines available."
 
     # Prescription Context
     is_rx_required = med.prescription_required
-    rx = db.query(Prescription).filter(
+    prescriptions = (await db.scalars(select(Prescription).filter(
         Prescription.patient_id == user_id,
-        Prescription.medicine_name.ilike(f"%{medicine_name}%")
-    ).first()
+        Prescription.medicine_id == med.id
+    ).order_by(Prescription.id))).all()
+    rx = prescriptions[0] if prescriptions else None
+
+    cache_key = decision_key(med, quantity, prescriptions, alternatives, symptoms, language)
+    cached = decision_cache.get(cache_key, quantity, user_id)
+    if cached is not None:
+        annotate(cache_hit=True, detail="decision_cache")
+        cached.setdefault("trace", []).append("Verdict served from decision cache (identical order facts)")
+        return cached
+    annotate(cache_hit=False, detail="stream" if on_token is not None else "llm")
     
     prompt = MASTER_AGENT_PROMPT.format(
         language=language.upper(),
@@ -130,17 +169,26 @@ def evaluate_master_agent(db, user_id, medicine_name, quantity, symptoms="None P
         inventory_context=inventory_context
     )
 
+    messages = [
+        {"role": "system", "content": "You must respond with raw JSON only."},
+        {"role": "user", "content": prompt}
+    ]
+
+    await release_async_connection(db)
     try:
-        completion = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {"role": "system", "content": "You must respond with raw JSON only."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0,
-            response_format={"type": "json_object"}
-        )
-        data = json.loads(completion.choices[0].message.content)
+        if on_token is not None:
+            # Groq's JSON mode can't be streamed; the prompt alone pins the schema here
+            raw = await _stream_verdict(messages, on_token)
+        else:
+            raw = await llm_gateway.complete(
+                model="llama-3.3-70b-versatile",
+                agent="evaluate_master_agent",
+                messages=messages,
+                temperature=0,
+                response_format={"type": "json_object"}
+            )
+        data = _parse_verdict(raw)
+        decision_cache.put(cache_key, quantity, user_id, data)
         return data
 
     except Exception as e:
@@ -1,12 +1,26 @@
+from sqlalchemy import select
+
 from .intent_agent import detect_intent
 from .master_agent import evaluate_master_agent
 from .action_agent import execute_order
 
 from ..services import recommend_from_symptom, fuzzy_match_medicine
 from ..models import PendingOrder, Medicine
+from ..database import release_async_connection, run_sync_session
+from ..tracing import span
+
+
+async def _emit(emit, event, payload):
+    if emit is not None:
+        await emit(event, payload)
 
 
-def run_pharmacy_agent(db, user_id, message):
+async def run_pharmacy_agent(db, user_id, message, emit=None):
+    """
+    Runs the agent chain for one chat message on an AsyncSession. emit, if given,
+    is an async callback(event, payload) told about each stage as it completes
+    (see /chat/stream).
+    """
 
     trace = []
 
@@ -34,9 +48,10 @@ def run_pharmacy_agent(db, user_id, message):
     # =====================================================
     # 🔁 2️⃣ CONTINUE PENDING ORDER (MULTI-TURN SUPPORT)
     # =====================================================
-    pending = db.query(PendingOrder).filter(
-        PendingOrder.patient_id == user_id
-    ).first()
+    with span("pending_order"):
+        pending = await db.scalar(select(PendingOrder).filter(
+            PendingOrder.patient_id == user_id
+        ).limit(1))
 
     if pending:
         msg_lower = message.strip().lower()
@@ -45,50 +60,54 @@ def run_pharmacy_agent(db, user_id, message):
             quantity = int(message.strip())
             medicine = pending.medicine_name
             trace.append("Continuing pending order")
-            db.delete(pending)
-            db.commit()
+            await db.delete(pending)
+            await db.commit()
             data = {"intent": "order", "medicine": medicine, "quantity": quantity, "dosage_frequency": 1}
 
         elif msg_lower in ["option a", "a", "proceed", "yes"]:
             trace.append("[Orchestrator] User confirmed Option A. Relaying confirmation to pending order tracker.")
             medicine = pending.medicine_name
-            db.delete(pending)
-            db.commit()
+            await db.delete(pending)
+            await db.commit()
             data = {"intent": "order", "medicine": medicine, "quantity": 1, "dosage_frequency": 1, "confirmed": True}
 
         elif msg_lower in ["option c", "c", "cancel", "no", "nahi chahiye", "cancel karo"]:
             trace.append("[Orchestrator] User cancelled order via Option C. Clearing session state.")
-            db.delete(pending)
-            db.commit()
+            await db.delete(pending)
+            await db.commit()
             is_hindi = any(w in msg_lower for w in ["karo", "nahi", "chahiye"])
             msg = "Order cancel kar diya hai. Batao agar kuch aur chahiye toh!" if is_hindi else "Order cancelled. Let me know if you need anything else."
             return {"type": "text", "message": msg, "trace": trace}
 
         elif msg_lower in ["option b", "b", "modify", "change", "badlo"]:
             trace.append("[Orchestrator] User requested modification via Option B. Awaiting new input.")
-            db.delete(pending)
-            db.commit()
+            await db.delete(pending)
+            await db.commit()
             is_hindi = any(w in msg_lower for w in ["badlo"])
             msg = "Theek hai, please batao aapko kaunsi dawai ya alternative order karni hai ab." if is_hindi else "Okay, please let me know what medicine or alternative you would like to order instead."
             return {"type": "text", "message": msg, "trace": trace}
 
         else:
             # Fallback for unrecognized pending states, clear and proceed with intent
-            db.delete(pending)
-            db.commit()
-            data = detect_intent(message)
+            await db.delete(pending)
+            await db.commit()
+            with span("intent"):
+                data = await detect_intent(message)
             trace.append(f"[Intent Agent] Analyzed fallback message. Detected: {data}")
 
     else:
         # =====================================================
         # 🤖 3️⃣ INTENT DETECTION
         # =====================================================
-        data = detect_intent(message)
+        await release_async_connection(db)
+        with span("intent"):
+            data = await detect_intent(message)
         trace.append(f"[Intent Agent] Parsed user message. Extracted parameters: {data}")
         trace.append(f"[Orchestrator] Routing flow based on '{data.get('intent', 'unknown')}' intent.")
 
     lang = data.get("language", "english")
     is_hinglish = lang == "hinglish"
+    await _emit(emit, "intent", {"intent": data.get("intent", "unknown"), "data": data, "trace": list(trace)})
 
     # =====================================================
     # 🩺 4️⃣ RECOMMEND FLOW
@@ -103,7 +122,8 @@ def run_pharmacy_agent(db, user_id, message):
                 "trace": trace
             }
 
-        recommendations = recommend_from_symptom(db, symptom)
+        with span("recommend"):
+            recommendations = await recommend_from_symptom(db, symptom)
 
         return {
             "message": f"Aapke symptom '{symptom}' ke hisaab se, main yeh recommend karunga:" if is_hinglish else f"Based on your symptom '{symptom}', I recommend:",
@@ -154,7 +174,9 @@ def run_pharmacy_agent(db, user_id, message):
 
     trace.append(f"[Semantic Matcher] Normalized entity name to: '{filtered}'")
 
-    medicine = fuzzy_match_medicine(db, filtered)
+    with span("match"):
+        # The catalog index is sync; it runs in the threadpool on its own session
+        medicine = await run_sync_session(fuzzy_match_medicine, filtered)
 
     if not medicine:
         return {
@@ -164,11 +186,12 @@ def run_pharmacy_agent(db, user_id, message):
         }
 
     trace.append(f"[Database Interface] Fuzzy matched to verified DB product: '{medicine}'")
+    await _emit(emit, "match", {"medicine": medicine, "trace": trace[-2:]})
 
     if not quantity and not data.get("confirmed"):
         pending_order = PendingOrder(patient_id=user_id, medicine_name=medicine)
         db.add(pending_order)
-        db.commit()
+        await db.commit()
         return {
             "type": "ask_quantity",
             "medicine": medicine,
@@ -186,23 +209,37 @@ def run_pharmacy_agent(db, user_id, message):
         approved_quantity = quantity
         trace.append("[Master Agent] Bypassed full safety loop due to direct user confirmation of previous suggestions.")
         master_decision = {}
+        await _emit(emit, "verdict", {"status": status, "approved_quantity": approved_quantity, "requires_confirmation": False, "reason": reason, "trace": trace[-1:]})
     else:
         # 🤖 MASTER AGENT 7-STEP VALIDATION
         # Provide symptoms context if coming from recommend flow, else None
         symptoms = data.get("symptom", "None Provided")
+        stage_start = len(trace)
         trace.append(f"[Orchestrator] Calling Master Agent to validate 7-step medical compliance for {medicine}...")
-        master_decision = evaluate_master_agent(db, user_id, medicine, quantity, symptoms=symptoms, language=lang)
+        on_token = None
+        if emit is not None:
+            async def on_token(text):
+                await emit("token", {"text": text})
+        with span("master_agent"):
+            master_decision = await evaluate_master_agent(db, user_id, medicine, quantity, symptoms=symptoms, language=lang, on_token=on_token)
         
         trace.append(f"[Master Agent] Validation complete. Status: {master_decision.get('status', 'unknown').upper()}")
         if master_decision.get('reason'):
             trace.append(f"[Master Agent] Rationale: {master_decision.get('reason')}")
+        await _emit(emit, "verdict", {
+            "status": master_decision.get("status"),
+            "approved_quantity": master_decision.get("approved_quantity"),
+            "requires_confirmation": bool(master_decision.get("requires_confirmation")),
+            "reason": master_decision.get("reason", ""),
+            "trace": trace[stage_start:]
+        })
 
         # 🛑 Handle Customer Confirmation Loop (Rule 6)
         if master_decision.get("requires_confirmation"):
             # Store pending order to catch Option A/B/C on next turn
             pending_order = PendingOrder(patient_id=user_id, medicine_name=medicine)
             db.add(pending_order)
-            db.commit()
+            await db.commit()
 
             alts = master_decision.get("suggested_alternatives", [])
             opts_en = "\n\n**Do you want to proceed with:**\n- **Option A:** Proceed\n- **Option B:** Modify\n- **Option C:** Cancel"
@@ -241,7 +278,8 @@ def run_pharmacy_agent(db, user_id, message):
 
     elif status == "partial":
         # Calculate pricing
-        product_record = db.query(Medicine).filter(Medicine.name == medicine).first()
+        with span("pricing"):
+            product_record = await db.scalar(select(Medicine).filter(Medicine.name == medicine).limit(1))
         unit_price = float(product_record.price if product_record and product_record.price else 0.0)
         approved_quantity = int(approved_quantity)
         total_price = round(approved_quantity * unit_price, 2)
@@ -261,7 +299,8 @@ def run_pharmacy_agent(db, user_id, message):
 
     else:
         # Full approval
-        product_record = db.query(Medicine).filter(Medicine.name == medicine).first()
+        with span("pricing"):
+            product_record = await db.scalar(select(Medicine).filter(Medicine.name == medicine).limit(1))
         unit_price = float(product_record.price if product_record and product_record.price else 0.0)
         approved_quantity = int(approved_quantity)
         total_price = round(approved_quantity * unit_price, 2)
@@ -1,22 +1,31 @@
-from ..services import check_recent_purchase, check_prescription
+from ..services import check_recent_purchase
 from ..models import Prescription
 
-def run_safety_checks(db, user_id, medicine):
+def evaluate_safety(medicine, recently_bought: bool, has_prescription: bool):
+    """The safety rules on already-loaded facts, so a whole cart can be checked without queries."""
 
     # Overdose check
-    if check_recent_purchase(db, user_id, medicine):
+    if recently_bought:
         return {"status": "blocked", "reason": "recent_purchase"}
 
     # Prescription check
-    prescription_required = check_prescription(db, medicine)
+    if medicine.prescription_required and not has_prescription:
+        return {"status": "blocked", "reason": "prescription_required"}
 
-    if prescription_required.get("prescription_required"):
-        existing = db.query(Prescription).filter(
-            Prescription.patient_id == user_id,
-            Prescription.medicine_name.ilike(f"%{medicine}%")
-        ).first()
+    return {"status": "safe"}
 
-        if not existing:
-            return {"status": "blocked", "reason": "prescription_required"}
+def run_safety_checks(db, user_id, medicine):
+    """`medicine` is the catalog Medicine row being ordered."""
+
+    has_prescription = False
+    if medicine.prescription_required:
+        has_prescription = db.query(Prescription.id).filter(
+            Prescription.patient_id == user_id,
+            Prescription.medicine_id == medicine.id
+        ).first() is not None
 
-    return {"status": "safe"}
\ No newline at end of file
+    return evaluate_safety(
+        medicine,
+        recently_bought=check_recent_purchase(db, user_id, medicine.id),
+        has_prescription=has_prescription
+    )
@@ -0,0 +1,219 @@
+import re
+import threading
+from sqlalchemy import func
+from .models import Medicine, Order
+from .catalog_index import catalog_index
+
+
+MAX_SUGGESTIONS = 10
+# Upper bound on ids scanned when a multi-word query has to leave the top lists
+FALLBACK_SCAN_LIMIT = 500
+# Shorter anchors have subtrees too large to scan on a keystroke; they stay top-list only
+MIN_FALLBACK_PREFIX = 3
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str):
+    return TOKEN_RE.findall((text or "").lower())
+
+
+class _Node:
+    __slots__ = ("children", "top", "ids")
+
+    def __init__(self):
+        self.children = {}
+        # medicines with a word ending exactly here (None for pure prefix nodes)
+        self.ids = None
+        # ids of the MAX_SUGGESTIONS most popular medicines anywhere below this node
+        self.top = []
+
+
+# =========================
+# TYPEAHEAD PREFIX TRIE
+# =========================
+class AutocompleteIndex:
+    """
+    Prefix trie over the word tokens of every medicine name.
+
+    Each node keeps its own top-N list ranked by order count, so a lookup is a walk
+    down the prefix plus a slice. The trie follows the catalog version: when it moves,
+    only medicines and orders with ids past the last seen watermark are read and
+    applied to the affected paths.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._root = _Node()
+        self._names = {}
+        self._words = {}
+        # " word1 word2 ..." so a word-prefix test is a single substring check
+        self._joined = {}
+        self._weights = {}
+        self._name_to_id = {}
+        self._last_medicine_id = 0
+        self._last_order_id = 0
+        self._built_version = -1
+
+    def _rank(self, med_id):
+        return (-self._weights.get(med_id, 0), self._names[med_id])
+
+    def _paths(self, med_id):
+        # Every node on the path of every token of the name, deduplicated
+        seen = {}
+        for token in self._words[med_id]:
+            node = self._root
+            for ch in token:
+                node = node.children.get(ch)
+                if node is None:
+                    break
+                seen[id(node)] = node
+        return seen.values()
+
+    def _promote(self, med_id):
+        # Valid for inserts and weight increases: nodes that already rank the id only
+        # need a resort, everywhere else it can only enter the list
+        for node in self._paths(med_id):
+            top = node.top if med_id in node.top else node.top + [med_id]
+            node.top = sorted(top, key=self._rank)[:MAX_SUGGESTIONS]
+
+    def _add_name(self, med_id, name):
+        self._names[med_id] = name
+        self._words[med_id] = tuple(dict.fromkeys(tokenize(name)))
+        self._joined[med_id] = " " + " ".join(self._words[med_id])
+        self._name_to_id.setdefault(name, med_id)
+        self._weights.setdefault(med_id, 0)
+
+        for token in self._words[med_id]:
+            node = self._root
+            for ch in token:
+                node = node.children.setdefault(ch, _Node())
+            if node.ids is None:
+                node.ids = []
+            node.ids.append(med_id)
+
+    def _fill_tops(self):
+        # Post-order pass: a node's top list is the best of its own ids and its children's tops
+        stack = [(self._root, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if not children_done:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children.values())
+                continue
+            pool = set(node.ids or ())
+            for child in node.children.values():
+                pool.update(child.top)
+            node.top = sorted(pool, key=self._rank)[:MAX_SUGGESTIONS]
+
+    def _build(self, db):
+        for med_id, name in db.query(Medicine.id, Medicine.name).order_by(Medicine.id).all():
+            if name:
+                self._add_name(med_id, name)
+            self._last_medicine_id = med_id
+
+        counts = db.query(
+            Order.product_name, func.count(Order.id), func.max(Order.id)
+        ).group_by(Order.product_name).all()
+
+        for product_name, count, max_id in counts:
+            self._last_order_id = max(self._last_order_id, max_id)
+            med_id = self._name_to_id.get(product_name)
+            if med_id is not None:
+                self._weights[med_id] += count
+
+        self._fill_tops()
+
+    def refresh(self, db):
+        if self._built_version == catalog_index.version:
+            return
+
+        with self._lock:
+            version = catalog_index.version
+            if self._built_version == version:
+                return
+
+            if self._built_version == -1:
+                self._build(db)
+                self._built_version = version
+                return
+
+            new_meds = db.query(Medicine.id, Medicine.name).filter(
+                Medicine.id > self._last_medicine_id
+            ).order_by(Medicine.id).all()
+
+            for med_id, name in new_meds:
+                if name:
+                    self._add_name(med_id, name)
+                    self._promote(med_id)
+                self._last_medicine_id = med_id
+
+            new_orders = db.query(
+                Order.product_name, func.count(Order.id), func.max(Order.id)
+            ).filter(
+                Order.id > self._last_order_id
+            ).group_by(Order.product_name).all()
+
+            for product_name, count, max_id in new_orders:
+                self._last_order_id = max(self._last_order_id, max_id)
+                med_id = self._name_to_id.get(product_name)
+                if med_id is None:
+                    continue
+                self._weights[med_id] += count
+                self._promote(med_id)
+
+            self._built_version = version
+
+    def _collect(self, node, out):
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current.ids:
+                out.update(current.ids[:FALLBACK_SCAN_LIMIT - len(out)])
+                if len(out) >= FALLBACK_SCAN_LIMIT:
+                    return
+            stack.extend(current.children.values())
+
+    def _lookup(self, token):
+        node = self._root
+        for ch in token:
+            node = node.children.get(ch)
+            if node is None:
+                return None
+        return node
+
+    def complete(self, db, query: str, limit: int = MAX_SUGGESTIONS):
+        self.refresh(db)
+
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        # Walk the most selective token; every other token must prefix some word of the name
+        anchor = max(tokens, key=len)
+        node = self._lookup(anchor)
+        if node is None:
+            return []
+
+        # The anchor is implied by the node we walked to; only the other words need checking
+        needles = [" " + t for t in tokens if t != anchor]
+
+        def matches(med_id):
+            joined = self._joined[med_id]
+            return all(n in joined for n in needles)
+
+        candidates = [m for m in node.top if matches(m)]
+
+        if len(tokens) > 1 and len(anchor) >= MIN_FALLBACK_PREFIX and len(candidates) < limit and len(node.top) == MAX_SUGGESTIONS:
+            # The anchor's top list was cut by tokens it can't see; fall back to its subtree
+            ids = set()
+            self._collect(node, ids)
+            candidates = sorted((m for m in ids if matches(m)), key=self._rank)
+
+        return [
+            {"id": m, "name": self._names[m], "orders": self._weights.get(m, 0)}
+            for m in candidates[:limit]
+        ]
+
+
+autocomplete_index = AutocompleteIndex()
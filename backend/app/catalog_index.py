@@ -0,0 +1,101 @@
+import threading
+from rapidfuzz import process, utils
+from .models import Medicine
+
+
+# =========================
+# IN-MEMORY CATALOG INDEX
+# =========================
+class CatalogIndex:
+    """
+    Process-wide snapshot of medicine names for fuzzy matching.
+
+    Names are normalized once per catalog version instead of on every chat turn.
+    Anything that writes to `medicines` calls `bump_catalog_version()` after its
+    commit, and the next lookup rebuilds the snapshot.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._built_version = -1
+        # (original names, normalized choices, ids) swapped in as one tuple so
+        # readers never see a half-built index
+        self._snapshot = ([], [], [])
+
+    @property
+    def version(self):
+        return self._version
+
+    def bump(self):
+        with self._lock:
+            self._version += 1
+
+    def refresh(self, db):
+        if self._built_version == self._version:
+            return
+
+        with self._lock:
+            version = self._version
+            if self._built_version == version:
+                return
+
+            rows = [row for row in db.query(Medicine.name, Medicine.id).all() if row[0]]
+            names = [row[0] for row in rows]
+            choices = [utils.default_process(name) for name in names]
+            ids = [row[1] for row in rows]
+
+            self._snapshot = (names, choices, ids)
+            self._built_version = version
+
+    def _best(self, db, input_name, score_cutoff):
+        # (name, id) of the best match, read from a single snapshot
+        self.refresh(db)
+        names, choices, ids = self._snapshot
+
+        if not names:
+            return None
+
+        query = utils.default_process(input_name or "")
+        if not query:
+            return None
+
+        # match format: (matched_choice, score, index)
+        match = process.extractOne(query, choices, processor=None, score_cutoff=score_cutoff)
+        if match:
+            return names[match[2]], ids[match[2]]
+
+        return None
+
+    def match(self, db, input_name: str, score_cutoff: int = 65):
+        best = self._best(db, input_name, score_cutoff)
+        return best[0] if best else None
+
+    def match_id(self, db, input_name: str, score_cutoff: int = 65):
+        best = self._best(db, input_name, score_cutoff)
+        return best[1] if best else None
+
+
+catalog_index = CatalogIndex()
+
+
+def bump_catalog_version():
+    catalog_index.bump()
+
+
+# Order history and prescriptions spell products slightly differently from the
+# catalog; be stricter than the chat matcher so a write never lands on the wrong product
+RESOLVE_SCORE_CUTOFF = 80
+
+
+def resolve_medicine_id(db, name: str, index: CatalogIndex = None):
+    """
+    Catalog id for a free-text product name (exact name first, then fuzzy), or None.
+    Used to fill medicine_id on orders, prescriptions and refill alerts.
+    """
+    if not name:
+        return None
+    exact = db.query(Medicine.id).filter(Medicine.name == name).first()
+    if exact:
+        return exact[0]
+    return (index or catalog_index).match_id(db, name, score_cutoff=RESOLVE_SCORE_CUTOFF)
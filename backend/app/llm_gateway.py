@@ -0,0 +1,191 @@
+import os
+import asyncio
+import random
+import time
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from .llm_providers import get_provider, LLM_PROVIDER, RETRYABLE_ERRORS, TIMEOUT_ERRORS
+from .metrics import llm_call_duration, llm_retries
+
+
+# =========================
+# SHARED ASYNC LLM GATEWAY
+# =========================
+# Every agent goes through this module instead of building its own client.
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+# Global cap on in-flight LLM requests; callers beyond it wait their turn
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+# Pooled keep-alive connections to the provider
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", str(LLM_MAX_CONCURRENCY)))
+
+
+def backoff_delay(attempt: int, retry_after=None):
+    # Full jitter: spreads retries of concurrent chats instead of hitting the API in lockstep
+    if retry_after is not None:
+        return min(retry_after, LLM_BACKOFF_MAX)
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMGateway:
+    """
+    Global semaphore on in-flight requests, a timeout on every call and bounded
+    retries with jittered backoff, in front of a pluggable provider (llm_providers).
+
+    The semaphore is created lazily per event loop, and so is the provider's client,
+    so importing an agent doesn't need GROQ_API_KEY.
+    """
+
+    def __init__(self, provider=None, max_concurrency: int = LLM_MAX_CONCURRENCY, timeout: float = LLM_TIMEOUT, max_retries: int = LLM_MAX_RETRIES):
+        self.provider = provider or get_provider(
+            LLM_PROVIDER,
+            max_connections=LLM_MAX_CONNECTIONS,
+            timeout=timeout,
+            connect_timeout=LLM_CONNECT_TIMEOUT,
+        )
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        # (loop, semaphore)
+        self._state = (None, None)
+        self._in_flight = 0
+        self._stats = {"calls": 0, "retries": 0, "failures": 0, "timeouts": 0}
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        state = self._state
+        if state[0] is loop:
+            return state[1]
+
+        with self._lock:
+            if self._state[0] is not loop:
+                self._state = (loop, asyncio.Semaphore(self.max_concurrency))
+            return self._state[1]
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _retry_delay(self, error, attempt: int, agent: str):
+        # Bookkeeping for a failed attempt; returns the backoff, or None when out of retries
+        if isinstance(error, TIMEOUT_ERRORS):
+            self._count("timeouts")
+        if not isinstance(error, RETRYABLE_ERRORS) or attempt >= self.max_retries:
+            self._count("failures")
+            return None
+        self._count("retries")
+        llm_retries.labels(agent).inc()
+        return backoff_delay(attempt, _retry_after(error))
+
+    @staticmethod
+    def _observe(agent, model, started, error=None):
+        # Whole-call latency as the agent sees it: semaphore wait, retries and backoff included
+        if error is None:
+            outcome = "ok"
+        elif isinstance(error, TIMEOUT_ERRORS):
+            outcome = "timeout"
+        else:
+            outcome = "error"
+        llm_call_duration.labels(agent, model, outcome).observe(time.perf_counter() - started)
+
+    async def complete(self, model: str, messages: list, timeout: float = None, agent: str = "other", **params):
+        """
+        Run a chat completion and return the message content.
+        Raises the last provider error once the retry budget is spent.
+        `agent` only labels the call in /metrics.
+        """
+        semaphore = self._semaphore()
+        timeout = timeout or self.timeout
+        started = time.perf_counter()
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with semaphore:
+                    self._in_flight += 1
+                    self._count("calls")
+                    try:
+                        content = await self.provider.complete(model, messages, timeout, **params)
+                    finally:
+                        self._in_flight -= 1
+                self._observe(agent, model, started)
+                return content
+
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, agent)
+                if delay is None:
+                    self._observe(agent, model, started, e)
+                    raise
+                print(f"LLM call to {model} failed ({type(e).__name__}), retry {attempt + 1} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def stream(self, model: str, messages: list, timeout: float = None, agent: str = "other", **params):
+        """
+        Async generator over the content deltas of a streamed chat completion.
+        Retries only until the first token arrives; after that an error is raised to the caller.
+        """
+        semaphore = self._semaphore()
+        timeout = timeout or self.timeout
+        started = time.perf_counter()
+
+        for attempt in range(self.max_retries + 1):
+            streaming = False
+            try:
+                async with semaphore:
+                    self._in_flight += 1
+                    self._count("calls")
+                    try:
+                        async for delta in self.provider.stream(model, messages, timeout, **params):
+                            streaming = True
+                            yield delta
+                    finally:
+                        self._in_flight -= 1
+                self._observe(agent, model, started)
+                return
+
+            except Exception as e:
+                if streaming:
+                    # Tokens already went out; a retry would repeat them
+                    self._count("failures")
+                    self._observe(agent, model, started, e)
+                    raise
+                delay = self._retry_delay(e, attempt, agent)
+                if delay is None:
+                    self._observe(agent, model, started, e)
+                    raise
+                print(f"LLM stream from {model} failed ({type(e).__name__}), retry {attempt + 1} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def aclose(self):
+        await self.provider.aclose()
+        self._state = (None, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                "provider": self.provider.name,
+                "in_flight": self._in_flight,
+                "max_concurrency": self.max_concurrency,
+                "timeout_seconds": self.timeout,
+                "max_retries": self.max_retries,
+            }
+
+
+llm_gateway = LLMGateway()
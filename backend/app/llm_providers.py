@@ -0,0 +1,144 @@
+import os
+import asyncio
+import threading
+import httpx
+from abc import ABC, abstractmethod
+from groq import AsyncGroq, APIConnectionError, APITimeoutError, RateLimitError, InternalServerError
+from .tracing import record_llm_usage
+
+
+# =========================
+# LLM PROVIDERS
+# =========================
+# The gateway handles retries, the concurrency cap and stats; a provider only
+# knows how to send one request. Pick one with LLM_PROVIDER=groq|stub.
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "groq").lower()
+
+
+class LLMTransientError(Exception):
+    """Provider-neutral failure worth retrying (overload, dropped connection)."""
+
+
+class LLMTimeoutError(LLMTransientError):
+    pass
+
+
+# Transient failures the gateway retries (Groq timeouts are a subclass of the connection error);
+# anything else (bad request, auth, invalid model) fails straight away
+RETRYABLE_ERRORS = (LLMTransientError, APIConnectionError, RateLimitError, InternalServerError)
+TIMEOUT_ERRORS = (LLMTimeoutError, APITimeoutError)
+
+
+class LLMProvider(ABC):
+    """
+    Interface every backend implements. Both methods take OpenAI-style chat
+    messages plus completion params (temperature, max_tokens, response_format, ...)
+    and report token usage through tracing.record_llm_usage.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def complete(self, model: str, messages: list, timeout: float, **params):
+        """Return the message content of one chat completion."""
+
+    @abstractmethod
+    async def stream(self, model: str, messages: list, timeout: float, **params):
+        """Async generator over content deltas."""
+        yield
+
+    async def aclose(self):
+        pass
+
+
+class GroqProvider(LLMProvider):
+    """
+    One pooled AsyncGroq client per event loop, so scripts that call asyncio.run()
+    more than once get a client bound to their own loop.
+    """
+
+    name = "groq"
+
+    def __init__(self, max_connections: int, timeout: float, connect_timeout: float):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self._lock = threading.Lock()
+        # (loop, client)
+        self._state = (None, None)
+
+    def _build_client(self):
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+            ),
+            timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+        )
+        # Retries are done by the gateway (with jitter and the semaphore released), not inside the SDK
+        return AsyncGroq(api_key=os.getenv("GROQ_API_KEY"), http_client=http_client, max_retries=0)
+
+    def _client(self):
+        loop = asyncio.get_running_loop()
+        if self._state[0] is loop:
+            return self._state[1]
+
+        with self._lock:
+            if self._state[0] is not loop:
+                self._state = (loop, self._build_client())
+            return self._state[1]
+
+    async def complete(self, model: str, messages: list, timeout: float, **params):
+        completion = await self._client().chat.completions.create(
+            model=model,
+            messages=messages,
+            timeout=timeout,
+            **params
+        )
+        usage = completion.usage
+        record_llm_usage(model, usage.prompt_tokens if usage else 0, usage.completion_tokens if usage else 0)
+        return completion.choices[0].message.content
+
+    async def stream(self, model: str, messages: list, timeout: float, **params):
+        response = await self._client().chat.completions.create(
+            model=model,
+            messages=messages,
+            timeout=timeout,
+            stream=True,
+            **params
+        )
+        usage = None
+        async for chunk in response:
+            # Groq reports usage on the final chunk under x_groq
+            usage = (chunk.x_groq.usage if chunk.x_groq else None) or chunk.usage or usage
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+        record_llm_usage(model, usage.prompt_tokens if usage else 0, usage.completion_tokens if usage else 0)
+
+    async def aclose(self):
+        loop, client = self._state
+        if client is not None and loop is asyncio.get_running_loop():
+            await client.close()
+        self._state = (None, None)
+
+
+def openai_client_config(name: str = LLM_PROVIDER):
+    """
+    base_url / api_key for OpenAI-style clients (langchain_agent). Empty for groq,
+    so the client keeps its own defaults (OPENAI_API_KEY, api.openai.com).
+    """
+    if name == "stub":
+        return {"base_url": os.getenv("LLM_STUB_URL", "http://127.0.0.1:8765/v1"), "api_key": "stub"}
+    if name == "groq":
+        return {}
+    raise ValueError(f"Unknown LLM_PROVIDER '{name}' (expected 'groq' or 'stub')")
+
+
+def get_provider(name: str = LLM_PROVIDER, **groq_settings):
+    if name == "stub":
+        from .llm_stub import StubProvider
+        return StubProvider()
+    if name == "groq":
+        return GroqProvider(**groq_settings)
+    raise ValueError(f"Unknown LLM_PROVIDER '{name}' (expected 'groq' or 'stub')")
@@ -0,0 +1,298 @@
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import threading
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from .llm_providers import LLMProvider, LLMTransientError, LLMTimeoutError
+from .agents.intent_parser import detect_language
+from .tracing import record_llm_usage
+
+
+# =========================
+# OFFLINE STUB LLM (LOAD TESTING)
+# =========================
+# Answers the prompts this app sends (intent, master agent, recommendation, OCR,
+# descriptions) with schema-valid JSON derived from the prompt itself, after a
+# simulated delay. No network, no quota.
+#
+#   LLM_STUB_LATENCY      "lognormal:<median_ms>,<sigma>" | "uniform:<lo_ms>,<hi_ms>" | "fixed:<ms>" | "none"
+#   LLM_STUB_ERROR_RATE   share of calls failing with a retryable error (0..1)
+#   LLM_STUB_TIMEOUT_RATE share of calls that hang past the caller's timeout (0..1)
+#   LLM_STUB_TOKENS_PER_SEC  streaming speed after the first token
+#   LLM_STUB_SEED         seed for the latency / failure draws
+LLM_STUB_LATENCY = os.getenv("LLM_STUB_LATENCY", "lognormal:400,0.5")
+LLM_STUB_ERROR_RATE = float(os.getenv("LLM_STUB_ERROR_RATE", "0"))
+LLM_STUB_TIMEOUT_RATE = float(os.getenv("LLM_STUB_TIMEOUT_RATE", "0"))
+LLM_STUB_TOKENS_PER_SEC = float(os.getenv("LLM_STUB_TOKENS_PER_SEC", "250"))
+LLM_STUB_SEED = int(os.getenv("LLM_STUB_SEED", "42"))
+
+SAFE_MAX_QUANTITY = 5
+CHARS_PER_TOKEN = 4
+
+ORDER_WORDS = {"order", "buy", "purchase", "need", "want", "chahiye", "send", "bhejo", "add", "get"}
+STOCK_WORDS = {"available", "stock", "have", "milega"}
+FILLER_WORDS = ORDER_WORDS | STOCK_WORDS | {
+    "i", "me", "to", "a", "an", "of", "some", "please", "pls", "packs", "pack", "box", "strips",
+    "mujhe", "bhai", "do", "you", "is", "are", "in", "the", "can", "could", "would", "like",
+}
+
+
+class LatencyModel:
+    """Seeded latency sampler parsed from an LLM_STUB_LATENCY spec (milliseconds)."""
+
+    def __init__(self, spec: str = LLM_STUB_LATENCY, seed: int = LLM_STUB_SEED):
+        self.spec = spec
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        kind, _, args = spec.partition(":")
+        self.kind = kind.strip().lower()
+        self.args = [float(a) for a in args.split(",") if a.strip()]
+        if self.kind not in ("lognormal", "uniform", "fixed", "none"):
+            raise ValueError(f"Unknown LLM_STUB_LATENCY '{spec}'")
+
+    def sample(self):
+        """Seconds."""
+        with self._lock:
+            if self.kind == "lognormal":
+                median, sigma = self.args
+                ms = median * self._rng.lognormvariate(0, sigma)
+            elif self.kind == "uniform":
+                ms = self._rng.uniform(*self.args)
+            elif self.kind == "fixed":
+                ms = self.args[0]
+            else:
+                ms = 0.0
+        return ms / 1000.0
+
+    def chance(self, rate: float):
+        with self._lock:
+            return self._rng.random() < rate
+
+
+# =========================
+# RESPONSES
+# =========================
+def _text(content):
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+
+def _field(pattern, text, default=None):
+    match = re.search(pattern, text)
+    return match.group(1).strip() if match else default
+
+
+def _intent(message):
+    text = message.lower()
+    words = re.findall(r"[a-z0-9']+", text)
+    language = detect_language(text)
+
+    if set(words) & ORDER_WORDS:
+        numbers = [int(w) for w in words if w.isdigit()]
+        medicine = " ".join(w for w in words if w not in FILLER_WORDS and not w.isdigit())
+        return {"intent": "order", "medicine": medicine or None, "quantity": numbers[0] if numbers else None, "language": language}
+    if set(words) & STOCK_WORDS:
+        medicine = " ".join(w for w in words if w not in FILLER_WORDS)
+        return {"intent": "stock_check", "medicine": medicine, "language": language}
+    if words:
+        return {"intent": "recommend", "symptom": message, "language": language}
+    return {"intent": "unknown", "language": language}
+
+
+def _verdict(prompt):
+    name = _field(r"Medicine Name: (.+)", prompt, "the medicine")
+    quantity = int(_field(r"Quantity Requested: (-?\d+)", prompt, "1"))
+    stock = int(_field(r"Available Stock: (-?\d+)", prompt, "0"))
+    rx_required = _field(r"Requires Prescription: (\w+)", prompt) == "Yes"
+    rx_provided = _field(r"Prescription Provided: (\w+)", prompt) == "Yes"
+    alternatives = re.findall(r"^- (.+?) \| Stock: (\d+) \| Rx: (\w+) \| (.*)$", prompt, re.M)
+
+    trace = [
+        "No symptom verification performed." if "Symptoms: None Provided" in prompt else "Symptoms checked against requested medicine",
+        f"Prescription required: {'Yes' if rx_required else 'No'}, provided: {'Yes' if rx_provided else 'No'}",
+        f"Requested {quantity}, safe max {SAFE_MAX_QUANTITY}, stock {stock}",
+    ]
+    verdict = {"status": "approved", "reason": "", "approved_quantity": quantity, "requires_confirmation": False, "suggested_alternatives": [], "trace": trace}
+
+    if rx_required and not rx_provided:
+        verdict.update(status="rejected", approved_quantity=0, reason=f"{name} requires a prescription and none was provided.")
+    elif stock <= 0:
+        options = [{"name": alt, "description": desc[:120]} for alt, _, rx, desc in alternatives if rx == "No"][:3]
+        verdict.update(
+            status="partial" if options else "rejected",
+            approved_quantity=0,
+            requires_confirmation=bool(options),
+            suggested_alternatives=options,
+            reason=f"{name} is out of stock." + (" Similar products are available." if options else ""),
+        )
+    elif quantity > SAFE_MAX_QUANTITY or quantity > stock:
+        capped = min(SAFE_MAX_QUANTITY, stock)
+        verdict.update(status="partial", approved_quantity=capped, requires_confirmation=True, reason=f"Quantity adjusted to {capped} (safe limit {SAFE_MAX_QUANTITY}, stock {stock}).")
+    else:
+        verdict["reason"] = f"{name} is in stock, within the safe quantity and no prescription issue was found."
+
+    return verdict
+
+
+def _recommendations(prompt):
+    symptom = _field(r'symptom: "(.*)"', prompt, "")
+    rows = re.findall(r"^ID: (\d+) \| Name: (.*?) \| Desc: .*? \| Price: ([\d.]+|None) \| Stock: (-?\d+|None)$", prompt, re.M)
+    picks = []
+    for med_id, name, price, stock in rows:
+        if stock in ("None", "0") or stock.startswith("-"):
+            continue
+        picks.append({
+            "id": int(med_id),
+            "name": name,
+            "price": float(price) if price != "None" else 0.0,
+            "stock": int(stock),
+            "reason": f"Closest catalog match for '{symptom}'.",
+        })
+        if len(picks) == 3:
+            break
+    return {"recommendations": picks}
+
+
+def _react(prompt):
+    # ReAct agents (langchain ZERO_SHOT_REACT_DESCRIPTION) parse "Final Answer:" out of the
+    # text; answering straight away keeps the stub from having to pick tools
+    question = re.findall(r"^Question: (.+)$", prompt, re.M)
+    question = question[-1].strip() if question else "your question"
+    return f"Thought: I now know the final answer\nFinal Answer: Stub answer to '{question}'."
+
+
+def respond(messages):
+    """Deterministic reply for the prompt kinds this app sends."""
+    system = " ".join(_text(m["content"]) for m in messages if m["role"] == "system")
+    user = _text(next((m["content"] for m in reversed(messages) if m["role"] == "user"), ""))
+
+    if "intent classifier" in system or "AI Pharmacist" in system:
+        return json.dumps(_intent(user))
+    if "Target Medicine Database" in user:
+        return json.dumps(_verdict(user))
+    if "database catalog" in user:
+        return json.dumps(_recommendations(user))
+    if "prescription image" in user:
+        medicine = _field(r"Does it mention (.+?)\?", user, "the medicine")
+        return f"Rx: {medicine}, 1 tablet daily after food."
+    if "medical copywriter" in system:
+        product = _field(r"product '(.+?)'", user, "This product")
+        return f"{product} is a trusted pharmacy product formulated for reliable everyday care."
+    if "Final Answer:" in user and "Thought:" in user:
+        return _react(user)
+    return json.dumps({"message": "stub response"})
+
+
+# =========================
+# PROVIDER
+# =========================
+class StubProvider(LLMProvider):
+
+    name = "stub"
+
+    def __init__(self, latency: LatencyModel = None, error_rate: float = LLM_STUB_ERROR_RATE, timeout_rate: float = LLM_STUB_TIMEOUT_RATE, tokens_per_sec: float = LLM_STUB_TOKENS_PER_SEC):
+        self.latency = latency or LatencyModel()
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.tokens_per_sec = tokens_per_sec
+
+    async def _wait(self, timeout: float):
+        # Simulated time to first token, failures included
+        if self.latency.chance(self.timeout_rate):
+            await asyncio.sleep(timeout)
+            raise LLMTimeoutError("stub: simulated timeout")
+
+        delay = self.latency.sample()
+        if self.latency.chance(self.error_rate):
+            await asyncio.sleep(delay * 0.1)
+            raise LLMTransientError("stub: simulated 503 overloaded")
+        if delay > timeout:
+            await asyncio.sleep(timeout)
+            raise LLMTimeoutError("stub: latency exceeded timeout")
+        await asyncio.sleep(delay)
+
+    def _record_usage(self, model, messages, content):
+        prompt = sum(len(_text(m["content"])) for m in messages)
+        record_llm_usage(model, prompt // CHARS_PER_TOKEN, len(content) // CHARS_PER_TOKEN)
+
+    async def complete(self, model: str, messages: list, timeout: float, **params):
+        await self._wait(timeout)
+        content = respond(messages)
+        self._record_usage(model, messages, content)
+        return content
+
+    async def stream(self, model: str, messages: list, timeout: float, **params):
+        await self._wait(timeout)
+        content = respond(messages)
+        async for delta in self.chunks(content):
+            yield delta
+        self._record_usage(model, messages, content)
+
+    async def chunks(self, content: str):
+        # Roughly one token per delta, paced at tokens_per_sec
+        pause = 1.0 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+        for i in range(0, len(content), CHARS_PER_TOKEN):
+            yield content[i:i + CHARS_PER_TOKEN]
+            if pause:
+                await asyncio.sleep(pause)
+
+
+# =========================
+# OPENAI-COMPATIBLE HTTP SERVER
+# =========================
+# Same stub over the wire, to include real HTTP/connection-pool costs in a load test
+# or to back OpenAI-style clients (langchain_agent):
+#   uvicorn app.llm_stub:app --port 8765
+#   GROQ_BASE_URL=http://127.0.0.1:8765 uvicorn app.main:app
+app = FastAPI(title="LLM stub")
+_server_provider = StubProvider()
+
+
+def _completion(model, content):
+    return {
+        "id": f"stub-{time.time_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": len(content) // CHARS_PER_TOKEN, "total_tokens": len(content) // CHARS_PER_TOKEN},
+    }
+
+
+@app.post("/openai/v1/chat/completions")
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "stub")
+    messages = body.get("messages", [])
+    # The client enforces its own timeout; hang "forever" to let it
+    timeout = 3600.0
+
+    try:
+        # Failures are decided before the first byte, as with a real overloaded API
+        await _server_provider._wait(timeout)
+    except LLMTransientError as e:
+        return JSONResponse({"error": {"message": str(e), "type": "overloaded"}}, status_code=503)
+
+    content = respond(messages)
+    if not body.get("stream"):
+        return _completion(model, content)
+
+    async def events():
+        async for delta in _server_provider.chunks(content):
+            chunk = {
+                "id": "stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
@@ -1,10 +1,17 @@
+import time
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware # <-- NEW IMPORT
-from .database import engine, SessionLocal
+from .database import engine, async_engine, SessionLocal
 from .models import Base
 from .routes import router as main_router
 from .admin_routes import router as admin_router
 from .services import import_products_from_excel
+from .search_index import ensure_search_index
+from .llm_gateway import llm_gateway
+from .tracing import install_query_counter
+from .metrics import MetricsMiddleware
+from .trace_log import trace_log
+from .migrations import run_migrations
 
 app = FastAPI()
 
@@ -16,6 +23,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Added last so it wraps CORS too and times every request end to end
+app.add_middleware(MetricsMiddleware)
 
 # Include routers
 app.include_router(main_router)  # Chat + core routes
@@ -23,6 +32,10 @@ app.include_router(admin_router, prefix="/admin", tags=["admin"])
 
 # Create tables
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
+ensure_search_index(engine)
+install_query_counter(engine)
+install_query_counter(async_engine.sync_engine)
 
 @app.get("/")
 def root():
@@ -30,6 +43,14 @@ def root():
 
 @app.on_event("startup")
 def startup_event():
+    started = time.perf_counter()
     db = SessionLocal()
     import_products_from_excel(db)
-    db.close()
\ No newline at end of file
+    db.close()
+    print(f"Catalog import at startup: {(time.perf_counter() - started) * 1000:.0f} ms")
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Write out buffered traces, then close pooled LLM connections
+    await trace_log.close()
+    await llm_gateway.aclose()
+    await async_engine.dispose()
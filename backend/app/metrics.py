@@ -0,0 +1,262 @@
+import time
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+
+
+# =========================
+# PROMETHEUS METRICS
+# =========================
+# Minimal in-process registry rendering the Prometheus text format (0.0.4) for
+# GET /metrics. Recording is a dict lookup plus a lock-guarded increment, so it can
+# sit on every request / LLM call / SQL statement (see benchmarks/bench_metrics_overhead.py).
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers sub-millisecond SQL up to slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        """A fresh value holder for one label combination."""
+
+    @abstractmethod
+    def _render_child(self, values, child):
+        """Exposition lines for one label combination."""
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}"]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        # Bucket i holds values <= bounds[i]; cumulated only when rendered
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def _render_child(self, values, child):
+        with child._lock:
+            counts = list(child.counts)
+            total = child.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = 'le="' + _number(float(bound)) + '"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        # Called at scrape time to refresh gauges derived from other components' stats
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, fn):
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception as e:
+                print(f"Metrics collector {getattr(collect, '__name__', collect)} failed: {e}")
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# HTTP
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Request latency by route template, until the last body byte is sent.",
+    ("method", "route", "status"),
+))
+http_requests_in_progress = registry.register(Gauge(
+    "http_requests_in_progress", "Requests currently being handled.", ("method",),
+))
+
+# LLM
+llm_call_duration = registry.register(Histogram(
+    "llm_call_duration_seconds", "LLM gateway call latency per agent, retries included.",
+    ("agent", "model", "outcome"),
+))
+llm_tokens = registry.register(Counter(
+    "llm_tokens_total", "Prompt and completion tokens reported by the provider.", ("model", "kind"),
+))
+llm_retries = registry.register(Counter(
+    "llm_retries_total", "Retried LLM attempts per agent.", ("agent",),
+))
+llm_in_flight = registry.register(Gauge(
+    "llm_in_flight_requests", "LLM requests holding a gateway semaphore slot.",
+))
+llm_concurrency_limit = registry.register(Gauge(
+    "llm_concurrency_limit", "Size of the gateway semaphore.",
+))
+
+# Database
+db_query_duration = registry.register(Histogram(
+    "db_query_duration_seconds", "SQL statement execution time by statement type.", ("operation",), buckets=DB_BUCKETS,
+))
+db_pool_checked_out = registry.register(Gauge(
+    "db_pool_checked_out_connections", "Pooled DB connections currently checked out, per engine (sync or async).", ("engine",),
+))
+
+# Write-behind trace log (app/trace_log.py)
+trace_log_buffered = registry.register(Gauge("trace_log_buffered", "Traces waiting for the next flush."))
+trace_log_dropped = registry.register(Counter("trace_log_dropped_total", "Traces dropped because the buffer was full."))
+trace_log_failed = registry.register(Counter("trace_log_failed_total", "Traces lost to a failed flush."))
+
+# Caches
+cache_hits = registry.register(Counter("cache_hits_total", "Cache hits since start.", ("cache",)))
+cache_misses = registry.register(Counter("cache_misses_total", "Cache misses since start.", ("cache",)))
+cache_hit_ratio = registry.register(Gauge("cache_hit_ratio", "Hits / lookups since start.", ("cache",)))
+cache_entries = registry.register(Gauge("cache_entries", "Entries currently held.", ("cache",)))
+
+# Threadpool (sync endpoints and dependencies run on AnyIO's worker threads)
+threadpool_busy = registry.register(Gauge("threadpool_busy_threads", "Worker threads currently borrowed."))
+threadpool_capacity = registry.register(Gauge("threadpool_capacity_threads", "Worker thread limit."))
+threadpool_waiting = registry.register(Gauge("threadpool_waiting_tasks", "Tasks queued for a worker thread."))
+
+
+def sql_operation(statement: str):
+    head = statement.lstrip()[:8].upper()
+    for op in ("SELECT", "INSERT", "UPDATE", "DELETE"):
+        if head.startswith(op):
+            return op
+    return "OTHER"
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware task/queue overhead, and streaming
+    responses are timed to their last chunk). Unmatched paths share one label so
+    scanners can't blow up the series count.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        method = scope["method"]
+        status = [500]
+        in_progress = http_requests_in_progress.labels(method)
+        in_progress.inc()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_progress.inc(-1)
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            http_request_duration.labels(method, template, str(status[0])).observe(time.perf_counter() - start)
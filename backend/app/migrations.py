@@ -0,0 +1,194 @@
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+
+# =========================
+# VERSIONED SCHEMA MIGRATIONS
+# =========================
+# create_all only creates missing tables; it never touches an existing
+# pharmacy.db. Each migration below runs once, in its own transaction, and is
+# recorded in schema_migrations. Append new ones with the next version number;
+# never edit one that has shipped. DDL uses IF NOT EXISTS so a migration is a
+# no-op on a fresh database whose tables create_all already built from models.py.
+MIGRATIONS = []
+
+
+def migration(version: int, name: str):
+    def register(fn):
+        MIGRATIONS.append((version, name, fn))
+        return fn
+    return register
+
+
+def _columns(conn, table):
+    return {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+@migration(1, "medicines.max_safe_dosage")
+def _add_max_safe_dosage(conn):
+    # Databases created before the safety limit existed lack the column
+    if "max_safe_dosage" not in _columns(conn, "medicines"):
+        conn.execute(text("ALTER TABLE medicines ADD COLUMN max_safe_dosage INTEGER DEFAULT 10"))
+        conn.execute(text("UPDATE medicines SET max_safe_dosage = 10 WHERE max_safe_dosage IS NULL"))
+
+
+@migration(2, "hot-path indexes")
+def _add_hot_path_indexes(conn):
+    statements = [
+        # Order history (ORDER BY purchase_date) and the 3-day repeat-purchase check
+        "CREATE INDEX IF NOT EXISTS ix_orders_patient_purchase ON orders (patient_id, purchase_date)",
+        # Buyers of a low-stock product; autocomplete popularity GROUP BY
+        "CREATE INDEX IF NOT EXISTS ix_orders_product_name ON orders (product_name)",
+        # Exact-name lookups in checkout, the orchestrator and the master agent
+        "CREATE INDEX IF NOT EXISTS ix_medicines_name ON medicines (name)",
+        "CREATE INDEX IF NOT EXISTS ix_prescriptions_patient_medicine ON prescriptions (patient_id, medicine_name)",
+    ]
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+@migration(3, "one refill alert per patient and medicine")
+def _unique_refill_alerts(conn):
+    # scan_and_generate_refill_alerts already checks before inserting; concurrent
+    # scans could still race, so keep the oldest duplicate and enforce it in the schema
+    conn.execute(text("""
+        DELETE FROM refill_alerts
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM refill_alerts GROUP BY patient_id, medicine_name
+        )
+    """))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_refill_alerts_patient_medicine ON refill_alerts (patient_id, medicine_name)"
+    ))
+
+
+@migration(4, "medicine_id foreign keys on orders, prescriptions and refill alerts")
+def _add_medicine_ids(conn):
+    # Imported here: the resolver pulls in the ORM models and rapidfuzz
+    from .catalog_index import CatalogIndex, resolve_medicine_id
+
+    targets = [("orders", "product_name"), ("prescriptions", "medicine_name"), ("refill_alerts", "medicine_name")]
+    for table, _ in targets:
+        if "medicine_id" not in _columns(conn, table):
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN medicine_id INTEGER REFERENCES medicines (id)"))
+
+    for statement in [
+        "CREATE INDEX IF NOT EXISTS ix_orders_patient_medicine_purchase ON orders (patient_id, medicine_id, purchase_date)",
+        "CREATE INDEX IF NOT EXISTS ix_orders_medicine_id ON orders (medicine_id)",
+        "CREATE INDEX IF NOT EXISTS ix_prescriptions_patient_medicine_id ON prescriptions (patient_id, medicine_id)",
+        "CREATE INDEX IF NOT EXISTS ix_refill_alerts_patient_medicine_id ON refill_alerts (patient_id, medicine_id)",
+    ]:
+        conn.execute(text(statement))
+
+    # Backfill: resolve each distinct name once (exact, then fuzzy) with a private
+    # index, so the app-wide catalog_index isn't built before the catalog import
+    db = Session(bind=conn)
+    index = CatalogIndex()
+    resolved = {}
+    for table, name_column in targets:
+        names = [row[0] for row in conn.execute(text(
+            f"SELECT DISTINCT {name_column} FROM {table} WHERE medicine_id IS NULL AND {name_column} IS NOT NULL"
+        ))]
+        unresolved = 0
+        for name in names:
+            if name not in resolved:
+                resolved[name] = resolve_medicine_id(db, name, index=index)
+            if resolved[name] is None:
+                unresolved += 1
+                continue
+            conn.execute(
+                text(f"UPDATE {table} SET medicine_id = :id WHERE {name_column} = :name AND medicine_id IS NULL"),
+                {"id": resolved[name], "name": name},
+            )
+        if names:
+            print(f"Backfilled {table}.medicine_id: {len(names) - unresolved}/{len(names)} names resolved")
+    db.close()
+
+
+@migration(5, "unique medicine names")
+def _unique_medicine_names(conn):
+    # Workers racing the old per-row importer at startup could insert the same
+    # product twice. Keep the oldest row, point references at it, drop the rest.
+    duplicates = conn.execute(text("""
+        SELECT m.id, keep.id FROM medicines m
+        JOIN (SELECT name, MIN(id) AS id FROM medicines GROUP BY name HAVING COUNT(*) > 1) keep
+          ON keep.name = m.name AND m.id != keep.id
+    """)).all()
+    for duplicate_id, keep_id in duplicates:
+        for table in ["orders", "prescriptions", "refill_alerts"]:
+            conn.execute(text(f"UPDATE {table} SET medicine_id = :keep WHERE medicine_id = :dup"), {"keep": keep_id, "dup": duplicate_id})
+        conn.execute(text("DELETE FROM medicines WHERE id = :dup"), {"dup": duplicate_id})
+    if duplicates:
+        print(f"Merged {len(duplicates)} duplicate medicine rows")
+
+    conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ux_medicines_name ON medicines (name)"))
+    # The unique index serves every name lookup the plain one did
+    conn.execute(text("DROP INDEX IF EXISTS ix_medicines_name"))
+
+
+@migration(6, "order history source keys")
+def _add_order_source_keys(conn):
+    from .services import order_source_keys
+
+    if "source_key" not in _columns(conn, "orders"):
+        conn.execute(text("ALTER TABLE orders ADD COLUMN source_key VARCHAR"))
+
+    # Key the orders loaded before, so ingesting their file again matches them
+    # instead of adding a second copy. Only history rows: the loader always sets
+    # patient_age, checkout never does, and checkout orders stay NULL
+    rows = conn.execute(text("""
+        SELECT id, patient_id, product_name, purchase_date, quantity, total_price, dosage_frequency
+        FROM orders WHERE source_key IS NULL AND patient_age IS NOT NULL ORDER BY id
+    """)).all()
+    keys = order_source_keys(row[1:] for row in rows)
+    if rows:
+        conn.execute(text("UPDATE orders SET source_key = :key WHERE id = :id"),
+                     [{"key": key, "id": row[0]} for row, key in zip(rows, keys)])
+        print(f"Backfilled orders.source_key for {len(rows)} orders")
+
+    conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ux_orders_source_key ON orders (source_key)"))
+
+
+def _ensure_version_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR NOT NULL,
+                applied_at TIMESTAMP NOT NULL
+            )
+        """))
+
+
+def applied_versions(engine):
+    _ensure_version_table(engine)
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def run_migrations(engine):
+    """Apply pending migrations in version order; returns the versions applied."""
+    done = applied_versions(engine)
+    applied = []
+
+    for version, name, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in done:
+            continue
+        try:
+            with engine.begin() as conn:
+                fn(conn)
+                conn.execute(
+                    text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                    {"v": version, "n": name, "t": datetime.utcnow()},
+                )
+        except IntegrityError:
+            # Another worker applied it first and its transaction won; anything else is a real failure
+            if version in applied_versions(engine):
+                continue
+            raise
+        print(f"Applied migration {version}: {name}")
+        applied.append(version)
+
+    return applied
@@ -1,10 +1,15 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Index
+from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
 
 
+# Indexes declared in __table_args__ are also created on existing databases by
+# app/migrations.py (same names), so keep the two in step.
 class Medicine(Base):
     __tablename__ = "medicines"
+    # Unique: the catalog import upserts on name (INSERT ... ON CONFLICT (name))
+    __table_args__ = (Index("ux_medicines_name", "name", unique=True),)
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String)
@@ -19,24 +24,42 @@ class Medicine(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        Index("ix_orders_patient_purchase", "patient_id", "purchase_date"),
+        Index("ix_orders_product_name", "product_name"),
+        Index("ix_orders_patient_medicine_purchase", "patient_id", "medicine_id", "purchase_date"),
+        Index("ix_orders_medicine_id", "medicine_id"),
+        # Re-ingesting an order-history file inserts ON CONFLICT (source_key) DO NOTHING
+        Index("ux_orders_source_key", "source_key", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(String)
     patient_age = Column(Integer)
     patient_gender = Column(String)
     purchase_date = Column(DateTime, default=datetime.utcnow)
+    # Catalog product for joins and safety checks; product_name is kept for display
+    medicine_id = Column(Integer, ForeignKey("medicines.id"), nullable=True)
     product_name = Column(String)
     quantity = Column(Integer)
     total_price = Column(Float)
     dosage_frequency = Column(Float)
     next_purchase_date = Column(DateTime) # Added for Billing Extras
+    # Natural key of the order-history row this came from (services.order_source_keys);
+    # NULL for checkout orders. Shared across files: see order_source_keys
+    source_key = Column(String, nullable=True)
 
 
 class RefillAlert(Base):
     __tablename__ = "refill_alerts"
+    __table_args__ = (
+        Index("ux_refill_alerts_patient_medicine", "patient_id", "medicine_name", unique=True),
+        Index("ix_refill_alerts_patient_medicine_id", "patient_id", "medicine_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(String)
+    medicine_id = Column(Integer, ForeignKey("medicines.id"), nullable=True)
     medicine_name = Column(String)
     expected_run_out = Column(DateTime)
     alert_generated_at = Column(DateTime, default=datetime.utcnow)
@@ -47,9 +70,15 @@ from datetime import datetime
 
 class Prescription(Base):
     __tablename__ = "prescriptions"
+    __table_args__ = (
+        Index("ix_prescriptions_patient_medicine", "patient_id", "medicine_name"),
+        Index("ix_prescriptions_patient_medicine_id", "patient_id", "medicine_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(String)
+    # Resolved catalog product; medicine_name is what the patient typed
+    medicine_id = Column(Integer, ForeignKey("medicines.id"), nullable=True)
     medicine_name = Column(String)
     file_path = Column(String)
     uploaded_at = Column(DateTime, default=datetime.utcnow)
@@ -65,6 +94,25 @@ class PendingOrder(Base):
     medicine_name = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class CatalogImport(Base):
+    """Content hash of the last catalog file imported, so unchanged files are skipped at startup."""
+    __tablename__ = "catalog_imports"
+
+    source = Column(String, primary_key=True)  # file name, e.g. products-export.xlsx
+    content_hash = Column(String, nullable=True)
+    row_count = Column(Integer, default=0)
+    imported_at = Column(DateTime, default=datetime.utcnow)
+
+class OrderHistoryImport(Base):
+    """Watermark of an order-history file, so re-runs only ingest what is new in it."""
+    __tablename__ = "order_history_imports"
+
+    source = Column(String, primary_key=True)  # file name, e.g. Consumer Order History 1.xlsx
+    content_hash = Column(String, nullable=True)
+    last_purchase_date = Column(DateTime, nullable=True)  # newest purchase ingested; older rows are skipped
+    row_count = Column(Integer, default=0)  # orders inserted from this file so far
+    imported_at = Column(DateTime, default=datetime.utcnow)
+
 class Patient(Base):
     __tablename__ = "patients"
 
@@ -83,4 +131,27 @@ class SystemLog(Base):
     agent_count = Column(Integer)
     execution_time = Column(Float)
     status = Column(String)
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    spans = relationship("TraceSpan", back_populates="system_log", cascade="all, delete-orphan", order_by="TraceSpan.id")
+
+
+class TraceSpan(Base):
+    """One pipeline stage (intent, match, master_agent, ...) of a SystemLog trace."""
+    __tablename__ = "trace_spans"
+
+    id = Column(Integer, primary_key=True, index=True)
+    system_log_id = Column(Integer, ForeignKey("system_logs.id"), index=True)
+    stage = Column(String)
+    started_at = Column(DateTime)
+    ended_at = Column(DateTime)
+    duration_ms = Column(Float)
+    model = Column(String, nullable=True)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    cache_hit = Column(Boolean, nullable=True)
+    detail = Column(String, nullable=True)
+    db_queries = Column(Integer, default=0)
+    db_time_ms = Column(Float, default=0.0)
+
+    system_log = relationship("SystemLog", back_populates="spans")
@@ -0,0 +1,135 @@
+import os
+import threading
+import numpy as np
+from scipy import sparse
+from .models import Medicine
+from .retrieval import symptom_retriever, INDEX_DIR
+
+
+# =========================
+# PRECOMPUTED ALTERNATIVES
+# =========================
+# Alternatives shown to the master agent per request
+MASTER_ALTERNATIVES = int(os.getenv("MASTER_ALTERNATIVES", "5"))
+# Neighbours stored per medicine; extra headroom so out-of-stock ones can be skipped
+NEIGHBOURS_PER_MEDICINE = 20
+# n-grams in more than this share of products (" mg ", "tabl") say nothing about
+# ingredient or category and would make the similarity product dense
+MAX_DOC_FREQUENCY = 0.05
+# ...but small catalogs keep everything shared by up to this many products
+MIN_DOC_FREQUENCY_CUTOFF = 20
+CHUNK_ROWS = 512
+
+
+class NeighbourTable:
+    """
+    For every medicine, the most similar other medicines by cosine over the BM25
+    vectors of the retrieval index, which share stems like the active ingredient,
+    brand line or dosage form.
+
+    The table is recomputed only when the retrieval index signature changes and is
+    persisted next to it. Stock is checked at request time on the handful of stored
+    neighbours, since it changes far more often than the catalog text.
+    """
+
+    def __init__(self, index_dir: str = INDEX_DIR):
+        self.index_dir = index_dir
+        self._lock = threading.Lock()
+        # (signature, {medicine id: row}, neighbour ids [n, NEIGHBOURS_PER_MEDICINE])
+        self._state = (None, {}, None)
+
+    def _path(self):
+        return os.path.join(self.index_dir, "neighbours.npz")
+
+    def _compute(self, weights, ids):
+        x = weights.tocsr().astype(np.float32)
+        n_docs = x.shape[0]
+
+        df = np.diff(weights.tocsc().indptr)
+        keep = df <= max(MIN_DOC_FREQUENCY_CUTOFF, MAX_DOC_FREQUENCY * n_docs)
+        x = x[:, np.flatnonzero(keep)]
+
+        norms = np.sqrt(np.asarray(x.multiply(x).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        x = sparse.diags(1.0 / norms) @ x
+        xt = x.T.tocsc()
+
+        width = min(NEIGHBOURS_PER_MEDICINE, max(n_docs - 1, 0))
+        table = np.full((n_docs, NEIGHBOURS_PER_MEDICINE), -1, dtype=np.int64)
+        if width == 0:
+            return table
+
+        for start in range(0, n_docs, CHUNK_ROWS):
+            stop = min(start + CHUNK_ROWS, n_docs)
+            sims = (x[start:stop] @ xt).toarray()
+            sims[np.arange(stop - start), np.arange(start, stop)] = 0.0  # never your own alternative
+
+            top = np.argpartition(-sims, width - 1, axis=1)[:, :width]
+            top_scores = np.take_along_axis(sims, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind="stable")
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+            neighbour_ids = ids[top]
+            neighbour_ids[top_scores <= 0] = -1
+            table[start:stop, :width] = neighbour_ids
+
+        return table
+
+    def _load(self, signature):
+        try:
+            data = np.load(self._path())
+            if str(data["signature"]) != signature:
+                return None
+            return data["ids"], data["table"]
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def _save(self, signature, ids, table):
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            np.savez(self._path(), signature=np.array(signature), ids=ids, table=table)
+        except OSError as e:
+            print(f"Neighbour table not persisted: {e}")
+
+    def refresh(self, db):
+        weights, ids, signature = symptom_retriever.snapshot(db)
+        if self._state[0] == signature:
+            return
+
+        with self._lock:
+            if self._state[0] == signature:
+                return
+
+            loaded = self._load(signature)
+            if loaded is not None:
+                ids, table = loaded
+            else:
+                table = self._compute(weights, ids)
+                self._save(signature, ids, table)
+
+            rows = {int(med_id): row for row, med_id in enumerate(ids)}
+            self._state = (signature, rows, table)
+
+    def alternatives(self, db, medicine_id: int, limit: int = MASTER_ALTERNATIVES):
+        self.refresh(db)
+        _, rows, table = self._state
+
+        row = rows.get(medicine_id)
+        if row is None:
+            return []
+
+        neighbour_ids = [int(i) for i in table[row] if i >= 0]
+        if not neighbour_ids:
+            return []
+
+        in_stock = {
+            m.id: m for m in db.query(Medicine).filter(
+                Medicine.id.in_(neighbour_ids),
+                Medicine.stock > 0
+            ).all()
+        }
+        return [in_stock[i] for i in neighbour_ids if i in in_stock][:limit]
+
+
+neighbour_table = NeighbourTable()
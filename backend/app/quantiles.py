@@ -0,0 +1,111 @@
+import math
+import time
+import threading
+
+
+# =========================
+# STREAMING QUANTILE SKETCHES
+# =========================
+class DDSketch:
+    """
+    Relative-error quantile sketch: values fall into logarithmic bins, so any
+    quantile comes back within relative_accuracy of the true value using a few
+    hundred counters at most, and two sketches merge by adding counts.
+    """
+
+    MIN_VALUE = 1e-6
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float, weight: int = 1):
+        if value <= self.MIN_VALUE:
+            self.zero_count += weight
+        else:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[key] = self.bins.get(key, 0) + weight
+        self.count += weight
+        self.total += value * weight
+        self.max = max(self.max, value)
+
+    def merge(self, other: "DDSketch"):
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float):
+        if self.count == 0:
+            return None
+
+        # Nearest rank: the smallest value with at least q of the samples at or below it
+        rank = max(0, math.ceil(q * self.count) - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                # Bin midpoint (in relative terms) of (gamma^(k-1), gamma^k]
+                return min(2 * self.gamma ** key / (self.gamma + 1), self.max)
+        return self.max
+
+
+class WindowedSketch:
+    """
+    DDSketch over a sliding time window: one small sketch per time bucket, merged
+    on read for whatever window (up to horizon_seconds) is asked for. Also keeps
+    per-bucket counters (tokens, cache hits, ...) for the same windows.
+    """
+
+    def __init__(self, bucket_seconds: int = 10, horizon_seconds: int = 3600, relative_accuracy: float = 0.01):
+        self.bucket_seconds = bucket_seconds
+        self.horizon_buckets = max(1, horizon_seconds // bucket_seconds)
+        self.relative_accuracy = relative_accuracy
+        self._lock = threading.Lock()
+        # bucket index -> (sketch, counters)
+        self._buckets = {}
+
+    def _index(self, now):
+        return int(now // self.bucket_seconds)
+
+    def add(self, value: float, now: float = None, **counters):
+        index = self._index(time.time() if now is None else now)
+
+        with self._lock:
+            bucket = self._buckets.get(index)
+            if bucket is None:
+                bucket = (DDSketch(self.relative_accuracy), {})
+                self._buckets[index] = bucket
+                oldest = index - self.horizon_buckets
+                for stale in [i for i in self._buckets if i <= oldest]:
+                    del self._buckets[stale]
+
+            sketch, totals = bucket
+            sketch.add(value)
+            for key, amount in counters.items():
+                totals[key] = totals.get(key, 0) + amount
+
+    def snapshot(self, window_seconds: int, now: float = None):
+        """Merged (sketch, counters) over the last window_seconds."""
+        newest = self._index(time.time() if now is None else now)
+        oldest = newest - min(self.horizon_buckets, max(1, math.ceil(window_seconds / self.bucket_seconds)))
+
+        merged = DDSketch(self.relative_accuracy)
+        totals = {}
+        with self._lock:
+            for index, (sketch, counters) in self._buckets.items():
+                if oldest < index <= newest:
+                    merged.merge(sketch)
+                    for key, amount in counters.items():
+                        totals[key] = totals.get(key, 0) + amount
+        return merged, totals
@@ -0,0 +1,188 @@
+import os
+import re
+import json
+import threading
+from collections import Counter
+import numpy as np
+from scipy import sparse
+from sqlalchemy import func
+from .models import Medicine
+from .catalog_index import catalog_index
+
+
+# =========================
+# LOCAL BM25 RETRIEVAL
+# =========================
+# How many candidates reach the recommendation prompt
+RECOMMEND_TOP_K = int(os.getenv("RECOMMEND_TOP_K", "25"))
+
+INDEX_DIR = os.getenv(
+    "RETRIEVAL_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "index_cache")
+)
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+NGRAM_SIZES = (3, 4, 5)
+
+WORD_RE = re.compile(r"\w+")
+
+
+def analyze(text: str):
+    # Word-bounded character n-grams: symptoms arrive in English/Hinglish while the catalog
+    # is German, and shared stems ("allerg", "vitamin", "omega") still line up
+    grams = []
+    for word in WORD_RE.findall((text or "").lower()):
+        padded = f" {word} "
+        if len(padded) <= NGRAM_SIZES[0]:
+            grams.append(padded)
+            continue
+        for n in NGRAM_SIZES:
+            grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return grams
+
+
+def catalog_signature(db):
+    # Changes whenever a product is added/removed or its searchable text is edited
+    # (generate_descriptions.py writes from another process and never bumps the version)
+    count, max_id, text_len = db.query(
+        func.count(Medicine.id),
+        func.max(Medicine.id),
+        func.sum(func.length(Medicine.name) + func.coalesce(func.length(Medicine.description), 0))
+    ).one()
+    return f"{count}:{max_id or 0}:{text_len or 0}"
+
+
+class SymptomRetriever:
+    """
+    BM25 index over medicine names and descriptions, kept as a SciPy sparse matrix.
+
+    The matrix is persisted under INDEX_DIR together with the catalog signature, so
+    restarts and extra workers load it instead of rebuilding.
+    """
+
+    def __init__(self, index_dir: str = INDEX_DIR):
+        self.index_dir = index_dir
+        self._lock = threading.Lock()
+        self._checked_version = -1
+        self._signature = None
+        # (doc-term BM25 weights as CSC, medicine ids, vocabulary)
+        self._state = None
+
+    def _paths(self):
+        return (
+            os.path.join(self.index_dir, "bm25_weights.npz"),
+            os.path.join(self.index_dir, "bm25_ids.npy"),
+            os.path.join(self.index_dir, "bm25_meta.json"),
+        )
+
+    def _build(self, db):
+        vocab = {}
+        indptr, cols, counts = [0], [], []
+        ids = []
+
+        for med_id, name, description in db.query(
+            Medicine.id, Medicine.name, Medicine.description
+        ).order_by(Medicine.id).all():
+            ids.append(med_id)
+            # Names count twice: they are short and the most reliable signal
+            grams = Counter(analyze(f"{name} {name} {description or ''}"))
+            cols.extend(vocab.setdefault(g, len(vocab)) for g in grams)
+            counts.extend(grams.values())
+            indptr.append(len(cols))
+
+        n_docs = len(ids)
+        tf = sparse.csr_matrix(
+            (np.asarray(counts, dtype=np.float32), np.asarray(cols, dtype=np.int32), np.asarray(indptr)),
+            shape=(n_docs, len(vocab))
+        )
+
+        doc_len = np.asarray(tf.sum(axis=1)).ravel()
+        avg_len = doc_len.mean() if n_docs else 1.0
+        df = np.bincount(tf.indices, minlength=len(vocab))
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        # BM25 term weight per stored entry, computed in one vectorized pass over the CSR data
+        row_of_entry = np.repeat(np.arange(n_docs), np.diff(tf.indptr))
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len[row_of_entry] / avg_len)
+        tf.data = idf[tf.indices] * tf.data * (BM25_K1 + 1) / (tf.data + norm)
+
+        return tf.tocsc(), np.asarray(ids, dtype=np.int64), vocab
+
+    def _load(self, signature):
+        weights_path, ids_path, meta_path = self._paths()
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get("signature") != signature:
+                return None
+            return sparse.load_npz(weights_path).tocsc(), np.load(ids_path), meta["vocab"]
+        except Exception as e:
+            print(f"Retrieval index load failed, rebuilding: {e}")
+            return None
+
+    def _save(self, signature, state):
+        weights, ids, vocab = state
+        weights_path, ids_path, meta_path = self._paths()
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            sparse.save_npz(weights_path, weights)
+            np.save(ids_path, ids)
+            # meta last: it is what marks the other two files as valid
+            with open(meta_path, "w") as f:
+                json.dump({"signature": signature, "vocab": vocab}, f)
+        except OSError as e:
+            print(f"Retrieval index not persisted: {e}")
+
+    def refresh(self, db):
+        if self._checked_version == catalog_index.version and self._state is not None:
+            return
+
+        with self._lock:
+            version = catalog_index.version
+            if self._checked_version == version and self._state is not None:
+                return
+
+            signature = catalog_signature(db)
+            if signature != self._signature or self._state is None:
+                state = self._load(signature)
+                if state is None:
+                    state = self._build(db)
+                    self._save(signature, state)
+                self._state = state
+                self._signature = signature
+
+            self._checked_version = version
+
+    def snapshot(self, db):
+        # (weights, ids, signature) for consumers that derive their own tables from the index
+        self.refresh(db)
+        with self._lock:
+            weights, ids, _ = self._state
+            return weights, ids, self._signature
+
+    def top_k(self, db, query: str, k: int = RECOMMEND_TOP_K):
+        self.refresh(db)
+        weights, ids, vocab = self._state
+
+        if len(ids) <= k:
+            return ids.tolist()
+
+        term_ids = [vocab[g] for g in analyze(query) if g in vocab]
+        if not term_ids:
+            return []
+
+        terms, counts = np.unique(term_ids, return_counts=True)
+        scores = weights[:, terms] @ counts.astype(np.float32)
+
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(scores[hits], -k)[-k:]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+
+        return ids[hits].tolist()
+
+
+symptom_retriever = SymptomRetriever()
@@ -1,23 +1,42 @@
 from fastapi import APIRouter, Depends, Query, UploadFile, File, HTTPException
+from fastapi.responses import StreamingResponse, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import or_, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from collections import Counter
 from typing import List
 import os
 import time
 import uuid
 import base64
-from groq import Groq
+import json
+import asyncio
+from datetime import datetime
+import anyio
 
 from pydantic import BaseModel
-from .database import get_db
+from .database import get_db, get_async_db, SessionLocal, AsyncSessionLocal, engine, async_engine
 from .models import Medicine, Order, RefillAlert, Prescription, Patient, SystemLog
 from .services import (
     predict_refill,
     scan_and_generate_refill_alerts,
+    recently_purchased_ids,
+    reserve_stock_many,
+    restock_many_if_below,
+    add_stock,
 )
 from .agents.orchestrator import run_pharmacy_agent
-from .agents.safety_agent import run_safety_checks
+from .agents.safety_agent import evaluate_safety
+from .agents.intent_parser import parser_stats
+from .agents.intent_cache import intent_cache
+from .agents.decision_cache import decision_cache
+from .catalog_index import bump_catalog_version, resolve_medicine_id
+from .search_index import search_medicines_async as fts_search_medicines
+from .autocomplete import autocomplete_index, MAX_SUGGESTIONS
+from .llm_gateway import llm_gateway
+from .tracing import TraceRecorder, trace_request, stage_stats, STAGE_WINDOWS
+from .trace_log import trace_log
+from . import metrics
 
 # ✅ ONLY ONE ROUTER
 router = APIRouter()
@@ -88,24 +107,113 @@ class ChatRequest(BaseModel):
     message: str
 
 
-@router.post("/chat")
-def chat(data: ChatRequest, db: Session = Depends(get_db)):
-    start_time = time.time()
-    response = run_pharmacy_agent(db, data.user_id, data.message)
-    end_time = time.time()
-    
+def _new_trace():
+    return TraceRecorder(f"RX-{str(uuid.uuid4())[:8].upper()}")
+
+
+def _save_trace(recorder, response):
+    # SystemLog row plus one TraceSpan child per pipeline stage, written behind by trace_log;
+    # feeds the stage percentiles
+    elapsed_ms = recorder.elapsed_ms
     trace_len = len(response.get("trace", []))
     status = "Verified" if response.get("type") not in ["error", "safety_block"] else "Blocked"
-    db.add(SystemLog(
-        trace_id=f"RX-{str(uuid.uuid4())[:8].upper()}",
-        agent_count=trace_len if trace_len > 0 else 1,
-        execution_time=round(end_time - start_time, 2),
-        status=status
-    ))
-    db.commit()
+    trace_log.submit({
+        "trace_id": recorder.trace_id,
+        "agent_count": trace_len if trace_len > 0 else 1,
+        "execution_time": round(elapsed_ms / 1000, 2),
+        "status": status,
+        "created_at": datetime.utcnow(),
+        "spans": [
+            {
+                "stage": s.stage,
+                "started_at": s.started_at,
+                "ended_at": s.ended_at,
+                "duration_ms": round(s.duration_ms, 3),
+                "model": s.model,
+                "prompt_tokens": s.prompt_tokens,
+                "completion_tokens": s.completion_tokens,
+                "cache_hit": s.cache_hit,
+                "detail": s.detail,
+                "db_queries": s.db_queries,
+                "db_time_ms": round(s.db_time * 1000, 3)
+            }
+            for s in recorder.spans
+        ]
+    })
+    stage_stats.observe_trace(recorder, elapsed_ms)
+
+
+@router.post("/chat")
+async def chat(data: ChatRequest, db: AsyncSession = Depends(get_async_db)):
+    with trace_request(_new_trace()) as recorder:
+        response = await run_pharmacy_agent(db, data.user_id, data.message)
+
+    _save_trace(recorder, response)
     return response
 
 
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_stream(data: ChatRequest):
+    """
+    Same agent chain as /chat, as server-sent events:
+    start -> intent -> match -> token* -> verdict -> message (the /chat response body).
+    Flows that stop early (emergency, recommend, checkout) skip straight to message.
+    """
+    recorder = _new_trace()
+
+    async def events():
+        # Own session: it has to outlive the handler and close when the stream ends
+        db = AsyncSessionLocal()
+        queue = asyncio.Queue()
+
+        async def emit(event, payload):
+            await queue.put((event, payload))
+
+        async def run():
+            try:
+                # The task runs in its own context copy, so the recorder is bound here
+                with trace_request(recorder):
+                    response = await run_pharmacy_agent(db, data.user_id, data.message, emit=emit)
+                await queue.put(("message", response))
+            except Exception as e:
+                print(f"Chat stream error: {e}")
+                await queue.put(("error", {"type": "error", "message": "Something went wrong while processing your message.", "trace": []}))
+            finally:
+                await queue.put(None)
+
+        task = asyncio.create_task(run())
+        try:
+            yield _sse("start", {"trace_id": recorder.trace_id})
+
+            response = {"type": "error"}
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                event, payload = item
+                if event in ("message", "error"):
+                    response = payload
+                yield _sse(event, payload)
+
+            _save_trace(recorder, response)
+        finally:
+            # Client went away mid-chain: stop the agents before the session closes
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+            await db.close()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 from pydantic import BaseModel
 
 class QuantityRequest(BaseModel):
@@ -123,24 +231,15 @@ class QuantityRequest(BaseModel):
 
 
 @router.post("/chat/quantity")
-def continue_order(data: QuantityRequest, db: Session = Depends(get_db)):
-    start_time = time.time()
-    response = run_pharmacy_agent(
-        db,
-        data.user_id,
-        f"Order {data.quantity} packs of {data.medicine}"
-    )
-    end_time = time.time()
-    
-    trace_len = len(response.get("trace", []))
-    status = "Verified" if response.get("type") not in ["error", "safety_block"] else "Blocked"
-    db.add(SystemLog(
-        trace_id=f"RX-{str(uuid.uuid4())[:8].upper()}",
-        agent_count=trace_len if trace_len > 0 else 1,
-        execution_time=round(end_time - start_time, 2),
-        status=status
-    ))
-    db.commit()
+async def continue_order(data: QuantityRequest, db: AsyncSession = Depends(get_async_db)):
+    with trace_request(_new_trace()) as recorder:
+        response = await run_pharmacy_agent(
+            db,
+            data.user_id,
+            f"Order {data.quantity} packs of {data.medicine}"
+        )
+
+    _save_trace(recorder, response)
     return response
 # =====================================================
 # 📦 ADMIN ROUTING: REFILL STOCK
@@ -154,19 +253,22 @@ def refill_stock(data: RefillStockRequest, db: Session = Depends(get_db)):
     med = db.query(Medicine).filter(Medicine.name == data.medicine_name).first()
     if not med:
         raise HTTPException(status_code=404, detail="Medicine not found")
-    med.stock += data.amount
+    add_stock(db, med.id, data.amount)
     db.commit()
+    bump_catalog_version()
+    db.refresh(med)
     return {"status": "success", "message": f"Added {data.amount} to {data.medicine_name}", "new_stock": med.stock}
 # =====================================================
 @router.get("/search")
-def search_medicines(query: str = Query(..., min_length=2), db: Session = Depends(get_db)):
+async def search_medicines(
+    query: str = Query(..., min_length=2),
+    limit: int = Query(5, ge=1, le=50),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_db)
+):
 
-    results = db.query(Medicine).filter(
-        or_(
-            Medicine.name.ilike(f"%{query}%"),
-            Medicine.description.ilike(f"%{query}%")
-        )
-    ).limit(5).all()
+    # BM25-ranked FTS5 lookup; page with offset (next page = offset + limit)
+    results = await fts_search_medicines(db, query, limit=limit, offset=offset)
 
     return [
         {
@@ -180,13 +282,26 @@ def search_medicines(query: str = Query(..., min_length=2), db: Session = Depend
     ]
 
 
+# =====================================================
+# ⌨️ TYPEAHEAD AUTOCOMPLETE
+# =====================================================
+@router.get("/autocomplete")
+def autocomplete(
+    query: str = Query(..., min_length=1),
+    limit: int = Query(8, ge=1, le=MAX_SUGGESTIONS),
+    db: Session = Depends(get_db)
+):
+    # In-memory prefix trie ranked by order count; only hits the DB after a catalog change
+    return autocomplete_index.complete(db, query, limit=limit)
+
+
 # =====================================================
 # 📦 PRODUCTS (STORE FRONT)
 # =====================================================
 @router.get("/products")
-def get_products(db: Session = Depends(get_db)):
+async def get_products(db: AsyncSession = Depends(get_async_db)):
 
-    medicines = db.query(Medicine).all()
+    medicines = (await db.scalars(select(Medicine))).all()
 
     return [
         {
@@ -216,61 +331,102 @@ class CheckoutRequest(BaseModel):
     patient_id: str
     items: List[CartItem]
 
+
+# Units ordered from the retailer when a checkout finds a product short
+AUTO_RESTOCK_UNITS = 100
+
 @router.post("/finalize-checkout")
 def finalize_checkout(data: CheckoutRequest, db: Session = Depends(get_db)):
+    """
+    One transaction per cart: every stock change and order row is committed
+    together at the end, and any failing item rolls the whole cart back.
+    The number of queries doesn't grow with the cart: medicines, prescriptions
+    and recent orders are each loaded in one query, items are validated in
+    memory, and stock moves in one UPDATE for the whole cart.
+    """
+    try:
+        # Prefetch everything the checks need
+        names = {item.name for item in data.items}
+        medicines = {}
+        for med in db.query(Medicine).filter(Medicine.name.in_(names)).order_by(Medicine.id):
+            # Same row the old per-item .first() picked if names repeat
+            medicines.setdefault(med.name, med)
+
+        ids = [med.id for med in medicines.values()]
+        prescriptions = {}
+        if ids:
+            for medicine_id, approved in db.query(Prescription.medicine_id, Prescription.approved).filter(
+                Prescription.patient_id == data.patient_id,
+                Prescription.medicine_id.in_(ids)
+            ):
+                prescriptions[medicine_id] = prescriptions.get(medicine_id, False) or bool(approved)
+        recent = recently_purchased_ids(db, data.patient_id, ids) if ids else set()
 
-    for item in data.items:
-
-        medicine = db.query(Medicine).filter(Medicine.name == item.name).first()
+        quantities = {}
+        for item in data.items:
 
-        if not medicine:
-            raise HTTPException(status_code=404, detail=f"{item.name} not found")
+            medicine = medicines.get(item.name)
 
-        # 1️⃣ Check stock and Auto-Restock
-        if medicine.stock < item.quantity:
-            print(f"📦 [RESTOCK] {medicine.name} is insufficient for order. Automatically ordering 100 units from Retailer...")
-            medicine.stock += 100
-            db.commit()
-            if medicine.stock < item.quantity:
-                raise HTTPException(status_code=400, detail=f"Insufficient stock for {item.name}")
+            if not medicine:
+                raise HTTPException(status_code=404, detail=f"{item.name} not found")
 
-        # 2️⃣ Prescription check
-        if medicine.prescription_required:
-            has_rx = db.query(Prescription).filter(
-                Prescription.patient_id == data.patient_id,
-                Prescription.medicine_name == medicine.name,
-                Prescription.approved == True
-            ).first()
-            if not has_rx:
+            # 1️⃣ Prescription check
+            if medicine.prescription_required and not prescriptions.get(medicine.id):
                 raise HTTPException(status_code=403, detail=f"{item.name} requires prescription. Please upload one first.")
 
-        # 3️⃣ Strict Safety Overdosage check
-        max_safe = medicine.max_safe_dosage or 10
-        if item.quantity > max_safe * 3:
-            raise HTTPException(status_code=400, detail=f"Quantity {item.quantity} for {item.name} is dangerously unsafe and completely blocked by Backend.")
-            
-        if item.quantity > max_safe and not item.confirmed_overdose:
-            raise HTTPException(status_code=400, detail=f"Quantity {item.quantity} exceeds safe dosage of {max_safe}. Explicit confirmation required.")
+            # 2️⃣ Strict Safety Overdosage check
+            max_safe = medicine.max_safe_dosage or 10
+            if item.quantity > max_safe * 3:
+                raise HTTPException(status_code=400, detail=f"Quantity {item.quantity} for {item.name} is dangerously unsafe and completely blocked by Backend.")
 
-        safety = run_safety_checks(db, data.patient_id, medicine.name)
+            if item.quantity > max_safe and not item.confirmed_overdose:
+                raise HTTPException(status_code=400, detail=f"Quantity {item.quantity} exceeds safe dosage of {max_safe}. Explicit confirmation required.")
 
-        if safety["status"] == "blocked":
-            raise HTTPException(status_code=403, detail="Safety rule blocked this purchase")
+            safety = evaluate_safety(
+                medicine,
+                recently_bought=medicine.id in recent,
+                has_prescription=medicine.id in prescriptions
+            )
 
-        # 4️⃣ Deduct stock
-        medicine.stock -= item.quantity
+            if safety["status"] == "blocked":
+                raise HTTPException(status_code=403, detail="Safety rule blocked this purchase")
 
-        # 5️⃣ Create order record
-        new_order = Order(
-            patient_id=data.patient_id,
-            product_name=medicine.name,
-            quantity=item.quantity,
-            dosage_frequency=1
-        )
+            # Repeated lines for one product draw on its stock together
+            quantities[medicine.id] = quantities.get(medicine.id, 0) + item.quantity
 
-        db.add(new_order)
+        # 3️⃣ Auto-Restock (only products still short when this UPDATE runs)
+        names_by_id = {med.id: med.name for med in medicines.values()}
+        for medicine_id in restock_many_if_below(db, quantities, AUTO_RESTOCK_UNITS):
+            print(f"📦 [RESTOCK] {names_by_id[medicine_id]} is insufficient for order. Automatically ordering {AUTO_RESTOCK_UNITS} units from Retailer...")
 
-    db.commit()
+        # 4️⃣ Deduct stock: one conditional UPDATE, so concurrent carts can't oversell
+        if not reserve_stock_many(db, quantities):
+            # Nothing was changed; look up which product was short for the message
+            stock = dict(db.query(Medicine.id, Medicine.stock).filter(Medicine.id.in_(list(quantities))).all())
+            short = next(
+                (item.name for item in data.items if stock[medicines[item.name].id] < quantities[medicines[item.name].id]),
+                data.items[0].name
+            )
+            raise HTTPException(status_code=400, detail=f"Insufficient stock for {short}")
+
+        # 5️⃣ Create order records (one executemany; their ids aren't needed here)
+        db.execute(insert(Order), [
+            {
+                "patient_id": data.patient_id,
+                "medicine_id": medicines[item.name].id,
+                "product_name": medicines[item.name].name,
+                "quantity": item.quantity,
+                "dosage_frequency": 1
+            }
+            for item in data.items
+        ])
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    bump_catalog_version()
 
     return {
         "status": "success",
@@ -282,11 +438,11 @@ def finalize_checkout(data: CheckoutRequest, db: Session = Depends(get_db)):
 # 📊 USER ORDER HISTORY
 # =====================================================
 @router.get("/user/orders/{user_id}")
-def get_user_orders(user_id: str, db: Session = Depends(get_db)):
+async def get_user_orders(user_id: str, db: AsyncSession = Depends(get_async_db)):
 
-    orders = db.query(Order).filter(
+    orders = (await db.scalars(select(Order).filter(
         Order.patient_id == user_id
-    ).order_by(Order.purchase_date.desc()).all()
+    ).order_by(Order.purchase_date.desc()))).all()
 
     return [
         {
@@ -424,11 +580,11 @@ async def upload_prescription(
     try:
         if file.content_type in ["image/jpeg", "image/png", "image/jpg"]:
             b64_img = base64.b64encode(content).decode("utf-8")
-            client = Groq(api_key=os.getenv("GROQ_API_KEY"))
             prompt = f"Read the handwritten text in this prescription image. Does it mention {medicine_name}? Extract the relevant text and respond concisely."
             
-            completion = client.chat.completions.create(
+            extracted_text = await llm_gateway.complete(
                 model="llama-3.2-11b-vision-preview",
+                agent="prescription_ocr",
                 messages=[
                     {
                         "role": "user",
@@ -446,7 +602,6 @@ async def upload_prescription(
                 temperature=0.1,
                 max_tokens=200
             )
-            extracted_text = completion.choices[0].message.content
             # Verify if medicine is in the extracted text
             if medicine_name != "Unknown" and medicine_name.lower() not in extracted_text.lower():
                 approved = False  # Strictly reject if not found
@@ -457,8 +612,10 @@ async def upload_prescription(
     except Exception as e:
         print("OCR Vision Error:", e)
 
+    medicine_id = resolve_medicine_id(db, medicine_name) if medicine_name != "Unknown" else None
     prescription = Prescription(
         patient_id=user_id,
+        medicine_id=medicine_id,
         medicine_name=medicine_name,
         file_path=file_location,
         extracted_text=extracted_text,
@@ -467,6 +624,9 @@ async def upload_prescription(
 
     db.add(prescription)
     db.commit()
+    # Cached verdicts are keyed on the catalog name
+    medicine = db.get(Medicine, medicine_id) if medicine_id else None
+    decision_cache.invalidate_medicine(medicine.name if medicine else medicine_name)
 
     if not approved:
         raise HTTPException(status_code=400, detail="Prescription rejected. The specified medicine was not clearly identified in the handwritten text.")
@@ -496,6 +656,112 @@ def get_system_logs(db: Session = Depends(get_db)):
     ]
 
 
+@router.get("/admin/intent-stats")
+def get_intent_stats():
+    # How often the deterministic parser or the cache answered without a Groq round-trip
+    return {"parser": parser_stats(), "cache": intent_cache.stats()}
+
+
+@router.get("/admin/decision-cache-stats")
+def get_decision_cache_stats():
+    return decision_cache.stats()
+
+
+@router.get("/admin/stage-latency")
+def get_stage_latency(window: int = Query(300, ge=1, le=max(STAGE_WINDOWS))):
+    # p50/p95/p99 per pipeline stage over the last `window` seconds, from in-memory sketches
+    return {"window_seconds": window, "stages": stage_stats.report(window)}
+
+
+@router.get("/admin/stage-latency/windows")
+def get_stage_latency_windows():
+    return {str(w): stage_stats.report(w) for w in STAGE_WINDOWS}
+
+
+@router.get("/admin/traces/{trace_id}/spans")
+def get_trace_spans(trace_id: str, db: Session = Depends(get_db)):
+    log = db.query(SystemLog).filter(SystemLog.trace_id == trace_id).first()
+    if not log:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return {
+        "trace_id": log.trace_id,
+        "execution_time": log.execution_time,
+        "status": log.status,
+        "spans": [
+            {
+                "stage": s.stage,
+                "started_at": s.started_at,
+                "ended_at": s.ended_at,
+                "duration_ms": s.duration_ms,
+                "model": s.model,
+                "prompt_tokens": s.prompt_tokens,
+                "completion_tokens": s.completion_tokens,
+                "cache_hit": s.cache_hit,
+                "detail": s.detail,
+                "db_queries": s.db_queries,
+                "db_time_ms": s.db_time_ms
+            }
+            for s in log.spans
+        ]
+    }
+
+
+@router.get("/admin/llm-stats")
+def get_llm_stats():
+    # In-flight requests against the gateway semaphore, retries and timeouts
+    return llm_gateway.stats()
+
+
+@router.get("/admin/trace-log-stats")
+def get_trace_log_stats():
+    # Write-behind SystemLog buffer: backlog, flush timings and traces dropped on overflow
+    return trace_log.stats()
+
+
+# =====================================================
+# 📈 PROMETHEUS METRICS
+# =====================================================
+@metrics.registry.add_collector
+def _collect_runtime_metrics():
+    # Gauges mirrored from stats the app already keeps, refreshed on each scrape
+    caches = {
+        "intent_parser": parser_stats(),
+        "intent_cache": intent_cache.stats(),
+        "decision_cache": decision_cache.stats(),
+    }
+    for name, stats in caches.items():
+        lookups = stats["hits"] + stats["misses"]
+        metrics.cache_hits.labels(name).set(stats["hits"])
+        metrics.cache_misses.labels(name).set(stats["misses"])
+        metrics.cache_hit_ratio.labels(name).set(stats["hits"] / lookups if lookups else 0.0)
+        if "size" in stats:
+            metrics.cache_entries.labels(name).set(stats["size"])
+
+    # Sync endpoints and get_db run on AnyIO's worker threads (40 by default);
+    # waiting tasks mean requests are queueing for a thread, not for the DB or the LLM
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    metrics.threadpool_busy.labels().set(limiter.borrowed_tokens)
+    metrics.threadpool_capacity.labels().set(limiter.total_tokens)
+    metrics.threadpool_waiting.labels().set(limiter.statistics().tasks_waiting)
+
+    metrics.db_pool_checked_out.labels("sync").set(engine.pool.checkedout())
+    metrics.db_pool_checked_out.labels("async").set(async_engine.pool.checkedout())
+    gateway = llm_gateway.stats()
+    metrics.llm_in_flight.labels().set(gateway["in_flight"])
+    metrics.llm_concurrency_limit.labels().set(gateway["max_concurrency"])
+
+    buffered = trace_log.stats()
+    metrics.trace_log_buffered.labels().set(buffered["buffered"])
+    metrics.trace_log_dropped.labels().set(buffered["dropped"])
+    metrics.trace_log_failed.labels().set(buffered["failed"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    # Async on purpose: the scrape must not queue behind a saturated threadpool
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
 # =====================================================
 # 🚚 WAREHOUSE WEBHOOK
 # =====================================================
@@ -0,0 +1,122 @@
+import re
+from sqlalchemy import or_, select, text
+from sqlalchemy.exc import OperationalError
+from .models import Medicine
+
+
+# =========================
+# FTS5 SEARCH INDEX
+# =========================
+# External-content FTS5 table over medicines(name, description). The triggers keep it
+# in sync on every write, and updates only reindex when name/description change, so
+# stock updates at checkout never touch the index.
+FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS medicines_fts USING fts5(
+        name, description,
+        content='medicines', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS medicines_fts_ai AFTER INSERT ON medicines BEGIN
+        INSERT INTO medicines_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS medicines_fts_ad AFTER DELETE ON medicines BEGIN
+        INSERT INTO medicines_fts(medicines_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS medicines_fts_au AFTER UPDATE OF name, description ON medicines BEGIN
+        INSERT INTO medicines_fts(medicines_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO medicines_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+]
+
+# bm25() column weights: a hit in the name outranks a hit in a long description
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+FTS_ENABLED = False
+
+
+def ensure_search_index(engine):
+    global FTS_ENABLED
+
+    if engine.dialect.name != "sqlite":
+        FTS_ENABLED = False
+        return False
+
+    try:
+        with engine.begin() as conn:
+            exists = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'medicines_fts'"
+            ).first()
+
+            for stmt in FTS_DDL:
+                conn.exec_driver_sql(stmt)
+
+            # First run against an existing pharmacy.db: index the rows already there
+            if not exists:
+                conn.exec_driver_sql("INSERT INTO medicines_fts(medicines_fts) VALUES ('rebuild')")
+    except OperationalError as e:
+        print(f"FTS5 unavailable, falling back to LIKE search: {e}")
+        FTS_ENABLED = False
+        return False
+
+    FTS_ENABLED = True
+    return True
+
+
+def to_fts_query(query: str):
+    # Quote every token so user input can never be parsed as FTS5 syntax, and make
+    # the last one a prefix so partially typed words still match
+    tokens = re.findall(r"\w+", query.lower())
+    if not tokens:
+        return None
+    terms = [f'"{t}"' for t in tokens[:-1]] + [f'"{tokens[-1]}"*']
+    return " ".join(terms)
+
+
+def search_statement(query: str, limit: int = 5, offset: int = 0):
+    """SELECT of matching Medicine rows, or None when the query has no searchable terms."""
+    if not FTS_ENABLED:
+        return select(Medicine).filter(
+            or_(
+                Medicine.name.ilike(f"%{query}%"),
+                Medicine.description.ilike(f"%{query}%")
+            )
+        ).order_by(Medicine.name, Medicine.id).offset(offset).limit(limit)
+
+    fts_query = to_fts_query(query)
+    if not fts_query:
+        return None
+
+    stmt = text("""
+        SELECT medicines.* FROM medicines_fts
+        JOIN medicines ON medicines.id = medicines_fts.rowid
+        WHERE medicines_fts MATCH :q
+        ORDER BY bm25(medicines_fts, :name_weight, :description_weight), medicines.id
+        LIMIT :limit OFFSET :offset
+    """).bindparams(
+        q=fts_query,
+        name_weight=NAME_WEIGHT,
+        description_weight=DESCRIPTION_WEIGHT,
+        limit=limit,
+        offset=offset
+    )
+
+    return select(Medicine).from_statement(stmt)
+
+
+def search_medicines(db, query: str, limit: int = 5, offset: int = 0):
+    stmt = search_statement(query, limit=limit, offset=offset)
+    return db.scalars(stmt).all() if stmt is not None else []
+
+
+async def search_medicines_async(db, query: str, limit: int = 5, offset: int = 0):
+    stmt = search_statement(query, limit=limit, offset=offset)
+    return (await db.scalars(stmt)).all() if stmt is not None else []
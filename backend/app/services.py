@@ -1,76 +1,156 @@
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
+import os
+import hashlib
 import pandas as pd
-from sqlalchemy import or_
-from .models import Medicine, Order, RefillAlert, Patient
+from sqlalchemy import or_, update, case, func, select, exists, type_coerce, String
+from .models import Medicine, Order, RefillAlert, Patient, CatalogImport
+from .catalog_index import bump_catalog_version
+from .snapshots import file_sha256, read_excel_cached
 
 
 
 # =========================
 # IMPORT PRODUCTS
 # =========================
-def import_products_from_excel(db: Session):
-    import os
-    BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-    file_path = os.path.join(BASE_DIR, "data", "products-export.xlsx")
-
-    for _, row in df.iterrows():
-        exists = db.query(Medicine).filter(Medicine.name == row["Medicine Name"]).first()
-        if not exists:
-            med = Medicine(
-                name=row["Medicine Name"],
-                price=row.get("Price", 0),
-                package_size=row.get("Package Size", ""),
-                description=row.get("Description", ""),
-                stock=row.get("Stock", 0),
-                prescription_required=row.get("Prescription Required", False)
-            )
-            db.add(med)
-
-    db.commit()
-
-
-# =========================
-# IMPORT ORDERS
-# =========================
-DOSAGE_MAP = {
-    "once daily": 1,
-    "twice daily": 2,
-    "thrice daily": 3
+CATALOG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "products-export.xlsx")
+
+# Export column -> Medicine column (after strip + lowercase of the headers)
+CATALOG_COLUMNS = {
+    "product name": "name",
+    "price rec": "price",
+    "package size": "package_size",
+    "descriptions": "description",
 }
+CATALOG_FIELDS = ["price", "package_size", "description"]
 
-def import_products_from_excel(db: Session):
-    import os
-    BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-    file_path = os.path.join(BASE_DIR, "data", "products-export.xlsx")
+# Mock values (the export doesn't have these); set on first import only, so
+# re-imports never reset stock that checkout has been moving
+NEW_PRODUCT_STOCK = 50
 
 
-
-
-    df = pd.read_excel(file_path)
+def load_catalog_frame(path: str):
+    """The export as a DataFrame with Medicine column names, one row per product name."""
+    df = read_excel_cached(path)
 
     # Clean column names (removes hidden spaces + lowercase)
     df.columns = df.columns.str.strip().str.lower()
+    df = df.reindex(columns=list(CATALOG_COLUMNS)).rename(columns=CATALOG_COLUMNS)
+
+    df["name"] = df["name"].astype("string").str.strip()
+    df = df[df["name"].notna() & (df["name"] != "")]
+    df = df.drop_duplicates("name", keep="last")
+    df["price"] = pd.to_numeric(df["price"], errors="coerce").fillna(0.0).astype(float)
+    for column in ["package_size", "description"]:
+        df[column] = df[column].astype("string").fillna("")
+    return df.astype(object).reset_index(drop=True)
+
+
+def catalog_changes(df, existing):
+    """Rows of `df` that are new or whose catalog fields differ from `existing` (both keyed by name)."""
+    merged = df.merge(existing, on="name", how="left", suffixes=("", "_db"), indicator=True)
+    is_new = merged["_merge"] == "left_only"
+    changed = pd.Series(False, index=merged.index)
+    for field in CATALOG_FIELDS:
+        # NULLs in older rows count as different from anything in the file
+        differs = merged[field].ne(merged[f"{field}_db"])
+        if field == "description":
+            # A blank export cell never replaces a description (generate_descriptions.py fills those in)
+            differs &= merged[field] != ""
+        changed |= differs
+    return merged.loc[is_new | changed, ["name"] + CATALOG_FIELDS]
+
+
+def _dialect_insert(db: Session):
+    # INSERT ... ON CONFLICT is dialect-specific in SQLAlchemy
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def import_products_from_excel(db: Session, file_path: str = CATALOG_FILE):
+    """
+    Sync the medicines table with the product export. Skipped when the file's
+    SHA-256 matches the last import; otherwise only new or changed products are
+    written, in one INSERT ... ON CONFLICT (name) DO UPDATE. Returns the number
+    of products written (0 when skipped).
+    """
+    source = os.path.basename(file_path)
+    digest = file_sha256(file_path)
+
+    last = db.get(CatalogImport, source)
+    if last is not None and last.content_hash == digest:
+        print(f"Catalog {source} unchanged, import skipped")
+        db.rollback()
+        return 0
+
+    df = load_catalog_frame(file_path)
+    insert = _dialect_insert(db)
+
+    # Claim this content first: the write takes the database's write lock, so a
+    # worker that was importing the same file concurrently either finished
+    # (its hash is already recorded, rowcount 0) or we go first
+    db.execute(insert(CatalogImport).values(source=source).on_conflict_do_nothing(index_elements=["source"]))
+    claimed = db.execute(
+        update(CatalogImport)
+        .where(CatalogImport.source == source, or_(CatalogImport.content_hash.is_(None), CatalogImport.content_hash != digest))
+        .values(content_hash=digest, row_count=len(df), imported_at=datetime.utcnow())
+    ).rowcount
+    if not claimed:
+        print(f"Catalog {source} already imported by another worker")
+        db.rollback()
+        return 0
+
+    existing = pd.DataFrame(
+        db.query(Medicine.name, *[getattr(Medicine, field) for field in CATALOG_FIELDS]).all(),
+        columns=["name"] + CATALOG_FIELDS
+    )
+    rows = catalog_changes(df, existing).to_dict("records")
+
+    if rows:
+        for row in rows:
+            # Only used when the name is new; ON CONFLICT leaves these alone
+            row.update(stock=NEW_PRODUCT_STOCK, prescription_required=False)
+        stmt = insert(Medicine)
+        updates = {field: stmt.excluded[field] for field in CATALOG_FIELDS}
+        updates["description"] = func.coalesce(func.nullif(stmt.excluded.description, ""), Medicine.description)
+        stmt = stmt.on_conflict_do_update(index_elements=["name"], set_=updates)
+        db.execute(stmt, rows)
+    db.commit()
 
-    for _, row in df.iterrows():
-        exists = db.query(Medicine).filter(
-            Medicine.name == row["product name"]
-        ).first()
-
-        if not exists:
-            med = Medicine(
-                name=row["product name"],
-                price=float(row.get("price rec", 0)),
-                package_size=row.get("package size", ""),
-                description=row.get("descriptions", ""),
+    print(f"Catalog {source}: {len(df)} products, {len(rows)} new or changed")
+    if rows:
+        bump_catalog_version()
+    return len(rows)
 
-                # Mock values (since Excel doesn’t have these)
-                stock=50,
-                prescription_required=False
-            )
-            db.add(med)
 
-    db.commit()
+# =========================
+# ORDER HISTORY KEYS
+# =========================
+def order_source_keys(rows, seen=None):
+    """
+    Natural keys for order-history rows given as (patient_id, product_name,
+    purchase_date, quantity, total_price, dosage_frequency), the date as stored
+    ("YYYY-MM-DD HH:MM:SS.ffffff", "" if the file had none). The n-th repeat of
+    an identical row gets ":n", so real repeat purchases are kept while reading
+    the same file again matches the keys already stored. `seen` carries the
+    repeat counts across calls.
+
+    Keys are not scoped to a file, so overlapping exports dedupe against each
+    other. The flip side: a row identical in every field to one already stored
+    from another file (including an undated one) is taken for the same purchase
+    and skipped.
+    """
+    seen = {} if seen is None else seen
+    keys = []
+    for row in rows:
+        key = hashlib.sha1("\x1f".join("" if v is None else str(v) for v in row).encode()).hexdigest()
+        repeat = seen.get(key, 0)
+        seen[key] = repeat + 1
+        keys.append(f"{key}:{repeat}" if repeat else key)
+    return keys
 
 
 # =========================
@@ -105,6 +185,58 @@ def check_prescription(db: Session, medicine_name: str):
     return {"prescription_required": product.prescription_required}
 
 
+# =========================
+# ATOMIC STOCK CHANGES
+# =========================
+# Stock is never read into Python and written back: two checkouts doing that
+# concurrently both see the same stock and oversell. Each change is one UPDATE
+# whose WHERE clause carries the condition, so the database serializes them.
+# None of these commit; the caller commits or rolls back the whole cart.
+def reserve_stock(db: Session, medicine_id: int, quantity: int):
+    """Take `quantity` units if that many are left; False (nothing changed) otherwise."""
+    return reserve_stock_many(db, {medicine_id: quantity})
+
+
+def reserve_stock_many(db: Session, quantities: dict):
+    """
+    All-or-nothing reservation for a whole cart ({medicine_id: quantity}) in one
+    UPDATE. False if any product is short; the caller must then roll back.
+    """
+    if not quantities:
+        return True
+    wanted = case(quantities, value=Medicine.id)
+    result = db.execute(
+        update(Medicine)
+        .where(Medicine.id.in_(list(quantities)), Medicine.stock >= wanted)
+        .values(stock=Medicine.stock - wanted)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == len(quantities)
+
+
+def restock_many_if_below(db: Session, quantities: dict, amount: int):
+    """Add `amount` units to every product whose stock is below its wanted quantity; returns their ids."""
+    if not quantities:
+        return []
+    result = db.execute(
+        update(Medicine)
+        .where(Medicine.id.in_(list(quantities)), Medicine.stock < case(quantities, value=Medicine.id))
+        .values(stock=Medicine.stock + amount)
+        .returning(Medicine.id)
+        .execution_options(synchronize_session=False)
+    )
+    return [row[0] for row in result]
+
+
+def add_stock(db: Session, medicine_id: int, amount: int):
+    db.execute(
+        update(Medicine)
+        .where(Medicine.id == medicine_id)
+        .values(stock=Medicine.stock + amount)
+        .execution_options(synchronize_session=False)
+    )
+
+
 # =========================
 # PLACE ORDER
 # =========================
@@ -118,10 +250,13 @@ def place_order(db: Session, patient_id: str, medicine_name: str, quantity: int,
     if not product:
         return {"status": "not_found"}
 
-    product.stock -= quantity
+    if not reserve_stock(db, product.id, quantity):
+        db.rollback()
+        return {"status": "insufficient_stock"}
 
     order = Order(
         patient_id=patient_id,
+        medicine_id=product.id,
         product_name=product.name,
         quantity=quantity,
         dosage_frequency=dosage_frequency
@@ -129,6 +264,7 @@ def place_order(db: Session, patient_id: str, medicine_name: str, quantity: int,
 
     db.add(order)
     db.commit()
+    bump_catalog_version()
 
     # 🔥 Webhook Trigger
     try:
@@ -157,83 +293,124 @@ def predict_refill(db: Session, user_id: str):
 from datetime import datetime, timedelta
 from .models import Order
 
-def check_recent_purchase(db: Session, user_id: str, medicine_name: str):
-    three_days_ago = datetime.utcnow() - timedelta(days=3)
+# Repeat purchases of the same product inside this window are blocked
+RECENT_PURCHASE_DAYS = 3
 
-    recent_order = db.query(Order).filter(
-        Order.patient_id == user_id,
-        Order.product_name.ilike(f"%{medicine_name}%"),
-        Order.purchase_date >= three_days_ago
-    ).first()
+def check_recent_purchase(db: Session, user_id: str, medicine_id: int):
+    return bool(recently_purchased_ids(db, user_id, [medicine_id]))
 
-    if recent_order:
-        return True
 
-    return False
+def recently_purchased_ids(db: Session, user_id: str, medicine_ids):
+    """Which of `medicine_ids` the patient bought within RECENT_PURCHASE_DAYS (one query)."""
+    since = datetime.utcnow() - timedelta(days=RECENT_PURCHASE_DAYS)
+
+    # Served by ix_orders_patient_medicine_purchase
+    rows = db.query(Order.medicine_id).filter(
+        Order.patient_id == user_id,
+        Order.medicine_id.in_(list(medicine_ids)),
+        Order.purchase_date >= since
+    ).distinct().all()
+    return {row[0] for row in rows}
+
 # =========================
 # AUTONOMOUS SCAN & SMS NOTIFICATIONS
 # =========================
-def scan_and_generate_refill_alerts(db: Session):
-    users_records = db.query(Order.patient_id).distinct().all()
-    users = [u[0] for u in users_records]
+# Alert when a supply runs out within this many days
+REFILL_LEAD_DAYS = 2
+
+
+def due_refills(db: Session, now=None):
+    """
+    One row per (patient, medicine) whose supply runs out within REFILL_LEAD_DAYS
+    and that has no refill alert yet: the earliest such purchase, with its
+    run-out date. Medicines are matched by medicine_id, or by product name for
+    order history the catalog couldn't resolve.
+    """
+    now = now or datetime.utcnow()
+    # Anti-join: orders whose patient already has an alert for the medicine drop
+    # out in SQL; each probe is one lookup on a (patient_id, ...) alert index
+    alerted_by_id = exists().where(RefillAlert.patient_id == Order.patient_id, RefillAlert.medicine_id == Order.medicine_id)
+    alerted_by_name = exists().where(RefillAlert.patient_id == Order.patient_id, RefillAlert.medicine_name == Order.product_name)
+    # purchase_date comes back as stored text and is parsed column-wise below,
+    # instead of one DateTime conversion per row
+    rows = db.execute(
+        select(Order.id, Order.patient_id, Order.medicine_id, Order.product_name,
+               type_coerce(Order.purchase_date, String), Order.quantity, Order.dosage_frequency)
+        .where(
+            Order.dosage_frequency > 0, Order.quantity.isnot(None), Order.purchase_date.isnot(None),
+            ~alerted_by_id, or_(Order.medicine_id.isnot(None), ~alerted_by_name)
+        )
+    ).all()
+    orders = pd.DataFrame(rows, columns=["id", "patient_id", "medicine_id", "product_name", "purchase_date", "quantity", "dosage_frequency"])
+
+    # Run-out = purchase_date + quantity / dosage_frequency days, for every order at once
+    days_supply = orders["quantity"].astype(float) / orders["dosage_frequency"].astype(float)
+    orders["purchase_date"] = pd.to_datetime(orders["purchase_date"], format="ISO8601")
+    orders["run_out"] = (orders["purchase_date"] + pd.to_timedelta(days_supply, unit="D")).dt.round("us")
+    due = orders[orders["run_out"] <= now + timedelta(days=REFILL_LEAD_DAYS)]
+
+    medicine = due["medicine_id"].astype("Int64").astype("string").fillna("name:" + due["product_name"].astype("string"))
+    due = due.assign(medicine=medicine).sort_values(["purchase_date", "id"])
+    return due.drop_duplicates(["patient_id", "medicine"])
 
+
+def scan_and_generate_refill_alerts(db: Session):
     generated = []
 
     # 1. Dosage Cycle Alerts (Patient's supply is running low)
-    for user in users:
-        orders = db.query(Order).filter(Order.patient_id == user).all()
-
-        for order in orders:
-            if order.dosage_frequency <= 0:
-                continue
-
-            days_supply = order.quantity / order.dosage_frequency
-            run_out = order.purchase_date + timedelta(days=days_supply)
-
-            if datetime.utcnow() >= run_out - timedelta(days=2):
-                existing = db.query(RefillAlert).filter(
-                    RefillAlert.patient_id == user,
-                    RefillAlert.medicine_name == order.product_name
-                ).first()
-
-                if not existing:
-                    alert = RefillAlert(
-                        patient_id=user,
-                        medicine_name=order.product_name,
-                        expected_run_out=run_out
-                    )
-                    db.add(alert)
-                    db.commit() # Commit to avoid duplicates across scans
-
-                    patient = db.query(Patient).filter(Patient.id == user).first()
-                    email = patient.email if patient else user
-
-                    # Trigger Mock EMAIL Alert
-                    print(f"📧 [MOCK EMAIL to {email}] Hello! Your {order.product_name} is running low based on your dosage cycle. Please repurchase soon.")
-
-                    generated.append({
-                        "patient_id": user,
-                        "medicine": order.product_name,
-                        "type": "dosage_refill"
-                    })
+    started = datetime.utcnow()
+    due = due_refills(db, now=started)
+    inserted = []
+    if len(due):
+        rows = [
+            {"patient_id": patient_id, "medicine_id": None if pd.isna(medicine_id) else int(medicine_id),
+             "medicine_name": name, "expected_run_out": run_out.to_pydatetime(), "alert_generated_at": started}
+            for patient_id, medicine_id, name, run_out in zip(
+                due["patient_id"].tolist(), due["medicine_id"].tolist(), due["product_name"].tolist(), due["run_out"].tolist())
+        ]
+        # One executemany; a concurrent scan that got there first (or a second
+        # order under the same name) is skipped by ux_refill_alerts_patient_medicine
+        stmt = _dialect_insert(db)(RefillAlert.__table__).on_conflict_do_nothing(index_elements=["patient_id", "medicine_name"])
+        written = db.execute(stmt, rows).rowcount
+        if written == len(rows):
+            inserted = [(row["patient_id"], row["medicine_name"]) for row in rows]
+        else:
+            # Some were skipped: this scan's rows are the ones stamped with its start time
+            inserted = db.execute(
+                select(RefillAlert.patient_id, RefillAlert.medicine_name).where(RefillAlert.alert_generated_at == started)
+            ).all()
+        db.commit()
+
+    emails = patient_emails(db, {patient_id for patient_id, _ in inserted})
+    for patient_id, medicine_name in inserted:
+        # Trigger Mock EMAIL Alert
+        print(f"📧 [MOCK EMAIL to {emails.get(patient_id, patient_id)}] Hello! Your {medicine_name} is running low based on your dosage cycle. Please repurchase soon.")
+        generated.append({
+            "patient_id": patient_id,
+            "medicine": medicine_name,
+            "type": "dosage_refill"
+        })
 
     # 2. Store Low Stock Alerts for Previous Buyers
-    low_stock_meds = db.query(Medicine).filter(Medicine.stock <= 10).all()
-    for med in low_stock_meds:
-        # find users who bought this medicine
-        buyers_records = db.query(Order.patient_id).filter(Order.product_name == med.name).distinct().all()
-        buyers = [b[0] for b in buyers_records]
-        
-        for buyer_id in buyers:
-            patient = db.query(Patient).filter(Patient.id == buyer_id).first()
-            email = patient.email if patient else buyer_id
-            # Check if we already alerted them recently (Mocked by just printing)
-            print(f"📧 [MOCK EMAIL to {email}] Notification: A previously purchased medicine ({med.name}) is running low in our store inventory. Order now to secure your refill.")
-            generated.append({
-                "patient_id": buyer_id,
-                "medicine": med.name,
-                "type": "store_low_stock"
-            })
+    low_stock_meds = db.query(Medicine).filter(Medicine.stock <= 10).order_by(Medicine.id).all()
+    # Every (medicine, buyer, email) in one join instead of a query per medicine and per buyer
+    buyers = db.execute(
+        select(Medicine.name, Order.patient_id, Patient.id, Patient.email)
+        .join(Order, Order.medicine_id == Medicine.id)
+        .outerjoin(Patient, Patient.id == Order.patient_id)
+        .where(Medicine.stock <= 10)
+        .distinct()
+        .order_by(Medicine.id, Order.patient_id)
+    ).all() if low_stock_meds else []
+    for medicine_name, buyer_id, known, email in buyers:
+        email = email if known is not None else buyer_id
+        # Check if we already alerted them recently (Mocked by just printing)
+        print(f"📧 [MOCK EMAIL to {email}] Notification: A previously purchased medicine ({medicine_name}) is running low in our store inventory. Order now to secure your refill.")
+        generated.append({
+            "patient_id": buyer_id,
+            "medicine": medicine_name,
+            "type": "store_low_stock"
+        })
             
     # Also trigger admin alert
     for med in low_stock_meds:
@@ -241,6 +418,17 @@ def scan_and_generate_refill_alerts(db: Session):
 
     return generated
 
+
+def patient_emails(db: Session, patient_ids, batch=500):
+    """patient id -> email for the given ids, a few hundred ids per query."""
+    patient_ids = list(patient_ids)
+    emails = {}
+    for start in range(0, len(patient_ids), batch):
+        emails.update(db.execute(
+            select(Patient.id, Patient.email).where(Patient.id.in_(patient_ids[start:start + batch]))
+        ).all())
+    return emails
+
 from sqlalchemy import or_
 from .models import Medicine
 
@@ -249,25 +437,33 @@ from sqlalchemy import or_
 from .models import Medicine
 
 
-import os
 import json
-from groq import Groq
-from dotenv import load_dotenv
+from .retrieval import symptom_retriever, RECOMMEND_TOP_K
+from .llm_gateway import llm_gateway
+from .database import release_async_connection, run_sync_session
+from .tracing import span
 
-load_dotenv()
+def select_recommend_candidates(db, symptom, top_k=RECOMMEND_TOP_K):
+    # Local BM25 pre-selection: only the top-K candidates go into the prompt
+    candidate_ids = symptom_retriever.top_k(db, symptom or "", k=top_k)
+
+    if candidate_ids:
+        rows = {m.id: m for m in db.query(Medicine).filter(Medicine.id.in_(candidate_ids)).all()}
+        return [rows[i] for i in candidate_ids if i in rows]
+
+    # Nothing lexically close (e.g. no shared stems with the German catalog):
+    # give the model a bounded slice rather than the whole table
+    return db.query(Medicine).order_by(Medicine.id).limit(top_k).all()
 
-def recommend_from_symptom(db, symptom):
-    medicines = db.query(Medicine).all()
-    if not medicines:
-        return []
 
+def build_recommend_prompt(symptom, medicines):
     catalog = []
     for m in medicines:
         catalog.append(f"ID: {m.id} | Name: {m.name} | Desc: {m.description} | Price: {m.price} | Stock: {m.stock}")
         
     catalog_text = "\n".join(catalog)
 
-    prompt = f"""
+    return f"""
 You are a medical AI matching patient symptoms to a database of medicines.
 The user has the following symptom: "{symptom}"
 
@@ -285,10 +481,22 @@ Return a JSON object containing a "recommendations" array. Each object in the ar
   ]
 }}
 """
+
+
+async def recommend_from_symptom(db, symptom, top_k=RECOMMEND_TOP_K):
+    # db is the orchestrator's AsyncSession; candidate selection is sync (BM25 index),
+    # so it runs in the threadpool on its own session
+    with span("retrieval"):
+        medicines = await run_sync_session(select_recommend_candidates, symptom, top_k=top_k)
+    if not medicines:
+        return []
+
+    prompt = build_recommend_prompt(symptom, medicines)
+    await release_async_connection(db)
     try:
-        client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-        completion = client.chat.completions.create(
+        raw = await llm_gateway.complete(
             model="llama-3.3-70b-versatile",
+            agent="recommend_from_symptom",
             messages=[
                 {"role": "system", "content": "You are a helpful JSON-only API."},
                 {"role": "user", "content": prompt}
@@ -296,27 +504,14 @@ Return a JSON object containing a "recommendations" array. Each object in the ar
             temperature=0,
             response_format={"type": "json_object"}
         )
-        data = json.loads(completion.choices[0].message.content)
+        data = json.loads(raw)
         return data.get("recommendations", [])
     except Exception as e:
         print(f"Recommend error: {e}")
         return []
 
-from rapidfuzz import process
-from .models import Medicine
+from .catalog_index import catalog_index
 
 def fuzzy_match_medicine(db, input_name: str):
-
-    medicines = db.query(Medicine).all()
-    names = [m.name for m in medicines]
-
-    if not names:
-        return None
-
-    match = process.extractOne(input_name, names)
-
-    # match format: (matched_string, score, index)
-    if match and match[1] >= 65:  # confidence threshold
-        return match[0]
-
-    return None
\ No newline at end of file
+    # Pure in-memory lookup; the index only touches the DB after a catalog change
+    return catalog_index.match(db, input_name, score_cutoff=65)  # confidence threshold
\ No newline at end of file
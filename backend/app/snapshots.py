@@ -0,0 +1,139 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import pandas as pd
+import pyarrow as pa
+
+
+# =========================
+# COLUMNAR SNAPSHOTS OF THE EXCEL EXPORTS
+# =========================
+# Parsing .xlsx through openpyxl is slow and memory hungry. Each export is
+# converted once into an uncompressed Arrow IPC file next to the retrieval index;
+# later loads memory-map it, so the columns are read straight from the page
+# cache without decoding. A snapshot is rebuilt only when its source file
+# changes (size + mtime, then SHA-256) or is read with different options.
+SNAPSHOT_DIR = os.getenv(
+    "SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "index_cache", "snapshots")
+)
+METADATA_KEY = b"pharmacy_snapshot"
+
+
+def file_sha256(path: str):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def snapshot_path(source: str, read_options: dict):
+    # One snapshot per (file, read_excel options): skiprows=1 and skiprows=2 are different tables
+    options = hashlib.sha1(json.dumps(read_options, sort_keys=True, default=str).encode()).hexdigest()[:8]
+    name = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(SNAPSHOT_DIR, f"{name}.{options}.arrow")
+
+
+def _arrow_safe(df):
+    # Excel columns can mix numbers, dates and text (e.g. header rows read as data);
+    # Arrow needs one type per column, so those are stored as text
+    stringified = []
+    for column in df.columns[df.dtypes == object]:
+        try:
+            pa.array(df[column], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            df[column] = df[column].map(lambda v: None if pd.isna(v) else str(v))
+            stringified.append(str(column))
+    return df, stringified
+
+
+def _read_metadata(path: str):
+    try:
+        with pa.memory_map(path, "r") as source:
+            schema = pa.ipc.open_file(source).schema
+        return json.loads(schema.metadata[METADATA_KEY])
+    except (OSError, KeyError, TypeError, ValueError, pa.ArrowInvalid):
+        return None
+
+
+def _is_fresh(meta, source: str, read_options: dict):
+    if meta is None or meta.get("read_options") != json.loads(json.dumps(read_options, default=str)):
+        return False
+    stat = os.stat(source)
+    if meta["source_size"] == stat.st_size and meta["source_mtime_ns"] == stat.st_mtime_ns:
+        return True
+    # Touched or copied but possibly identical: the hash decides
+    return meta["source_size"] == stat.st_size and meta["source_sha256"] == file_sha256(source)
+
+
+def convert(source: str, **read_options):
+    """Parse `source` with pandas.read_excel(**read_options) and write its snapshot; returns the Arrow table."""
+    stat = os.stat(source)
+    digest = file_sha256(source)
+    df, stringified = _arrow_safe(pd.read_excel(source, **read_options))
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    meta = {
+        "source": os.path.basename(source),
+        "source_sha256": digest,
+        "source_size": stat.st_size,
+        "source_mtime_ns": stat.st_mtime_ns,
+        "read_options": json.loads(json.dumps(read_options, default=str)),
+        "stringified_columns": stringified,
+        "rows": table.num_rows,
+    }
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), METADATA_KEY: json.dumps(meta).encode()})
+
+    path = snapshot_path(source, read_options)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        # Atomic swap, so a worker loading the old snapshot never sees a half-written file
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Snapshot of {source} not persisted: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return table
+
+
+def load_table(source: str, **read_options):
+    """
+    The Excel export as an Arrow table backed by a memory-mapped snapshot,
+    converting first if the snapshot is missing or stale.
+    """
+    path = snapshot_path(source, read_options)
+    if not (os.path.exists(path) and _is_fresh(_read_metadata(path), source, read_options)):
+        started = time.perf_counter()
+        table = convert(source, **read_options)
+        print(f"Snapshot of {os.path.basename(source)} rebuilt in {(time.perf_counter() - started) * 1000:.0f} ms")
+        if not os.path.exists(path):
+            return table
+
+    # Zero-copy: buffers point into the mapping, pages are read on first touch
+    with pa.memory_map(path, "r") as mapped:
+        return pa.ipc.open_file(mapped).read_all()
+
+
+def read_excel_cached(source: str, **read_options):
+    """Drop-in for pandas.read_excel(source, **read_options), served from the snapshot."""
+    return load_table(source, **read_options).to_pandas()
+
+
+if __name__ == "__main__":
+    # python -m app.snapshots FILE.xlsx [FILE.xlsx ...] [--skiprows N]
+    args = sys.argv[1:]
+    options = {}
+    if "--skiprows" in args:
+        i = args.index("--skiprows")
+        options["skiprows"] = int(args[i + 1])
+        del args[i:i + 2]
+    for source in args:
+        table = convert(source, **options)
+        path = snapshot_path(source, options)
+        print(f"{source}: {table.num_rows} rows -> {path} ({os.path.getsize(path) / 1024:.0f} KiB, xlsx {os.path.getsize(source) / 1024:.0f} KiB)")
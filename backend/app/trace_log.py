@@ -0,0 +1,139 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from .database import SessionLocal
+from .models import SystemLog, TraceSpan
+
+
+# =========================
+# WRITE-BEHIND TRACE LOG
+# =========================
+# /chat used to add + commit a SystemLog row inside the request, so every chat
+# queued on SQLite's single writer lock just for telemetry. Requests now only
+# append a plain dict to a bounded ring buffer; a background task drains it in
+# one transaction per batch.
+TRACE_LOG_CAPACITY = int(os.getenv("TRACE_LOG_CAPACITY", "10000"))
+# Flush as soon as this many traces are waiting...
+TRACE_LOG_FLUSH_SIZE = int(os.getenv("TRACE_LOG_FLUSH_SIZE", "200"))
+# ...or at least this often (seconds)
+TRACE_LOG_FLUSH_INTERVAL = float(os.getenv("TRACE_LOG_FLUSH_INTERVAL", "1.0"))
+
+
+class TraceLogBuffer:
+    """
+    Ring buffer of pending SystemLog records. When it is full the oldest record is
+    dropped (and counted) instead of making the request wait. The flusher task is
+    started on first use, on whichever event loop is running.
+    """
+
+    def __init__(self, capacity: int = TRACE_LOG_CAPACITY, flush_size: int = TRACE_LOG_FLUSH_SIZE, flush_interval: float = TRACE_LOG_FLUSH_INTERVAL):
+        self.capacity = capacity
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = deque(maxlen=capacity)
+        # Serializes flushes between the background task and close()
+        self._flush_lock = threading.Lock()
+        self._loop = None
+        self._task = None
+        self._wakeup = None
+        self._stats = {"submitted": 0, "dropped": 0, "flushed": 0, "failed": 0, "flushes": 0, "last_flush_ms": 0.0}
+
+    def submit(self, record: dict):
+        """
+        Queue one trace: a SystemLog column dict with a "spans" list of TraceSpan
+        column dicts. Never blocks on the database.
+        """
+        with self._lock:
+            if len(self._pending) == self.capacity:
+                self._stats["dropped"] += 1
+            self._pending.append(record)
+            self._stats["submitted"] += 1
+            full = len(self._pending) >= self.flush_size
+
+        self._ensure_started()
+        if full and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _ensure_started(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Sync caller outside the app: records wait for the next flush()/close()
+            return
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._pending:
+                # The insert is sync SQLAlchemy; keep it off the event loop
+                await asyncio.to_thread(self.flush)
+
+    def _drain(self):
+        with self._lock:
+            batch = list(self._pending)
+            self._pending.clear()
+        return batch
+
+    def flush(self):
+        """Write everything buffered so far in one transaction; returns the row count."""
+        with self._flush_lock:
+            batch = self._drain()
+            if not batch:
+                return 0
+
+            start = time.perf_counter()
+            db = SessionLocal()
+            try:
+                # ORM add_all batches the parent inserts (RETURNING ids) and then the spans
+                db.add_all([
+                    SystemLog(**{k: v for k, v in record.items() if k != "spans"}, spans=[TraceSpan(**s) for s in record["spans"]])
+                    for record in batch
+                ])
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"Trace log flush of {len(batch)} records failed: {e}")
+                with self._lock:
+                    self._stats["failed"] += len(batch)
+                return 0
+            finally:
+                db.close()
+
+            with self._lock:
+                self._stats["flushed"] += len(batch)
+                self._stats["flushes"] += 1
+                self._stats["last_flush_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            return len(batch)
+
+    async def close(self):
+        """Stop the flusher and write out whatever is still buffered (app shutdown)."""
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await asyncio.to_thread(self.flush)
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                "buffered": len(self._pending),
+                "capacity": self.capacity,
+                "flush_size": self.flush_size,
+                "flush_interval_seconds": self.flush_interval,
+            }
+
+
+trace_log = TraceLogBuffer()
@@ -0,0 +1,211 @@
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from sqlalchemy import event
+from .quantiles import WindowedSketch
+from .metrics import llm_tokens, db_query_duration, sql_operation
+
+
+# =========================
+# PER-STAGE REQUEST TRACING
+# =========================
+# A TraceRecorder is bound to the current request through a ContextVar, so agents
+# open spans (tracing.span("intent")) and the gateway / SQLAlchemy events annotate
+# the innermost open one without any of them passing a tracer around.
+STAGE_WINDOWS = [60, 300, 900, 3600]
+
+_current = ContextVar("trace_recorder", default=None)
+
+
+class Span:
+    __slots__ = (
+        "stage", "started_at", "ended_at", "_start", "_end", "model", "prompt_tokens",
+        "completion_tokens", "llm_calls", "cache_hit", "detail", "db_queries", "db_time",
+    )
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.started_at = datetime.utcnow()
+        self.ended_at = None
+        self._start = time.perf_counter()
+        self._end = None
+        self.model = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.llm_calls = 0
+        self.cache_hit = None
+        self.detail = None
+        self.db_queries = 0
+        self.db_time = 0.0
+
+    def finish(self):
+        self._end = time.perf_counter()
+        self.ended_at = datetime.utcnow()
+
+    @property
+    def duration_ms(self):
+        end = self._end if self._end is not None else time.perf_counter()
+        return (end - self._start) * 1000
+
+
+class TraceRecorder:
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans = []
+        self._open = []
+        self._start = time.perf_counter()
+
+    @property
+    def elapsed_ms(self):
+        return (time.perf_counter() - self._start) * 1000
+
+    @contextmanager
+    def span(self, stage: str):
+        span = Span(stage)
+        self._open.append(span)
+        try:
+            yield span
+        finally:
+            span.finish()
+            self._open.remove(span)
+            self.spans.append(span)
+
+    def innermost(self):
+        return self._open[-1] if self._open else None
+
+
+@contextmanager
+def trace_request(recorder: TraceRecorder):
+    token = _current.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current.reset(token)
+
+
+def current_recorder():
+    return _current.get()
+
+
+@contextmanager
+def span(stage: str):
+    recorder = _current.get()
+    if recorder is None:
+        # Untraced caller (scripts, benchmarks): hand out a detached span
+        yield Span(stage)
+        return
+    with recorder.span(stage) as s:
+        yield s
+
+
+def annotate(**fields):
+    recorder = _current.get()
+    target = recorder.innermost() if recorder else None
+    if target is not None:
+        for key, value in fields.items():
+            setattr(target, key, value)
+
+
+def record_llm_usage(model: str, prompt_tokens, completion_tokens):
+    llm_tokens.labels(model, "prompt").inc(prompt_tokens or 0)
+    llm_tokens.labels(model, "completion").inc(completion_tokens or 0)
+    recorder = _current.get()
+    target = recorder.innermost() if recorder else None
+    if target is not None:
+        target.model = model
+        target.prompt_tokens += prompt_tokens or 0
+        target.completion_tokens += completion_tokens or 0
+        target.llm_calls += 1
+
+
+# =========================
+# DB QUERY ACCOUNTING
+# =========================
+# Feeds both the open spans of a traced request and the process-wide /metrics histogram.
+# The start time lives on the statement's execution context, not the connection:
+# after_cursor_execute never fires for a statement that raises, and anything left
+# on the pooled connection would stay there for the life of the process.
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_query_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    db_query_duration.labels(sql_operation(statement)).observe(elapsed)
+    recorder = _current.get()
+    if recorder is None:
+        return
+    # Every open span counts it, so an outer stage includes its sub-stages
+    for s in recorder._open:
+        s.db_queries += 1
+        s.db_time += elapsed
+
+
+def install_query_counter(engine):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# =========================
+# SLIDING-WINDOW STAGE PERCENTILES
+# =========================
+class StageStats:
+    """One WindowedSketch of span durations per stage, fed as traces complete."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def _sketch(self, stage):
+        with self._lock:
+            sketch = self._stages.get(stage)
+            if sketch is None:
+                sketch = self._stages[stage] = WindowedSketch(horizon_seconds=max(STAGE_WINDOWS))
+            return sketch
+
+    def observe(self, stage, duration_ms, **counters):
+        self._sketch(stage).add(duration_ms, **counters)
+
+    def observe_trace(self, recorder: TraceRecorder, total_ms: float):
+        for s in recorder.spans:
+            self.observe(
+                s.stage,
+                s.duration_ms,
+                prompt_tokens=s.prompt_tokens,
+                completion_tokens=s.completion_tokens,
+                db_queries=s.db_queries,
+                cache_hits=1 if s.cache_hit else 0,
+            )
+        self.observe("total", total_ms)
+
+    def report(self, window_seconds: int):
+        with self._lock:
+            stages = dict(self._stages)
+
+        report = {}
+        for stage, windowed in sorted(stages.items()):
+            sketch, totals = windowed.snapshot(window_seconds)
+            if sketch.count == 0:
+                continue
+            report[stage] = {
+                "count": sketch.count,
+                "p50_ms": round(sketch.quantile(0.50), 2),
+                "p95_ms": round(sketch.quantile(0.95), 2),
+                "p99_ms": round(sketch.quantile(0.99), 2),
+                "max_ms": round(sketch.max, 2),
+                "mean_ms": round(sketch.total / sketch.count, 2),
+                "cache_hit_rate": round(totals.get("cache_hits", 0) / sketch.count, 4),
+                "prompt_tokens": totals.get("prompt_tokens", 0),
+                "completion_tokens": totals.get("completion_tokens", 0),
+                "db_queries": totals.get("db_queries", 0),
+            }
+        return report
+
+
+stage_stats = StageStats()
@@ -0,0 +1,225 @@
+import os
+import sys
+import time
+import random
+import asyncio
+import tempfile
+import socket
+import subprocess
+
+# Throwaway database, and no real LLM client is ever built
+WORK_DIR = tempfile.mkdtemp(prefix="pharmacy_async_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(WORK_DIR, 'pharmacy.db')}")
+os.environ.setdefault("LLM_PROVIDER", "stub")
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import httpx
+from fastapi import FastAPI, APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from app.database import Base, SessionLocal, engine, get_db
+from app.models import Medicine, Order
+from app.migrations import run_migrations
+from app.search_index import ensure_search_index, search_medicines
+from app.routes import router
+
+# Sync (threadpool + get_db) vs async (AsyncSession + aiosqlite) versions of
+# /products, /search and /user/orders/{id}, served by uvicorn in a subprocess and
+# driven with CONCURRENCY requests in flight. Run twice: on an idle server, and
+# while BLOCKERS sync requests hold AnyIO worker threads (e.g. a slow upload or
+# checkout), which is where the sync handlers queue and the async ones don't.
+# Before that, CONCURRENCY /chat requests (stub LLM) right after a restock, when
+# they all rebuild the in-memory catalog indexes at once.
+# Usage: python benchmarks/bench_async_endpoints.py
+PRODUCTS = 200
+ORDERS = 50_000
+PATIENTS = 2_000
+CONCURRENCY = 20
+REQUESTS = 400
+BLOCKERS = 40
+BLOCK_SECONDS = 2.0
+
+WORDS = ["paracetamol", "ibuprofen", "vitamin", "omega", "nasenspray", "tabletten", "kapseln", "salbe"]
+
+# The pre-async handlers, unchanged apart from the path prefix
+legacy = APIRouter(prefix="/sync")
+
+
+@legacy.get("/products")
+def legacy_products(db: Session = Depends(get_db)):
+    medicines = db.query(Medicine).all()
+    return [
+        {"id": m.id, "name": m.name, "price": m.price, "stock": m.stock,
+         "prescription_required": m.prescription_required, "max_safe_dosage": m.max_safe_dosage}
+        for m in medicines
+    ]
+
+
+@legacy.get("/search")
+def legacy_search(query: str = Query(..., min_length=2), limit: int = 5, offset: int = 0, db: Session = Depends(get_db)):
+    results = search_medicines(db, query, limit=limit, offset=offset)
+    return [{"id": m.id, "name": m.name, "price": m.price, "stock": m.stock,
+             "prescription_required": m.prescription_required} for m in results]
+
+
+@legacy.get("/user/orders/{user_id}")
+def legacy_orders(user_id: str, db: Session = Depends(get_db)):
+    orders = db.query(Order).filter(Order.patient_id == user_id).order_by(Order.purchase_date.desc()).all()
+    return [{"product": o.product_name, "quantity": o.quantity, "purchase_date": o.purchase_date} for o in orders]
+
+
+@legacy.get("/blocker")
+def blocker():
+    # Stands in for any sync handler that holds a worker thread for a while
+    time.sleep(BLOCK_SECONDS)
+    return {}
+
+
+app = FastAPI()
+app.include_router(router)
+app.include_router(legacy)
+
+
+def seed():
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    ensure_search_index(engine)
+    rng = random.Random(0)
+    db = SessionLocal()
+    db.bulk_insert_mappings(Medicine, [
+        {"name": f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {i}", "description": " ".join(rng.sample(WORDS, 3)),
+         "stock": 100, "price": 5.0, "max_safe_dosage": 10}
+        for i in range(PRODUCTS)
+    ])
+    db.bulk_insert_mappings(Order, [
+        {"patient_id": f"PAT{rng.randrange(PATIENTS)}", "medicine_id": rng.randrange(1, PRODUCTS + 1),
+         "product_name": "x", "quantity": 1}
+        for _ in range(ORDERS)
+    ])
+    db.commit()
+    db.close()
+
+
+def paths(endpoint, rng):
+    if endpoint == "/products":
+        return "/products"
+    if endpoint == "/search":
+        return f"/search?query={rng.choice(WORDS)}"
+    return f"/user/orders/PAT{rng.randrange(PATIENTS)}"
+
+
+async def run(client, prefix, endpoint):
+    rng = random.Random(1)
+    targets = [prefix + paths(endpoint, rng) for _ in range(REQUESTS)]
+    latencies = []
+    errors = 0
+    gate = asyncio.Semaphore(CONCURRENCY)
+
+    async def one(path):
+        nonlocal errors
+        async with gate:
+            start = time.perf_counter()
+            try:
+                r = await client.get(path)
+                errors += r.status_code != 200
+            except httpx.TransportError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(p) for p in targets))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+    return REQUESTS / elapsed, p(0.5), p(0.99), errors
+
+
+async def chat_after_catalog_change(client):
+    # A restock bumps the catalog version, so every chat below starts by rebuilding
+    # the catalog / BM25 / neighbour indexes at the same time
+    db = SessionLocal()
+    names = [m.name for m in db.query(Medicine).order_by(Medicine.id).limit(CONCURRENCY)]
+    db.close()
+    await client.post("/admin/refill-stock", json={"medicine_name": names[0], "amount": 1})
+    messages = [f"order 2 packs of {name}" if i % 2 else f"I need something for {WORDS[i % len(WORDS)]}"
+                for i, name in enumerate(names)]
+    latencies = []
+    errors = 0
+
+    async def one(i, message):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            r = await client.post("/chat", json={"user_id": f"PAT{i}", "message": message}, timeout=30)
+            errors += r.status_code != 200
+        except httpx.TransportError:
+            errors += 1
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i, m) for i, m in enumerate(messages)))
+    elapsed = time.perf_counter() - start
+    print(f"/chat x{len(messages)} after a restock: {elapsed:6.2f}s | max {max(latencies):8.2f} ms | errors {errors}")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_until_up(client):
+    for _ in range(100):
+        try:
+            if (await client.get("/sync/blocker")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("benchmark server did not start")
+
+
+async def main():
+    seed()
+    print(f"{PRODUCTS} products / {ORDERS} orders, {REQUESTS} requests per run, {CONCURRENCY} in flight")
+    # DATABASE_URL is inherited, so the server opens the database seeded above
+    port = free_port()
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", str(port)])
+    try:
+        limits = httpx.Limits(max_connections=CONCURRENCY + BLOCKERS)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=120) as client:
+            await wait_until_up(client)
+            # Warm both pools and the FTS index
+            for prefix in ["/sync", ""]:
+                await run(client, prefix, "/search")
+            await chat_after_catalog_change(client)
+
+            for scenario in ["idle", f"{BLOCKERS} blocking sync requests"]:
+                print(f"--- {scenario}")
+                stop = asyncio.Event()
+                background = []
+                if scenario != "idle":
+                    async def block():
+                        while not stop.is_set():
+                            await client.get("/sync/blocker")
+                    background = [asyncio.create_task(block()) for _ in range(BLOCKERS)]
+                    await asyncio.sleep(BLOCK_SECONDS)
+
+                for endpoint in ["/products", "/search", "/user/orders/{id}"]:
+                    for label, prefix in [("sync", "/sync"), ("async", "")]:
+                        rps, p50, p99, errors = await run(client, prefix, endpoint)
+                        print(f"{endpoint:<18} {label:<6} {rps:8.0f} req/s | p50 {p50:8.2f} ms | p99 {p99:8.2f} ms | errors {errors}")
+
+                stop.set()
+                await asyncio.gather(*background)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    if "--serve" in sys.argv:
+        import uvicorn
+        uvicorn.run(app, host="127.0.0.1", port=int(sys.argv[sys.argv.index("--serve") + 1]),
+                    log_level="warning", timeout_keep_alive=120)
+    else:
+        asyncio.run(main())
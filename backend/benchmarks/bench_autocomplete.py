@@ -0,0 +1,56 @@
+import os
+import sys
+import random
+import string
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.database import Base
+from app.models import Medicine, Order
+from app.autocomplete import AutocompleteIndex
+
+PRODUCTS = 100_000
+ORDERS = 200_000
+PREFIXES = ["p", "pa", "par", "vit", "ta", "tab", "500", "kap", "ibu", "a b", "tab 500", "kapseln 25"]
+ROUNDS = 2_000
+
+
+def random_word():
+    return "".join(random.choice(string.ascii_lowercase) for _ in range(random.randint(4, 10)))
+
+
+def main():
+    random.seed(42)
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+
+    names = [
+        f"{random_word().capitalize()} {random.choice([100, 250, 500, 1000])} mg {random.choice(['Tabletten', 'Kapseln', 'Tropfen'])}"
+        for _ in range(PRODUCTS)
+    ]
+    db.bulk_insert_mappings(Medicine, [{"name": n, "stock": 50} for n in names])
+    popular = random.sample(names, 5_000)
+    db.bulk_insert_mappings(Order, [{"patient_id": "bench", "product_name": random.choice(popular), "quantity": 1} for _ in range(ORDERS)])
+    db.commit()
+
+    index = AutocompleteIndex()
+    start = time.perf_counter()
+    index.refresh(db)
+    print(f"build: {(time.perf_counter() - start) * 1000:.0f} ms for {PRODUCTS} products / {ORDERS} orders")
+
+    for prefix in PREFIXES:
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            index.complete(db, prefix, limit=8)
+        per_call = (time.perf_counter() - start) / ROUNDS
+        print(f"  {prefix!r:>7}: {per_call * 1_000_000:7.1f} us/lookup")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import random
+import tempfile
+
+import openpyxl
+import pandas as pd
+from sqlalchemy.orm import sessionmaker
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.database import Base, build_engine
+from app.models import Medicine
+from app.migrations import run_migrations
+from app.services import import_products_from_excel
+
+# Startup cost of the catalog import at 1k / 10k / 100k products, each on its
+# own temporary database: first boot (empty table), reboot with the file
+# unchanged, and reboot after 1% of prices changed. The old importer (pandas
+# iterrows + one SELECT per row) is timed alongside for comparison.
+# Usage: python benchmarks/bench_catalog_import.py [rows ...]
+SIZES = [1_000, 10_000, 100_000]
+HEADERS = ["Product ID", "Product Name", "PZN", "Price rec", "Package Size", "Descriptions"]
+
+
+def write_export(path, rows, seed=0, changed_fraction=0.0):
+    rng = random.Random(seed)
+    changed = random.Random(seed + 1)
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(HEADERS)
+    for i in range(rows):
+        price = round(rng.uniform(2, 60), 2)
+        if changed.random() < changed_fraction:
+            price += 1.0
+        ws.append([i, f"Product {i} {rng.randrange(10, 500)} mg", 1_000_000 + i, price, f"{rng.randrange(10, 100)} St",
+                   "Tabletten zur Linderung von Beschwerden."])
+    wb.save(path)
+
+
+def legacy_import(db, file_path):
+    # What services.import_products_from_excel did before (minus bump_catalog_version)
+    df = pd.read_excel(file_path)
+    df.columns = df.columns.str.strip().str.lower()
+    for _, row in df.iterrows():
+        exists = db.query(Medicine).filter(Medicine.name == row["product name"]).first()
+        if not exists:
+            db.add(Medicine(
+                name=row["product name"],
+                price=float(row.get("price rec", 0)),
+                package_size=row.get("package size", ""),
+                description=row.get("descriptions", ""),
+                stock=50,
+                prescription_required=False
+            ))
+    db.commit()
+
+
+def timed(Session, fn, path):
+    db = Session()
+    start = time.perf_counter()
+    fn(db, path)
+    elapsed = time.perf_counter() - start
+    db.close()
+    return elapsed
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    with tempfile.TemporaryDirectory() as work_dir:
+        print(f"{'rows':>7} | {'importer':<8} | {'first boot':>10} | {'unchanged':>10} | {'1% changed':>10}")
+        for rows in sizes:
+            original = os.path.join(work_dir, f"products-{rows}.xlsx")
+            write_export(original, rows)
+            # Same file name as the original, so the hash record matches it
+            changed_dir = os.path.join(work_dir, f"changed-{rows}")
+            os.makedirs(changed_dir)
+            changed = os.path.join(changed_dir, f"products-{rows}.xlsx")
+            write_export(changed, rows, changed_fraction=0.01)
+
+            for label, fn in [("old", legacy_import), ("new", import_products_from_excel)]:
+                engine = build_engine(f"sqlite:///{os.path.join(work_dir, f'{label}-{rows}.db')}")
+                Base.metadata.create_all(bind=engine)
+                run_migrations(engine)
+                Session = sessionmaker(bind=engine, autoflush=False)
+
+                first = timed(Session, fn, original)
+                unchanged = timed(Session, fn, original)
+                updated = timed(Session, fn, changed)
+                print(f"{rows:>7} | {label:<8} | {first:>9.2f}s | {unchanged:>9.2f}s | {updated:>9.2f}s")
+                engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
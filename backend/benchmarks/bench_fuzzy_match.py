@@ -0,0 +1,71 @@
+import os
+import sys
+import random
+import string
+import time
+
+from rapidfuzz import process
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.database import Base
+from app.models import Medicine
+from app.catalog_index import CatalogIndex
+
+SIZES = [1_000, 10_000, 100_000]
+LOOKUPS = 20
+
+
+def random_name():
+    word = "".join(random.choice(string.ascii_lowercase) for _ in range(random.randint(5, 10)))
+    return f"{word.capitalize()} {random.choice([100, 250, 500, 1000])} mg {random.choice(['Tabletten', 'Kapseln', 'Tropfen'])}"
+
+
+def make_session(size):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    db.bulk_insert_mappings(Medicine, [{"name": random_name(), "description": "x", "stock": 50} for _ in range(size)])
+    db.commit()
+    return db
+
+
+def legacy_match(db, input_name):
+    # What services.fuzzy_match_medicine did before the catalog index
+    names = [m.name for m in db.query(Medicine).all()]
+    match = process.extractOne(input_name, names)
+    if match and match[1] >= 65:
+        return match[0]
+    return None
+
+
+def bench(size):
+    random.seed(size)
+    db = make_session(size)
+    queries = [name.lower()[:-3] for (name,) in db.query(Medicine.name).limit(LOOKUPS).all()]
+
+    start = time.perf_counter()
+    for q in queries:
+        legacy_match(db, q)
+    legacy = (time.perf_counter() - start) / LOOKUPS
+
+    index = CatalogIndex()
+    start = time.perf_counter()
+    index.refresh(db)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for q in queries:
+        index.match(db, q)
+    indexed = (time.perf_counter() - start) / LOOKUPS
+
+    db.close()
+    print(f"{size:>8} products | legacy {legacy * 1000:9.2f} ms/lookup | "
+          f"index {indexed * 1000:8.2f} ms/lookup (build {build * 1000:.0f} ms) | {legacy / indexed:6.1f}x")
+
+
+if __name__ == "__main__":
+    for size in SIZES:
+        bench(size)
@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+import statistics
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.agents.intent_parser import parse_intent, parser_stats
+
+# One message per line; pass a path to an exported chat log to benchmark real traffic
+CORPUS = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "chat_corpus.txt")
+ROUNDS = 200
+# Typical llama-3.1-8b-instant classification round-trip, used for the blended estimate
+LLM_LATENCY_MS = float(os.getenv("INTENT_LLM_LATENCY_MS", "350"))
+
+# Messages the fast path used to misread; each must parse exactly like this (None = left to the LLM).
+# Strengths ("500 mg") belong to the product name and never become the quantity.
+EXPECTED = {
+    "order 500 mg paracetamol": {"intent": "order", "medicine": "500 mg paracetamol", "quantity": None, "language": "english"},
+    "order 1000 IU vitamin d": {"intent": "order", "medicine": "1000 iu vitamin d", "quantity": None, "language": "english"},
+    "buy 100 ml cough syrup": {"intent": "order", "medicine": "100 ml cough syrup", "quantity": None, "language": "english"},
+    "order 2 tablets of dolo": {"intent": "order", "medicine": "dolo", "quantity": 2, "language": "english"},
+    "buy 3": None,
+}
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def main():
+    with open(CORPUS, encoding="utf-8") as f:
+        messages = [line.strip() for line in f if line.strip()]
+
+    for message, expected in EXPECTED.items():
+        result = parse_intent(message)
+        assert result == expected, f"{message!r}: expected {expected}, got {result}"
+
+    for message in messages:
+        result = parse_intent(message)
+        print(f"  {'HIT ' if result else 'LLM '} {message!r:<50} -> {result}")
+
+    timings = []
+    for _ in range(ROUNDS):
+        for message in messages:
+            start = time.perf_counter()
+            parse_intent(message)
+            timings.append((time.perf_counter() - start) * 1_000_000)
+    timings.sort()
+
+    stats = parser_stats()
+    print(f"\n{len(messages)} messages, hit rate {stats['hit_rate']:.1%} {stats['by_intent']}")
+    print(f"parser latency: p50 {percentile(timings, 0.5):.1f} us | p95 {percentile(timings, 0.95):.1f} us | "
+          f"p99 {percentile(timings, 0.99):.1f} us | mean {statistics.fmean(timings):.1f} us")
+
+    # Every message used to pay an LLM round-trip; now only the misses do
+    blended = (1 - stats["hit_rate"]) * LLM_LATENCY_MS
+    print(f"expected detect_intent latency at {LLM_LATENCY_MS:.0f} ms/LLM call: {LLM_LATENCY_MS:.0f} ms -> {blended:.0f} ms mean")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import os
+import sys
+import time
+import random
+import tempfile
+
+# Throwaway database; process_users binds SessionLocal at import
+WORK_DIR = tempfile.mkdtemp(prefix="pharmacy_history_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(WORK_DIR, 'pharmacy.db')}")
+os.environ.setdefault("SNAPSHOT_DIR", WORK_DIR)
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pandas as pd
+from datetime import datetime
+from sqlalchemy import delete
+from app.database import Base, SessionLocal, engine
+from app.models import Medicine, Patient, Order
+from app.migrations import run_migrations
+from app.catalog_index import resolve_medicine_id
+from process_users import ingest_order_history, resolve_columns, generate_email, generate_password
+
+# Throughput of the order-history loader on a synthetic CSV (default 1M rows,
+# 50k patients, 500 catalog products), streamed in CHUNK_SIZE chunks. The old
+# per-row loader (one patient SELECT + one ORM insert per row) is timed on the
+# first LEGACY_ROWS rows only; at 1M rows it runs for hours. Then the re-runs:
+# incremental on the unchanged file (hash check only), and a full re-read that
+# dedupes every row against orders.source_key.
+# Usage: python benchmarks/bench_order_history_load.py [rows] [chunk_size]
+ROWS = 1_000_000
+PATIENTS = 50_000
+PRODUCTS = 500
+LEGACY_ROWS = 20_000
+CHUNK_SIZE = 50_000
+
+
+def write_history(path, rows):
+    rng = random.Random(0)
+    names = [f"Patient {i} {rng.choice(['Meyer', 'Schmidt', 'Weber', 'Fischer'])}" for i in range(PATIENTS)]
+    start = datetime(2024, 1, 1).timestamp()
+    with open(path, "w") as f:
+        f.write("Name,Age,Gender,Purchase Date,Product Purchased,Quantity,Price,Dosage Frequency\n")
+        for _ in range(rows):
+            f.write(f"{rng.choice(names)},{rng.randrange(18, 90)},{rng.choice('MF')},"
+                    f"{datetime.fromtimestamp(start + rng.randrange(365 * 86400)):%Y-%m-%d %H:%M:%S},"
+                    f"Product {rng.randrange(PRODUCTS)},{rng.randrange(1, 4)},{rng.uniform(2, 60):.2f},{rng.choice([1, 2, 3])}\n")
+
+
+def legacy_load(db, df):
+    # What process_users.process_historical_data did per chunk before (minus the file I/O)
+    cols = resolve_columns(df.columns.tolist())
+    seen_emails = set([e[0] for e in db.query(Patient.email).all()])
+    for name in df[cols["name"]].dropna().unique():
+        email = generate_email(name)
+        base_email, counter = email, 1
+        while email in seen_emails:
+            parts = base_email.split('@')
+            email = f"{parts[0]}{counter}@{parts[1]}"
+            counter += 1
+        seen_emails.add(email)
+        db.add(Patient(id=email, name=str(name), email=email, hashed_password=generate_password(), is_verified=True))
+    db.commit()
+    medicine_ids = {}
+    for index, row in df.iterrows():
+        name, product, qty = row.get(cols["name"]), row.get(cols["product"]), row.get(cols["qty"], 1)
+        patient_record = db.query(Patient).filter(Patient.name == str(name)).first()
+        if product not in medicine_ids:
+            medicine_ids[product] = resolve_medicine_id(db, str(product))
+        db.add(Order(
+            patient_id=patient_record.id,
+            medicine_id=medicine_ids[product],
+            patient_age=int(row.get(cols["age"], 30)),
+            patient_gender=str(row.get(cols["gender"], 'Unknown')),
+            purchase_date=pd.to_datetime(row.get(cols["date"])),
+            product_name=str(product),
+            quantity=int(qty),
+            total_price=float(row.get(cols["price"], 0)),
+            dosage_frequency=float(row.get(cols["dosage"], 1))
+        ))
+    db.commit()
+
+
+def reset(db):
+    db.execute(delete(Order))
+    db.execute(delete(Patient))
+    db.commit()
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else CHUNK_SIZE
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    db = SessionLocal()
+    db.bulk_insert_mappings(Medicine, [{"name": f"Product {i}", "price": 5.0, "stock": 100} for i in range(PRODUCTS)])
+    db.commit()
+
+    path = os.path.join(WORK_DIR, "history.csv")
+    write_history(path, rows)
+    print(f"{rows} rows ({os.path.getsize(path) / 2**20:.0f} MiB CSV), {PATIENTS} patients, {PRODUCTS} products")
+
+    legacy_rows = min(rows, LEGACY_ROWS)
+    start = time.perf_counter()
+    legacy_load(db, pd.read_csv(path, nrows=legacy_rows))
+    elapsed = time.perf_counter() - start
+    print(f"old (first {legacy_rows} rows): {elapsed:7.1f}s  {legacy_rows / elapsed:9.0f} rows/s")
+    reset(db)
+
+    start = time.perf_counter()
+    ingest_order_history(db, path, chunk_size)
+    elapsed = time.perf_counter() - start
+    loaded = db.query(Order).count()
+    print(f"new (chunks of {chunk_size}): {elapsed:7.1f}s  {rows / elapsed:9.0f} rows/s  ({loaded} orders)")
+
+    for label, incremental in [("re-run, incremental", True), ("re-run, full re-read", False)]:
+        start = time.perf_counter()
+        _, inserted = ingest_order_history(db, path, chunk_size, incremental=incremental)
+        elapsed = time.perf_counter() - start
+        print(f"{label}: {elapsed:7.1f}s  {rows / elapsed:9.0f} rows/s  ({inserted} new orders)")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
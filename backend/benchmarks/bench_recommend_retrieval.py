@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+import random
+import string
+import tempfile
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.database import Base
+from app.models import Medicine
+from app.retrieval import SymptomRetriever
+from app import services
+
+SIZES = [1_000, 10_000, 50_000]
+SYMPTOMS = ["dry skin", "allergy itchy eyes", "tired, need vitamin energy", "bladder problems", "omega 3 for heart"]
+TOP_K = services.RECOMMEND_TOP_K
+
+# Set to actually call Groq for both prompt variants (costs quota, needs network)
+LIVE = bool(os.getenv("GROQ_API_KEY")) and "--live" in sys.argv
+
+TERMS = ["Haut", "Allergie", "Augentropfen", "Vitamin", "Omega-3", "Blase", "Energie", "Schmerz", "Kapseln", "Creme"]
+
+
+def approx_tokens(text):
+    # ~4 characters per token is close enough for Llama tokenizers on this mix of text
+    return len(text) // 4
+
+
+def random_medicine():
+    word = "".join(random.choice(string.ascii_lowercase) for _ in range(random.randint(5, 10))).capitalize()
+    terms = random.sample(TERMS, 3)
+    return {
+        "name": f"{word} {terms[0]} {random.choice([100, 250, 500])} mg",
+        "description": f"Zur Unterstützung bei {terms[1]} und {terms[2]}. " + " ".join(random.sample(TERMS, 6)),
+        "price": round(random.uniform(3, 40), 2),
+        "stock": random.randint(0, 100),
+    }
+
+
+def call_llm(prompt):
+    from groq import Groq
+    client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+    client.chat.completions.create(
+        model="llama-3.3-70b-versatile",
+        messages=[
+            {"role": "system", "content": "You are a helpful JSON-only API."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0,
+        response_format={"type": "json_object"}
+    )
+
+
+def bench(size):
+    random.seed(size)
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.bulk_insert_mappings(Medicine, [random_medicine() for _ in range(size)])
+    db.commit()
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        services.symptom_retriever = SymptomRetriever(index_dir)
+        start = time.perf_counter()
+        services.symptom_retriever.refresh(db)
+        build = time.perf_counter() - start
+
+        before_tokens, after_tokens, before_time, after_time = [], [], [], []
+        for symptom in SYMPTOMS:
+            start = time.perf_counter()
+            prompt = services.build_recommend_prompt(symptom, db.query(Medicine).all())
+            if LIVE:
+                call_llm(prompt)
+            before_time.append(time.perf_counter() - start)
+            before_tokens.append(approx_tokens(prompt))
+
+            start = time.perf_counter()
+            prompt = services.build_recommend_prompt(symptom, services.select_recommend_candidates(db, symptom, top_k=TOP_K))
+            if LIVE:
+                call_llm(prompt)
+            after_time.append(time.perf_counter() - start)
+            after_tokens.append(approx_tokens(prompt))
+
+    db.close()
+    mean = lambda xs: sum(xs) / len(xs)
+    label = "end-to-end" if LIVE else "local (no LLM)"
+    print(f"{size:>7} products | index build {build * 1000:6.0f} ms | "
+          f"prompt tokens {mean(before_tokens):>9.0f} -> {mean(after_tokens):>5.0f} | "
+          f"{label} {mean(before_time) * 1000:8.1f} ms -> {mean(after_time) * 1000:6.1f} ms")
+
+
+if __name__ == "__main__":
+    print(f"top-K = {TOP_K}{' (live Groq calls)' if LIVE else ''}")
+    for size in SIZES:
+        bench(size)
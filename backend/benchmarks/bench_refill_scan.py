@@ -0,0 +1,127 @@
+import io
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+import contextlib
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+from app.database import Base, build_engine
+from app.models import Medicine, Order, RefillAlert, Patient
+from app.migrations import run_migrations
+from app.services import scan_and_generate_refill_alerts
+
+# scan_and_generate_refill_alerts on synthetic order history: 10k patients /
+# 100k orders and 100k patients / 1M orders, 500 products (5% low on stock),
+# 2% of patients already alerted for one product. The old per-patient /
+# per-order loop is timed up to LEGACY_MAX_ORDERS (it takes tens of minutes at
+# 1M orders; pass --legacy-all to run it anyway). Each run starts from a copy
+# of the same database; the mock email prints go to a buffer.
+# Usage: python benchmarks/bench_refill_scan.py [--legacy-all]
+SIZES = [(10_000, 100_000), (100_000, 1_000_000)]
+PRODUCTS = 500
+LEGACY_MAX_ORDERS = 100_000
+
+
+def legacy_scan(db):
+    # What services.scan_and_generate_refill_alerts did before
+    users = [u[0] for u in db.query(Order.patient_id).distinct().all()]
+    generated = []
+    for user in users:
+        for order in db.query(Order).filter(Order.patient_id == user).all():
+            if order.dosage_frequency <= 0:
+                continue
+            run_out = order.purchase_date + timedelta(days=order.quantity / order.dosage_frequency)
+            if datetime.utcnow() >= run_out - timedelta(days=2):
+                existing = db.query(RefillAlert).filter(
+                    RefillAlert.patient_id == user, RefillAlert.medicine_id == order.medicine_id
+                ).first()
+                if not existing:
+                    db.add(RefillAlert(patient_id=user, medicine_id=order.medicine_id,
+                                       medicine_name=order.product_name, expected_run_out=run_out))
+                    db.commit()
+                    patient = db.query(Patient).filter(Patient.id == user).first()
+                    print(f"MOCK EMAIL to {patient.email if patient else user}: {order.product_name}")
+                    generated.append({"patient_id": user, "medicine": order.product_name, "type": "dosage_refill"})
+    for med in db.query(Medicine).filter(Medicine.stock <= 10).all():
+        for (buyer_id,) in db.query(Order.patient_id).filter(Order.medicine_id == med.id).distinct().all():
+            patient = db.query(Patient).filter(Patient.id == buyer_id).first()
+            print(f"MOCK EMAIL to {patient.email if patient else buyer_id}: {med.name} low in store")
+            generated.append({"patient_id": buyer_id, "medicine": med.name, "type": "store_low_stock"})
+    return generated
+
+
+def seed(path, patients, orders):
+    engine = build_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    rng = random.Random(0)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(Medicine), [
+            {"name": f"Product {i}", "price": 5.0, "stock": 5 if i % 20 == 0 else 100} for i in range(PRODUCTS)
+        ])
+        conn.execute(insert(Patient), [
+            {"id": f"PAT{i}", "name": f"Patient {i}", "email": f"patient{i}@example.com", "hashed_password": "x"}
+            for i in range(patients)
+        ])
+        for start in range(0, orders, 100_000):
+            batch = []
+            for _ in range(min(100_000, orders - start)):
+                product = rng.randrange(PRODUCTS)
+                batch.append({
+                    "patient_id": f"PAT{rng.randrange(patients)}", "medicine_id": product + 1,
+                    "product_name": f"Product {product}", "purchase_date": now - timedelta(days=rng.uniform(0, 365)),
+                    "quantity": rng.randrange(1, 4) * 10, "dosage_frequency": rng.choice([1.0, 2.0, 3.0]),
+                })
+            conn.execute(insert(Order), batch)
+        conn.execute(insert(RefillAlert), [
+            {"patient_id": f"PAT{i}", "medicine_id": 1, "medicine_name": "Product 0", "expected_run_out": now}
+            for i in range(0, patients, 50)
+        ])
+    engine.dispose()
+
+
+def timed(path, scan):
+    engine = build_engine(f"sqlite:///{path}")
+    db = sessionmaker(bind=engine, autoflush=False)()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        generated = scan(db)
+    elapsed = time.perf_counter() - start
+    db.close()
+    engine.dispose()
+    return elapsed, sum(g["type"] == "dosage_refill" for g in generated)
+
+
+def main():
+    legacy_all = "--legacy-all" in sys.argv
+    work_dir = tempfile.mkdtemp(prefix="pharmacy_refill_")
+    try:
+        print(f"{'patients':>8} | {'orders':>9} | {'scan':<11} | {'time':>9} | {'new alerts':>10}")
+        for patients, orders in SIZES:
+            base = os.path.join(work_dir, f"base-{orders}.db")
+            seed(base, patients, orders)
+            scans = [("new", scan_and_generate_refill_alerts)]
+            if legacy_all or orders <= LEGACY_MAX_ORDERS:
+                scans.insert(0, ("old", legacy_scan))
+            for label, scan in scans:
+                path = os.path.join(work_dir, f"{label}-{orders}.db")
+                shutil.copy(base, path)
+                elapsed, alerts = timed(path, scan)
+                print(f"{patients:>8} | {orders:>9} | {label:<11} | {elapsed:8.2f}s | {alerts:>10}")
+                if label == "new":
+                    # Second scan: everything due is already alerted
+                    elapsed, alerts = timed(path, scan)
+                    print(f"{patients:>8} | {orders:>9} | {'new, repeat':<11} | {elapsed:8.2f}s | {alerts:>10}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
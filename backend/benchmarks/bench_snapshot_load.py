@@ -0,0 +1,82 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+
+# Throwaway exports and snapshots; subprocesses inherit SNAPSHOT_DIR
+WORK_DIR = tempfile.mkdtemp(prefix="pharmacy_snapshot_")
+os.environ.setdefault("SNAPSHOT_DIR", WORK_DIR)
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Load time and peak RSS of a product export at 1k / 10k / 100k rows, read with
+# pandas.read_excel vs from its Arrow snapshot (app.snapshots). Each load runs
+# in a fresh interpreter; "peak RSS" is the process high-water mark reset right
+# after pandas + pyarrow are imported (Linux /proc), so it is the load's own peak.
+# Usage: python benchmarks/bench_snapshot_load.py [rows ...]
+SIZES = [1_000, 10_000, 100_000]
+METHODS = ["excel", "convert", "snapshot", "snapshot+pandas"]
+
+
+def vm_hwm_kib():
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("VmHWM"))
+
+
+def measure(method, path):
+    import pandas as pd
+    from app.snapshots import convert, load_table
+    # "5" resets VmHWM to the current RSS
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+    start = time.perf_counter()
+    if method == "excel":
+        pd.read_excel(path)
+    elif method == "convert":
+        convert(path)
+    elif method == "snapshot":
+        # Zero-copy table; sum a column so its pages are actually read
+        table = load_table(path)
+        table.column("Price rec").to_numpy().sum()
+    elif method == "snapshot+pandas":
+        load_table(path).to_pandas()
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"seconds": elapsed, "peak_mib": vm_hwm_kib() / 1024}))
+
+
+def run(method, path):
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--measure", method, path],
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    from bench_catalog_import import write_export
+    from app.snapshots import snapshot_path
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    try:
+        print(f"{'rows':>7} | {'method':<16} | {'load':>9} | {'peak RSS':>9} | {'file':>9}")
+        for rows in sizes:
+            path = os.path.join(WORK_DIR, f"products-{rows}.xlsx")
+            write_export(path, rows)
+            sizes_on_disk = {"excel": os.path.getsize(path)}
+            for method in METHODS:
+                result = run(method, path)
+                if method == "convert":
+                    sizes_on_disk["snapshot"] = os.path.getsize(snapshot_path(path, {}))
+                on_disk = sizes_on_disk.get(method.split("+")[0])
+                size = f"{on_disk / 1024:7.0f}KiB" if on_disk else ""
+                print(f"{rows:>7} | {method:<16} | {result['seconds'] * 1000:7.0f}ms | {result['peak_mib']:6.0f} MiB | {size:>9}")
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    if "--measure" in sys.argv:
+        i = sys.argv.index("--measure")
+        measure(sys.argv[i + 1], sys.argv[i + 2])
+    else:
+        main()
@@ -0,0 +1,103 @@
+import os
+import sys
+import time
+import random
+import tempfile
+import threading
+from collections import Counter
+
+from sqlalchemy import create_engine, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.database import Base, build_engine
+from app.models import Medicine, Order
+
+PRODUCTS = 2_000
+ORDERS = 20_000
+THREADS = 16
+OPS_PER_THREAD = 400
+WRITE_RATIO = 0.2
+
+
+def seed(engine):
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    rng = random.Random(0)
+    db.bulk_insert_mappings(Medicine, [{"name": f"Medicine {i}", "stock": 10_000, "price": 5.0} for i in range(PRODUCTS)])
+    db.bulk_insert_mappings(Order, [
+        {"patient_id": f"PAT{rng.randrange(500)}", "product_name": f"Medicine {rng.randrange(PRODUCTS)}", "quantity": 1}
+        for _ in range(ORDERS)
+    ])
+    db.commit()
+    db.close()
+
+
+def worker(Session, seed_value, latencies, outcomes):
+    rng = random.Random(seed_value)
+    for _ in range(OPS_PER_THREAD):
+        db = Session()
+        start = time.perf_counter()
+        try:
+            if rng.random() < WRITE_RATIO:
+                # Checkout-shaped write: decrement stock and record the order
+                med_id = rng.randrange(1, PRODUCTS + 1)
+                db.execute(update(Medicine).where(Medicine.id == med_id).values(stock=Medicine.stock - 1))
+                db.add(Order(patient_id=f"PAT{rng.randrange(500)}", product_name=f"Medicine {med_id - 1}", quantity=1))
+                db.commit()
+                kind = "write"
+            else:
+                # Product page + order history
+                db.get(Medicine, rng.randrange(1, PRODUCTS + 1))
+                db.query(Order).filter(Order.patient_id == f"PAT{rng.randrange(500)}").limit(20).all()
+                db.commit()
+                kind = "read"
+            latencies.append((time.perf_counter() - start) * 1000)
+            outcomes[kind] += 1
+        except OperationalError as e:
+            db.rollback()
+            outcomes["locked" if "locked" in str(e) else "error"] += 1
+        finally:
+            db.close()
+
+
+def run(label, engine):
+    Session = sessionmaker(bind=engine, autoflush=False)
+    latencies = []
+    outcomes = Counter()
+    threads = [threading.Thread(target=worker, args=(Session, i, latencies, outcomes)) for i in range(THREADS)]
+
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    done = outcomes["read"] + outcomes["write"]
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else float("nan")
+    print(f"{label:<11} {done / elapsed:8.0f} ops/s | p50 {p(0.5):6.2f} ms | p99 {p(0.99):7.2f} ms | "
+          f"reads {outcomes['read']} writes {outcomes['write']} locked {outcomes['locked']} errors {outcomes['error']}")
+    engine.dispose()
+
+
+def main():
+    print(f"{THREADS} threads x {OPS_PER_THREAD} ops, {int(WRITE_RATIO * 100)}% writes, {PRODUCTS} products / {ORDERS} orders")
+    with tempfile.TemporaryDirectory() as work_dir:
+        legacy_url = f"sqlite:///{os.path.join(work_dir, 'legacy.db')}"
+        tuned_url = f"sqlite:///{os.path.join(work_dir, 'tuned.db')}"
+
+        # What database.py used to build: rollback journal, default pool (5 + 10)
+        legacy = create_engine(legacy_url, connect_args={"check_same_thread": False})
+        seed(legacy)
+        run("legacy", legacy)
+
+        tuned = build_engine(tuned_url)
+        seed(tuned)
+        run("production", tuned)
+
+
+if __name__ == "__main__":
+    main()
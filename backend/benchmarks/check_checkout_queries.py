@@ -0,0 +1,100 @@
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# Throwaway database, and no real LLM client is ever built
+WORK_DIR = tempfile.mkdtemp(prefix="pharmacy_checkout_queries_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(WORK_DIR, 'pharmacy.db')}")
+os.environ.setdefault("LLM_PROVIDER", "stub")
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fastapi import HTTPException
+from sqlalchemy import event
+from app.database import Base, SessionLocal, engine
+from app.models import Medicine, Order, Prescription
+from app.migrations import run_migrations
+from app.routes import finalize_checkout, CheckoutRequest
+
+# Counts the SQL statements finalize_checkout sends for carts of different sizes.
+# Exits non-zero unless every size costs the same number of statements, for
+# accepted carts (some products need a prescription, some get auto-restocked)
+# and for a cart rejected by the 3-day repeat-purchase rule.
+# Usage: python benchmarks/check_checkout_queries.py
+CART_SIZES = [1, 5, 20]
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def seed():
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    db = SessionLocal()
+    meds = [
+        Medicine(name=f"Query Check {i}", stock=2 if i % 4 == 0 else 1_000, price=1.0,
+                 prescription_required=i % 3 == 0, max_safe_dosage=10)
+        for i in range(max(CART_SIZES))
+    ]
+    db.add_all(meds)
+    db.commit()
+    names = [m.name for m in meds]
+    rx_ids = [m.id for m in meds if m.prescription_required]
+    db.close()
+    return names, rx_ids
+
+
+def checkout(patient_id, names, quantity=3):
+    counter = StatementCounter()
+    event.listen(engine, "before_cursor_execute", counter)
+    db = SessionLocal()
+    try:
+        items = [{"name": name, "quantity": quantity} for name in names]
+        finalize_checkout(CheckoutRequest(patient_id=patient_id, items=items), db)
+        outcome = "accepted"
+    except HTTPException as e:
+        outcome = f"rejected {e.status_code}"
+    finally:
+        db.close()
+        event.remove(engine, "before_cursor_execute", counter)
+    return outcome, counter.count
+
+
+def main():
+    names, rx_ids = seed()
+    failures = 0
+
+    results = {}
+    for size in CART_SIZES:
+        patient = f"QCHECK{size}"
+        db = SessionLocal()
+        db.add_all([Prescription(patient_id=patient, medicine_id=i, medicine_name="", approved=True) for i in rx_ids])
+        # An old order outside the repeat-purchase window must not block anything
+        db.add(Order(patient_id=patient, medicine_id=1, product_name=names[0], quantity=1,
+                     purchase_date=datetime.utcnow() - timedelta(days=30)))
+        db.commit()
+        db.close()
+
+        accepted = checkout(patient, names[:size])
+        # Same cart again straight away: blocked by the repeat-purchase rule
+        repeated = checkout(patient, names[:size])
+        results[size] = (accepted, repeated)
+        print(f"cart of {size:>2} items: {accepted[0]} in {accepted[1]} statements | repeat {repeated[0]} in {repeated[1]} statements")
+
+    for position in range(2):
+        outcomes = {results[size][position] for size in CART_SIZES}
+        expected = "accepted" if position == 0 else "rejected 403"
+        ok = len(outcomes) == 1 and next(iter(outcomes))[0] == expected
+        failures += not ok
+
+    print("query count independent of cart size" if failures == 0 else f"{failures} check(s) failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.agents.decision_cache import DecisionCache, decision_key, SAFE_MAX_QUANTITY
+
+# A verdict cached for one stock level must never be served for another stock
+# level that changes the approved quantity (a capped order approves
+# min(SAFE_MAX_QUANTITY, stock) units). Exits non-zero on the first stale hit.
+# Usage: python benchmarks/check_decision_cache.py
+
+
+def key(stock, quantity):
+    med = SimpleNamespace(name="Dolo 650", stock=stock, prescription_required=False)
+    return decision_key(med, quantity, [], [], "None Provided", "english")
+
+
+def main():
+    failures = 0
+
+    # Every stock level up to the safe max gets its own entry
+    for quantity in range(1, SAFE_MAX_QUANTITY + 3):
+        for stock in range(0, SAFE_MAX_QUANTITY + 1):
+            for other in range(stock + 1, SAFE_MAX_QUANTITY + 2):
+                if key(stock, quantity) == key(other, quantity):
+                    print(f"FAIL quantity {quantity}: stock {stock} and {other} share a key")
+                    failures += 1
+
+    # The reported case: "partial, 4 approved" cached at stock 4, requested again at stock 2
+    cache = DecisionCache()
+    cache.put(key(4, 5), 5, "PAT1", {"status": "partial", "approved_quantity": 4})
+    hit = cache.get(key(2, 5), 5, "PAT1")
+    if hit is not None:
+        print(f"FAIL stock 4 verdict served at stock 2: {hit}")
+        failures += 1
+
+    # Above the safe max the exact stock no longer matters; those still share an entry
+    if key(60, 5) != key(120, 5):
+        print("FAIL stock 60 and 120 (same band, above the safe max) no longer share a key")
+        failures += 1
+
+    print("decision keys separate every stock level that changes the verdict" if failures == 0 else f"{failures} check(s) failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.database import Base
+from app.models import Medicine, Order, Prescription, RefillAlert
+from app.migrations import run_migrations, MIGRATIONS
+
+# EXPLAIN QUERY PLAN for each hot query, on (a) a fresh database and (b) a
+# pre-migration database upgraded in place. Exits non-zero if any query scans its
+# table or misses the index it is meant to use, or if the medicine_id backfill
+# resolves the wrong product.
+# Usage: python benchmarks/check_query_plans.py
+LINKED_TABLES = ["orders", "prescriptions", "refill_alerts"]
+
+
+def hot_queries(db):
+    since = datetime.utcnow() - timedelta(days=3)
+    return [
+        ("order history", "ix_orders_patient_purchase",
+         db.query(Order).filter(Order.patient_id == "PAT1").order_by(Order.purchase_date.desc())),
+        ("recent purchase check", "ix_orders_patient_medicine_purchase",
+         db.query(Order.id).filter(Order.patient_id == "PAT1", Order.medicine_id == 1, Order.purchase_date >= since)),
+        ("low-stock buyers", "ix_orders_medicine_id",
+         db.query(Order.patient_id).filter(Order.medicine_id == 1).distinct()),
+        ("medicine by name", "ux_medicines_name",
+         db.query(Medicine).filter(Medicine.name == "Paracetamol")),
+        ("prescription lookup (agent)", "ix_prescriptions_patient_medicine_id",
+         db.query(Prescription).filter(Prescription.patient_id == "PAT1", Prescription.medicine_id == 1).order_by(Prescription.id)),
+        ("prescription check (checkout)", "ix_prescriptions_patient_medicine_id",
+         db.query(Prescription).filter(Prescription.patient_id == "PAT1", Prescription.medicine_id == 1, Prescription.approved == True)),
+        ("refill alert exists", "ix_refill_alerts_patient_medicine_id",
+         db.query(RefillAlert).filter(RefillAlert.patient_id == "PAT1", RefillAlert.medicine_id == 1)),
+    ]
+
+
+def explain(conn, query):
+    compiled = query.statement.compile(dialect=conn.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), params).all()
+    return [row[-1] for row in rows]
+
+
+def check(label, engine):
+    failures = 0
+    print(f"--- {label}")
+    with engine.connect() as conn, Session(bind=conn) as db:
+        for name, index, query in hot_queries(db):
+            plan = explain(conn, query)
+            scans = [step for step in plan if step.startswith("SCAN") and "INDEX" not in step]
+            ok = not scans and any(index in step for step in plan)
+            failures += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {name:<30} {' | '.join(plan)}")
+    return failures
+
+
+def legacy_schema(engine):
+    # Tables as main.py's create_all built them before migrations existed:
+    # no medicine_id, no max_safe_dosage, none of the migrated indexes
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for table in LINKED_TABLES:
+            ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :t"), {"t": table}).scalar()
+            ddl = re.sub(r"\s*medicine_id INTEGER,", "", ddl)
+            ddl = re.sub(r",\s*FOREIGN KEY\(medicine_id\) REFERENCES medicines \(id\)", "", ddl)
+            conn.execute(text(f"DROP TABLE {table}"))
+            conn.execute(text(ddl))
+        conn.execute(text("DROP INDEX ux_medicines_name"))
+        conn.execute(text("ALTER TABLE medicines DROP COLUMN max_safe_dosage"))
+
+        conn.execute(text("""
+            INSERT INTO medicines (id, name, stock) VALUES
+            (1, 'Paracetamol apodiscounter 500 mg Tabletten', 50),
+            (2, 'Mucosolvan 1 mal täglich Retardkapseln', 50),
+            (3, 'NORSAN Omega-3 Total', 50),
+            (4, 'NORSAN Omega-3 Total', 50)
+        """))
+        # Exact, differently spelled, and unknown product names
+        conn.execute(text("""
+            INSERT INTO orders (patient_id, product_name, quantity) VALUES
+            ('PAT1', 'Paracetamol apodiscounter 500 mg Tabletten', 1),
+            ('PAT2', 'Mucosolvan 1 mal taglich Retardkapseln', 1),
+            ('PAT3', 'Norsan Omega 3 Total', 1),
+            ('PAT4', 'Completely Unknown Product', 1)
+        """))
+        conn.execute(text("INSERT INTO prescriptions (patient_id, medicine_name, approved) VALUES ('PAT1', 'Paracetamol apodiscounter 500mg', 1)"))
+        # Duplicates the unique indexes have to clean up (medicine 4 is a double import of 3)
+        conn.execute(text("INSERT INTO refill_alerts (patient_id, medicine_name) VALUES ('PAT1', 'Paracetamol apodiscounter 500 mg Tabletten'), ('PAT1', 'Paracetamol apodiscounter 500 mg Tabletten')"))
+
+
+def check_backfill(engine):
+    expected = {
+        ("orders", "Paracetamol apodiscounter 500 mg Tabletten"): 1,
+        ("orders", "Mucosolvan 1 mal taglich Retardkapseln"): 2,
+        ("orders", "Norsan Omega 3 Total"): 3,
+        ("orders", "Completely Unknown Product"): None,
+        ("prescriptions", "Paracetamol apodiscounter 500mg"): 1,
+        ("refill_alerts", "Paracetamol apodiscounter 500 mg Tabletten"): 1,
+    }
+    failures = 0
+    print("--- medicine_id backfill")
+    with engine.connect() as conn:
+        for (table, name), medicine_id in expected.items():
+            column = "product_name" if table == "orders" else "medicine_name"
+            got = [row[0] for row in conn.execute(text(f"SELECT medicine_id FROM {table} WHERE {column} = :n"), {"n": name})]
+            ok = got == [medicine_id]
+            failures += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {table:<14} {name!r:<48} -> {got}")
+        copies = conn.execute(text("SELECT id FROM medicines WHERE name = 'NORSAN Omega-3 Total'")).all()
+        ok = [row[0] for row in copies] == [3]
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} duplicate medicine rows merged -> {[row[0] for row in copies]}")
+    return failures
+
+
+def main():
+    failures = 0
+    with tempfile.TemporaryDirectory() as work_dir:
+        fresh = create_engine(f"sqlite:///{os.path.join(work_dir, 'fresh.db')}")
+        Base.metadata.create_all(bind=fresh)
+        run_migrations(fresh)
+        failures += check("fresh database", fresh)
+
+        legacy = create_engine(f"sqlite:///{os.path.join(work_dir, 'legacy.db')}")
+        legacy_schema(legacy)
+        applied = run_migrations(legacy)
+        print(f"applied {applied} of {len(MIGRATIONS)} migrations")
+        failures += check("legacy database, after migrations", legacy)
+        failures += check_backfill(legacy)
+        failures += run_migrations(legacy) != []
+
+        fresh.dispose()
+        legacy.dispose()
+
+    print("all checks passed" if failures == 0 else f"{failures} check(s) failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+from collections import Counter
+
+# Offline: every LLM call goes to the in-process stub (see app/llm_stub.py for the knobs)
+os.environ.setdefault("LLM_PROVIDER", "stub")
+os.environ.setdefault("LLM_STUB_LATENCY", "lognormal:400,0.5")
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS = os.path.join(BACKEND_DIR, "benchmarks", "chat_corpus.txt")
+sys.path.append(BACKEND_DIR)
+
+# Fresh database and index cache, so the run never touches the real pharmacy.db
+WORK_DIR = tempfile.mkdtemp(prefix="pharmacy_load_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(WORK_DIR, 'pharmacy.db')}")
+os.environ.setdefault("RETRIEVAL_INDEX_DIR", os.path.join(WORK_DIR, "index_cache"))
+os.chdir(WORK_DIR)
+
+import httpx
+from app.main import app
+from app.database import SessionLocal
+from app.models import Medicine
+from app.services import import_products_from_excel
+from app.llm_gateway import llm_gateway
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def chat_requests(n):
+    with open(CORPUS, encoding="utf-8") as f:
+        messages = [line.strip() for line in f if line.strip()]
+    rng = random.Random(1)
+    return [("POST", "/chat", {"user_id": f"LOAD{i % 200}", "message": rng.choice(messages)}) for i in range(n)]
+
+
+def checkout_requests(n):
+    db = SessionLocal()
+    names = [m.name for m in db.query(Medicine).filter(Medicine.prescription_required == False).all()]
+    db.close()
+    rng = random.Random(2)
+    # Unique patients: the safety agent blocks repeat purchases of the same product
+    return [("POST", "/finalize-checkout", {"patient_id": f"LOADPAT{i}", "items": [{"name": rng.choice(names), "quantity": 1}]}) for i in range(n)]
+
+
+def db_requests(n):
+    rng = random.Random(3)
+    queries = ["para", "vitamin", "spray", "omega", "tablet", "creme", "magnesium"]
+    pool = [
+        lambda: ("GET", f"/search?query={rng.choice(queries)}&limit=10", None),
+        lambda: ("GET", f"/autocomplete?query={rng.choice(queries)[:3]}", None),
+        lambda: ("GET", "/products", None),
+        lambda: ("GET", f"/user/orders/LOADPAT{rng.randrange(n)}", None),
+    ]
+    return [rng.choice(pool)() for _ in range(n)]
+
+
+async def run_scenario(client, name, requests, concurrency):
+    queue = list(reversed(requests))
+    latencies = []
+    statuses = Counter()
+
+    async def worker():
+        while queue:
+            method, url, body = queue.pop()
+            start = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[response.status_code] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{name:<9} {len(requests):>6} req | {len(requests) / elapsed:8.1f} req/s | "
+          f"p50 {percentile(latencies, 0.5):7.1f} ms | p95 {percentile(latencies, 0.95):7.1f} ms | "
+          f"p99 {percentile(latencies, 0.99):7.1f} ms | mean {statistics.fmean(latencies):7.1f} ms | status {dict(statuses)}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Offline load test against the stub LLM provider")
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--scenario", choices=["all", "chat", "checkout", "db"], default="all")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    import_products_from_excel(db)
+    db.close()
+
+    print(f"provider={llm_gateway.stats()['provider']} latency={os.environ['LLM_STUB_LATENCY']} "
+          f"error_rate={os.getenv('LLM_STUB_ERROR_RATE', '0')} llm_cap={llm_gateway.max_concurrency} "
+          f"concurrency={args.concurrency} db={WORK_DIR}")
+
+    scenarios = {"chat": chat_requests, "checkout": checkout_requests, "db": db_requests}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=120) as client:
+        for name, build in scenarios.items():
+            if args.scenario in ("all", name):
+                await run_scenario(client, name, build(args.requests), args.concurrency)
+
+    print(f"llm gateway: {llm_gateway.stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,173 @@
+import os
+import sys
+import random
+import tempfile
+import threading
+from collections import Counter
+
+# Throwaway database, and no real LLM client is ever built
+WORK_DIR = tempfile.mkdtemp(prefix="pharmacy_oversell_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(WORK_DIR, 'pharmacy.db')}")
+os.environ.setdefault("LLM_PROVIDER", "stub")
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+from app.database import Base, SessionLocal, engine
+from app.models import Medicine, Order
+from app.migrations import run_migrations
+from app.services import reserve_stock
+from app import routes
+from app.routes import finalize_checkout, CheckoutRequest
+
+# Multi-threaded checkout stress: many carts race for little stock. Passes only if
+# nothing is oversold, stock never goes negative, every successful cart's order
+# rows exist and every failed cart left no trace.
+# Usage: python benchmarks/stress_checkout_oversell.py
+THREADS = 32
+CARTS = 600
+STOCK = 150
+
+
+def run_threads(target, jobs):
+    outcomes = Counter()
+    lock = threading.Lock()
+    queue = list(jobs)
+
+    def worker():
+        while True:
+            with lock:
+                if not queue:
+                    return
+                job = queue.pop()
+            outcome = target(job)
+            with lock:
+                outcomes[outcome] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return outcomes
+
+
+def set_stock(ids, stock):
+    db = SessionLocal()
+    db.query(Medicine).filter(Medicine.id.in_(ids)).update({Medicine.stock: stock}, synchronize_session=False)
+    db.query(Order).delete()
+    db.commit()
+    db.close()
+
+
+def read_then_write(medicine_id):
+    # The old pattern, for contrast: check in Python, write back the computed value
+    db = SessionLocal()
+    try:
+        med = db.get(Medicine, medicine_id)
+        if med.stock < 1:
+            return "sold_out"
+        med.stock -= 1
+        db.commit()
+        return "sold"
+    finally:
+        db.close()
+
+
+def conditional_update(medicine_id):
+    db = SessionLocal()
+    try:
+        ok = reserve_stock(db, medicine_id, 1)
+        db.commit()
+        return "sold" if ok else "sold_out"
+    finally:
+        db.close()
+
+
+def primitive_check(medicine_id):
+    failures = 0
+    for label, fn in [("read-modify-write", read_then_write), ("conditional UPDATE", conditional_update)]:
+        set_stock([medicine_id], STOCK)
+        outcomes = run_threads(fn, [medicine_id] * (STOCK * 3))
+        db = SessionLocal()
+        final = db.get(Medicine, medicine_id).stock
+        db.close()
+        oversold = outcomes["sold"] - STOCK
+        print(f"{label:<20} sold {outcomes['sold']:>4} of {STOCK} | final stock {final:>4} | oversold {max(oversold, 0)}")
+        if fn is conditional_update:
+            failures += outcomes["sold"] != STOCK or final != 0
+    return failures
+
+
+def checkout_check(ids):
+    # No auto-restock here: a short product must fail the cart
+    routes.AUTO_RESTOCK_UNITS = 0
+    set_stock(ids, STOCK)
+    rng = random.Random(7)
+    carts = []
+    for i in range(CARTS):
+        # Unique patient per cart, so the 3-day repeat-purchase rule doesn't interfere
+        items = [{"name": name, "quantity": rng.randint(1, 3)} for name in rng.sample(NAMES, rng.randint(1, 3))]
+        carts.append(CheckoutRequest(patient_id=f"STRESS{i}", items=items))
+
+    accepted = {}
+    lock = threading.Lock()
+
+    def checkout(cart):
+        db = SessionLocal()
+        try:
+            finalize_checkout(cart, db)
+            with lock:
+                accepted[cart.patient_id] = cart
+            return "accepted"
+        except HTTPException as e:
+            return f"rejected {e.status_code}"
+        except OperationalError:
+            return "db error"
+        finally:
+            db.close()
+
+    outcomes = run_threads(checkout, carts)
+
+    db = SessionLocal()
+    failures = 0
+    for medicine_id, name in zip(ids, NAMES):
+        final = db.get(Medicine, medicine_id).stock
+        ordered = db.query(func.coalesce(func.sum(Order.quantity), 0)).filter(Order.medicine_id == medicine_id).scalar()
+        expected = sum(i.quantity for cart in accepted.values() for i in cart.items if i.name == name)
+        ok = final >= 0 and ordered == expected and final == STOCK - ordered
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name:<12} stock {STOCK} -> {final:>3} | ordered {ordered:>3} | accepted carts want {expected:>3}")
+
+    patients_with_orders = {row[0] for row in db.query(Order.patient_id).distinct()}
+    partial = patients_with_orders - set(accepted)
+    failures += bool(partial)
+    db.close()
+    print(f"carts: {dict(outcomes)} | failed carts with leftover orders: {len(partial)}")
+    return failures
+
+
+NAMES = ["Stress A", "Stress B", "Stress C"]
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    db = SessionLocal()
+    meds = [Medicine(name=name, stock=STOCK, price=1.0, prescription_required=False, max_safe_dosage=10) for name in NAMES]
+    db.add_all(meds)
+    db.commit()
+    ids = [m.id for m in meds]
+    db.close()
+
+    print(f"{THREADS} threads, db={WORK_DIR}")
+    failures = primitive_check(ids[0])
+    failures += checkout_check(ids)
+
+    print("no overselling" if failures == 0 else f"{failures} check(s) failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
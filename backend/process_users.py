@@ -4,12 +4,14 @@ import string
 import os
 import sys
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy import insert
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from app.database import SessionLocal, engine, Base
-from app.models import Patient, Order, RefillAlert
-from app.services import scan_and_generate_refill_alerts
+from app.models import Patient, Order, RefillAlert, OrderHistoryImport
+from app.services import scan_and_generate_refill_alerts, order_source_keys, _dialect_insert
+from app.catalog_index import resolve_medicine_id
+from app.snapshots import read_excel_cached, file_sha256
 
 def generate_password(length=8):
     letters = string.ascii_letters + string.digits
@@ -26,112 +28,273 @@ def generate_email(name):
     else:
         return f"user{random.randint(1000, 9999)}@example.com"
 
-def process_historical_data():
-    excel_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "Consumer Order History 1.xlsx")
-    txt_output_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "users.txt")
-    
-    print(f"Reading {excel_path}...")
-    df = pd.read_excel(excel_path, skiprows=1)
-    
-    # Strip any whitespace from column names just in case
-    df.columns = [str(c).strip() for c in df.columns]
-    print(f"Columns found: {df.columns.tolist()}")
+# =========================
+# ORDER HISTORY LOADER
+# =========================
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+HISTORY_FILE = os.path.join(DATA_DIR, "Consumer Order History 1.xlsx")
+CREDENTIALS_FILE = os.path.join(DATA_DIR, "users.txt")
 
-    db = SessionLocal()
-    
+# Rows per pandas chunk and per INSERT executemany (one commit per chunk)
+CHUNK_SIZE = int(os.getenv("ORDER_HISTORY_CHUNK_SIZE", "50000"))
+
+
+def read_history_chunks(path, chunk_size=CHUNK_SIZE):
+    """The order history as DataFrames of at most chunk_size rows. CSV is streamed, so it can exceed memory."""
+    if path.lower().endswith(".csv"):
+        yield from pd.read_csv(path, chunksize=chunk_size)
+        return
+    df = read_excel_cached(path, skiprows=1)
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size]
+
+
+def resolve_columns(columns):
     # Identify the actual column names from the data
-    col_name = "Name" if "Name" in df.columns else df.columns[0]
-    col_product = "Product Purchased" if "Product Purchased" in df.columns else df.columns[4]
-    col_date = "Purchase Date" if "Purchase Date" in df.columns else df.columns[3]
-    col_qty = "Quantity" if "Quantity" in df.columns else "Quantity (Packs)"
-    col_price = "Price" if "Price" in df.columns else "Total Price ($)"
-    col_dosage = "Dosage Frequency" if "Dosage Frequency" in df.columns else "Dosage Frequency (per day)"
-    col_age = "Age"
-    col_gender = "Gender"
-
-    unique_patients = df[col_name].dropna().unique()
-    credentials = []
-    
-    seen_emails = set([e[0] for e in db.query(Patient.email).all()])
+    return {
+        "name": "Name" if "Name" in columns else columns[0],
+        "product": "Product Purchased" if "Product Purchased" in columns else columns[4],
+        "date": "Purchase Date" if "Purchase Date" in columns else columns[3],
+        "qty": "Quantity" if "Quantity" in columns else "Quantity (Packs)",
+        "price": "Price" if "Price" in columns else "Total Price ($)",
+        "dosage": "Dosage Frequency" if "Dosage Frequency" in columns else "Dosage Frequency (per day)",
+        "age": "Age",
+        "gender": "Gender",
+    }
 
-    print(f"Processing {len(unique_patients)} unique patients...")
-    for name in unique_patients:
+
+def _numbers(df, column, default):
+    # (values, unparseable) for an optional numeric column; missing column or blank cells -> default
+    if column not in df.columns:
+        return pd.Series(float(default), index=df.index), pd.Series(False, index=df.index)
+    raw = df[column]
+    values = pd.to_numeric(raw, errors="coerce")
+    return values.fillna(default), values.isna() & raw.notna()
+
+
+def _dates(raw):
+    dates = pd.to_datetime(raw, errors="coerce", format="ISO8601")
+    # Anything that isn't ISO 8601 (e.g. 15.03.2024) gets a per-value parse
+    retry = dates.isna() & raw.notna()
+    if retry.any():
+        dates[retry] = pd.to_datetime(raw[retry], errors="coerce", format="mixed")
+    return dates.fillna(pd.Timestamp(datetime.utcnow())), dates.isna() & raw.notna()
+
+
+def create_patients(db, names, patient_ids, seen_emails, next_suffix, credentials):
+    """Patient rows for names not seen before (email is the id); updates patient_ids in place."""
+    rows = []
+    for name in names:
+        if name in patient_ids:
+            continue
         email = generate_email(name)
-        
+
+        # Same emails as probing 1, 2, 3... each time, but resumes where the last
+        # patient with this base email stopped (common names made that quadratic)
         base_email = email
-        counter = 1
+        counter = next_suffix.get(base_email, 1)
         while email in seen_emails:
             parts = base_email.split('@')
             email = f"{parts[0]}{counter}@{parts[1]}"
             counter += 1
-            
+        next_suffix[base_email] = counter
+
         seen_emails.add(email)
         password = generate_password()
-        
-        patient = Patient(
-            id=email,  # Using email as ID for simpler frontend integration
-            name=str(name),
-            email=email,
-            hashed_password=password, # dummy hash for hackathon (we just use raw in onboarding mockup if needed or standard hashing)
-            is_verified=True
-        )
-        db.add(patient)
-        credentials.append((str(name), email, password))
-    
+        patient_ids[name] = email
+        # dummy hash for hackathon (we just use raw in onboarding mockup if needed or standard hashing)
+        rows.append({"id": email, "name": name, "email": email, "hashed_password": password, "is_verified": True})
+        credentials.append((name, email, password))
+    if rows:
+        db.execute(insert(Patient.__table__), rows)
+    return len(rows)
+
+
+def order_rows(db, df, cols, patient_ids, medicine_ids, seen_keys):
+    """Order rows for one chunk, converted column-wise; returns (rows, skipped, newest purchase date)."""
+    df = df[df[cols["product"]].notna()]
+    names = df[cols["name"]].astype(str)
+    products = df[cols["product"]].astype(str)
+
+    quantity, bad_qty = _numbers(df, cols["qty"], 1)
+    price, bad_price = _numbers(df, cols["price"], 0.0)
+    dosage, bad_dosage = _numbers(df, cols["dosage"], 1.0)
+    age, bad_age = _numbers(df, cols["age"], 30)
+    if cols["date"] in df.columns:
+        purchase_date, bad_date = _dates(df[cols["date"]])
+        dated = df[cols["date"]].notna()
+    else:
+        purchase_date, bad_date = pd.Series(pd.Timestamp(datetime.utcnow()), index=df.index), False
+        dated = pd.Series(False, index=df.index)
+    gender = df[cols["gender"]].astype("string").fillna("Unknown") if cols["gender"] in df.columns else "Unknown"
+
+    # Product name -> catalog id, resolved once per distinct name across the whole file
+    for product in products.unique():
+        if product not in medicine_ids:
+            medicine_ids[product] = resolve_medicine_id(db, product)
+
+    orders = pd.DataFrame({
+        "patient_id": names.map(patient_ids),
+        "medicine_id": products.map(medicine_ids).astype("Int64"),
+        "patient_age": age.astype(int),
+        "patient_gender": gender,
+        "purchase_date": purchase_date,
+        "product_name": products,
+        "quantity": quantity.astype(int),
+        "total_price": price.astype(float),
+        "dosage_frequency": dosage.astype(float),
+    })
+    # A value that is present but can't be parsed drops its row, as the per-row loader did
+    keep = ~(bad_qty | bad_price | bad_dosage | bad_age | bad_date)
+    orders = orders[keep]
+
+    # Keyed on the date as stored; rows without one (filled with "now") key on ""
+    date_text = purchase_date.dt.strftime("%Y-%m-%d %H:%M:%S.%f").where(dated, "")[keep]
+    key_columns = ["patient_id", "product_name", "quantity", "total_price", "dosage_frequency"]
+    patient, product, qty, total, dose = (orders[c].tolist() for c in key_columns)
+    orders = orders.assign(source_key=order_source_keys(zip(patient, product, date_text.tolist(), qty, total, dose), seen_keys))
+    newest = purchase_date[keep & dated].max()
+
+    orders = orders.astype(object)
+    orders = orders.where(orders.notna(), None)
+    # Plain dicts built column-wise (DataFrame.to_dict boxes every value one by one)
+    keys = orders.columns.tolist()
+    rows = [dict(zip(keys, values)) for values in zip(*(orders[k].tolist() for k in keys))]
+    return rows, int((~keep).sum()), None if pd.isna(newest) else newest.to_pydatetime()
+
+
+def load_order_history(db, path, chunk_size=CHUNK_SIZE, since=None):
+    """
+    Load patients and orders from an order-history export (Excel or CSV) in
+    chunks of chunk_size rows: one INSERT executemany per table per chunk, one
+    commit per chunk. Orders already stored (same source_key) are skipped, and
+    with `since` so are rows purchased before it. Returns (new accounts as
+    (name, email, password), orders inserted, newest purchase date in the file).
+    """
+    # name -> patient id and the taken emails, read once for the whole load
+    patient_ids = {}
+    for name, patient_id in db.query(Patient.name, Patient.id):
+        patient_ids.setdefault(name, patient_id)
+    seen_emails = set(e[0] for e in db.query(Patient.email))
+    next_suffix = {}
+    medicine_ids = {}
+    seen_keys = {}
+    credentials = []
+    cols = None
+    newest = None
+    insert_orders = _dialect_insert(db)(Order.__table__).on_conflict_do_nothing(index_elements=["source_key"])
+    total = patients = orders = skipped = 0
+
+    for chunk in read_history_chunks(path, chunk_size):
+        # Strip any whitespace from column names just in case
+        chunk.columns = [str(c).strip() for c in chunk.columns]
+        if cols is None:
+            print(f"Columns found: {chunk.columns.tolist()}")
+            cols = resolve_columns(chunk.columns.tolist())
+        total += len(chunk)
+        chunk = chunk[chunk[cols["name"]].notna()]
+        if since is not None and cols["date"] in chunk.columns:
+            # Undated and unparseable rows pass (filled with "now"); order_rows sorts them out
+            chunk = chunk[_dates(chunk[cols["date"]])[0] >= since]
+
+        patients += create_patients(db, chunk[cols["name"]].astype(str).unique(), patient_ids, seen_emails, next_suffix, credentials)
+        rows, bad, chunk_newest = order_rows(db, chunk, cols, patient_ids, medicine_ids, seen_keys)
+        if rows:
+            # Core insert on the table: one executemany, without the ORM bulk-save bookkeeping
+            orders += db.execute(insert_orders, rows).rowcount
+        db.commit()
+        skipped += bad
+        if chunk_newest is not None and (newest is None or chunk_newest > newest):
+            newest = chunk_newest
+        print(f"  {total} rows: {patients} new patients, {orders} new orders")
+
+    if skipped:
+        print(f"Skipped {skipped} rows with unparseable values")
+    return credentials, orders, newest
+
+
+def ingest_order_history(db, path, chunk_size=CHUNK_SIZE, incremental=True):
+    """
+    Load one order-history file and move its watermark. Incremental runs skip the
+    file when its SHA-256 is unchanged and otherwise only read rows purchased on
+    or after the newest purchase already ingested from it (corrections to older
+    rows are not picked up); a full run reads every row. Either way orders that
+    are already stored are not inserted again. Returns (new accounts, orders inserted).
+    """
+    source = os.path.basename(path)
+    digest = file_sha256(path)
+    record = db.get(OrderHistoryImport, source)
+    if incremental and record is not None and record.content_hash == digest:
+        print(f"Order history {source} unchanged, skipped")
+        db.rollback()
+        return [], 0
+
+    since = record.last_purchase_date if incremental and record is not None else None
+    if since is not None:
+        print(f"Order history {source}: rows purchased since {since}")
+    credentials, inserted, newest = load_order_history(db, path, chunk_size, since=since)
+
+    record = db.get(OrderHistoryImport, source)
+    if record is None:
+        record = OrderHistoryImport(source=source, row_count=0)
+        db.add(record)
+    record.content_hash = digest
+    if newest is not None and (record.last_purchase_date is None or newest > record.last_purchase_date):
+        record.last_purchase_date = newest
+    record.row_count = (record.row_count or 0) + inserted
+    record.imported_at = datetime.utcnow()
     db.commit()
-    print("Users saved. Processing orders...")
-    
-    for index, row in df.iterrows():
+    print(f"Order history {source}: {inserted} new orders, {len(credentials)} new patients")
+    return credentials, inserted
+
+
+def write_credentials(credentials, append=False):
+    mode = "a" if append and os.path.exists(CREDENTIALS_FILE) else "w"
+    with open(CREDENTIALS_FILE, mode) as f:
+        if mode == "w":
+            f.write("--- PHARMACY USER ACCOUNTS ---\n\n")
+            f.write(f"{'Patient Name':<30} | {'Email':<30} | {'Password'}\n")
+            f.write("-" * 80 + "\n")
+        for name, email, password in credentials:
+            f.write(f"{name.strip():<30} | {email:<30} | {password}\n")
+
+
+def process_historical_data(paths=(HISTORY_FILE,), chunk_size=CHUNK_SIZE, incremental=False):
+    db = SessionLocal()
+    credentials = []
+    inserted = 0
+    for path in paths:
+        print(f"Reading {path}...")
+        new_accounts, new_orders = ingest_order_history(db, path, chunk_size, incremental=incremental)
+        credentials += new_accounts
+        inserted += new_orders
+
+    if inserted:
+        print("Orders saved. Generating refill alerts...")
         try:
-            name = row.get(col_name)
-            product = row.get(col_product)
-            if pd.isna(name) or pd.isna(product):
-                continue
-                
-            qty = row.get(col_qty, 1)
-            date_val = row.get(col_date)
-            if pd.isna(date_val):
-                date_val = datetime.utcnow()
-                
-            # Find the patient ID (email)
-            patient_record = db.query(Patient).filter(Patient.name == str(name)).first()
-            if not patient_record:
-                continue
-                
-            new_order = Order(
-                patient_id=patient_record.id,
-                patient_age=int(row.get(col_age, 30)) if not pd.isna(row.get(col_age, 30)) else 30,
-                patient_gender=str(row.get(col_gender, 'Unknown')),
-                purchase_date=pd.to_datetime(date_val),
-                product_name=str(product),
-                quantity=int(qty) if not pd.isna(qty) else 1,
-                total_price=float(row.get(col_price, 0)) if not pd.isna(row.get(col_price, 0)) else 0.0,
-                dosage_frequency=float(row.get(col_dosage, 1)) if not pd.isna(row.get(col_dosage, 1)) else 1.0
-            )
-            db.add(new_order)
+            scan_and_generate_refill_alerts(db)
+            print("Refill alerts generated.")
         except Exception as e:
-            print(f"Error processing row {index}: {e}")
-            
-    db.commit()
-    print("Orders saved. Generating refill alerts...")
-    
-    try:
-        scan_and_generate_refill_alerts(db)
-        print("Refill alerts generated.")
-    except Exception as e:
-        print(f"Error generating refill alerts: {e}")
+            print(f"Error generating refill alerts: {e}")
         
     db.close()
-    
-    print("Writing credentials file...")
-    with open(txt_output_path, "w") as f:
-        f.write("--- PHARMACY USER ACCOUNTS ---\n\n")
-        f.write(f"{'Patient Name':<30} | {'Email':<30} | {'Password'}\n")
-        f.write("-" * 80 + "\n")
-        for name, email, password in credentials:
-            f.write(f"{name.strip():<30} | {email:<30} | {password}\n")
-            
-    print(f"Complete! Credentials written to {txt_output_path}")
+
+    # A full load rewrites the accounts file; incremental runs add the new accounts to it
+    if credentials:
+        print("Writing credentials file...")
+        write_credentials(credentials, append=incremental)
+        print(f"Complete! Credentials written to {CREDENTIALS_FILE}")
 
 if __name__ == "__main__":
-    process_historical_data()
+    # Full load:        python process_users.py [history.xlsx|history.csv ...] [--chunk-size N]
+    # Cron / daily drop: python process_users.py --incremental history.csv [...]
+    args = sys.argv[1:]
+    chunk_size = CHUNK_SIZE
+    if "--chunk-size" in args:
+        i = args.index("--chunk-size")
+        chunk_size = int(args[i + 1])
+        del args[i:i + 2]
+    incremental = "--incremental" in args
+    if incremental:
+        args.remove("--incremental")
+    process_historical_data(args or [HISTORY_FILE], chunk_size, incremental=incremental)
@@ -0,0 +1,58 @@
+import { useCallback, useRef, useState } from "react";
+import { pharmacyService } from "../services/api";
+
+// Consumes POST /chat/stream. Stages arrive as they finish (intent -> match -> verdict),
+// master-agent reasoning streams into `partialText`, and `response` is the same body
+// /chat would have returned.
+export const useAgentStream = () => {
+  const [stages, setStages] = useState([]);
+  const [partialText, setPartialText] = useState("");
+  const [response, setResponse] = useState(null);
+  const [isStreaming, setIsStreaming] = useState(false);
+  const [error, setError] = useState(null);
+  const controllerRef = useRef(null);
+
+  const cancel = useCallback(() => {
+    if (controllerRef.current) controllerRef.current.abort();
+    controllerRef.current = null;
+    setIsStreaming(false);
+  }, []);
+
+  const send = useCallback(async (message, patient) => {
+    cancel();
+    const controller = new AbortController();
+    controllerRef.current = controller;
+
+    setStages([]);
+    setPartialText("");
+    setResponse(null);
+    setError(null);
+    setIsStreaming(true);
+
+    let final = null;
+    try {
+      await pharmacyService.streamChatMessage(message, patient, (event, data) => {
+        if (event === "token") {
+          setPartialText((prev) => prev + data.text);
+        } else if (event === "message" || event === "error") {
+          final = data;
+          setResponse(data);
+        } else {
+          setStages((prev) => [...prev, { event, ...data }]);
+        }
+      }, controller.signal);
+    } catch (err) {
+      if (err.name !== "AbortError") setError(err);
+    } finally {
+      if (controllerRef.current === controller) {
+        controllerRef.current = null;
+        setIsStreaming(false);
+      }
+    }
+    return final;
+  }, [cancel]);
+
+  return { send, cancel, stages, partialText, response, isStreaming, error };
+};
+
+export default useAgentStream;